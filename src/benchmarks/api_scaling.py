@@ -0,0 +1,92 @@
+"""
+Compares the throughput and latency of the FastAPI backend across uvicorn worker counts.
+
+Starts the backend with each worker count, sends the same concurrent load of chat requests, each in its own
+conversation, and stops it again (live LLM, search and database unless the query takes the fast path).
+Run from the src folder:
+    python -m benchmarks.api_scaling
+    python -m benchmarks.api_scaling --workers 1 2 4 8 --requests 64 --concurrency 16
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import rich
+from rich.table import Table
+
+PORT = 8090
+
+
+def wait_until_healthy(base_url: str, timeout_seconds: float = 120.0):
+    deadline = time.time() + timeout_seconds
+    while time.time() < deadline:
+        try:
+            if requests.get(f'{base_url}/health', timeout=2).json().get('agent_ready'):
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f'Backend at {base_url} did not become healthy in {timeout_seconds} seconds')
+
+
+def send_chat(base_url: str, query: str) -> float:
+    time1 = time.perf_counter()
+    response = requests.post(f'{base_url}/api/v1/chat', json={'message': query}, timeout=600)
+    response.raise_for_status()
+    return time.perf_counter() - time1
+
+
+def benchmark_workers(n_workers: int, query: str, n_requests: int, concurrency: int) -> dict[str, float]:
+    base_url = f'http://127.0.0.1:{PORT}'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'ragnar.apps.fastapi_app:app',
+         '--host', '127.0.0.1', '--port', str(PORT), '--workers', str(n_workers), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        # Each worker initializes on its own; wait for all of them with a few warm-up requests
+        wait_until_healthy(base_url=base_url)
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            list(executor.map(lambda _: send_chat(base_url=base_url, query=query), range(n_workers)))
+
+        time1 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = sorted(executor.map(lambda _: send_chat(base_url=base_url, query=query), range(n_requests)))
+        duration = time.perf_counter() - time1
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    return {
+        'throughput': n_requests / duration,
+        'p50': statistics.median(latencies),
+        'p95': latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the FastAPI backend across uvicorn worker counts')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=32)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--query', default='List all companies in the database.')
+    args = parser.parse_args()
+
+    table = Table(title=f'API scaling ({args.requests} requests, concurrency {args.concurrency})')
+    for column in ['Workers', 'Throughput (req/s)', 'p50 Latency (s)', 'p95 Latency (s)']:
+        table.add_column(column)
+
+    for n_workers in args.workers:
+        result = benchmark_workers(n_workers=n_workers, query=args.query, n_requests=args.requests, concurrency=args.concurrency)
+        table.add_row(str(n_workers), f"{result['throughput']:.2f}", f"{result['p50']:.2f}", f"{result['p95']:.2f}")
+
+    rich.print(table)
+
+
+if __name__ == '__main__':
+    main()
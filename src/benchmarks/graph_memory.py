@@ -0,0 +1,122 @@
+"""
+Compares the checkpoint memory retained by agent runs with the previous state handling (nodes return the whole
+state, MemorySaver stores every messages version in full) and the current one (nodes return deltas through the
+state reducers, DeltaMemorySaver stores the messages added per step).
+
+Simulates a conversation in which every turn makes a few research / database tool calls with realistic payloads,
+on the same graph shape as the agent (no LLM, search or database calls). Run from the src folder:
+    python -m benchmarks.graph_memory
+    python -m benchmarks.graph_memory --turns 10 --tool-steps 4 --payload-kb 12
+"""
+import argparse
+import asyncio
+import time
+from uuid import uuid4
+
+import rich
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from pydantic import BaseModel
+from rich.table import Table
+
+from ragnar.agents.checkpoint import DeltaMemorySaver, get_retained_bytes
+from ragnar.agents.serialization import dumps
+from ragnar.agents.state import AgentState
+
+MODEL = 'claude-sonnet-4-5'
+
+
+class FullReplacementState(BaseModel):
+    """The state before reducers: every node returns (and every checkpoint stores) the whole conversation."""
+    messages: list
+    token_usage: dict
+    llm_calls: int = 0
+
+
+def make_payload(payload_kb: int) -> str:
+    row = {'name': 'Company', 'company_summary': 'Develops large language models and AI assistants. ' * 8,
+           'main_products': ['Assistant', 'API', 'Platform'], 'similar_companies': ['A', 'B', 'C', 'D']}
+    rows = []
+    while len(dumps(rows)) < payload_kb * 1024:
+        rows.append(row)
+    return dumps(rows)
+
+
+def build_graph(state_schema: type[BaseModel], is_delta: bool, saver: MemorySaver, tool_steps: int, payload: str):
+    def llm_call(state: BaseModel):
+        n_calls = state.llm_calls
+        message = (AIMessage(content='', tool_calls=[{'name': 'ResearchCompany', 'args': {'company_name': f'C{n_calls}'}, 'id': uuid4().hex}])
+                   if n_calls < tool_steps else AIMessage(content='Here is the answer.'))
+        usage = {'input_tokens': 1000, 'output_tokens': 100}
+        if is_delta:
+            return {'messages': [message], 'token_usage': {MODEL: usage}, 'llm_calls': n_calls + 1}
+        state.messages.append(message)
+        state.token_usage[MODEL]['input_tokens'] += usage['input_tokens']
+        state.token_usage[MODEL]['output_tokens'] += usage['output_tokens']
+        state.llm_calls += 1
+        return state
+
+    def tools_call(state: BaseModel):
+        messages = [ToolMessage(content=payload, name=x['name'], tool_call_id=x['id']) for x in state.messages[-1].tool_calls]
+        if is_delta:
+            return {'messages': messages}
+        state.messages.extend(messages)
+        return state
+
+    workflow = StateGraph(state_schema)
+    workflow.add_node('llm_call', llm_call)
+    workflow.add_node('tools_call', tools_call)
+    workflow.add_edge(START, 'llm_call')
+    workflow.add_edge('tools_call', 'llm_call')
+    workflow.add_conditional_edges('llm_call', lambda x: 'continue' if len(x.messages[-1].tool_calls) > 0 else 'end',
+                                   {'continue': 'tools_call', 'end': END})
+    return workflow.compile(checkpointer=saver)
+
+
+async def run_conversation(is_delta: bool, turns: int, tool_steps: int, payload: str) -> list[dict[str, float]]:
+    saver = DeltaMemorySaver() if is_delta else MemorySaver()
+    state_schema = AgentState if is_delta else FullReplacementState
+    graph = build_graph(state_schema=state_schema, is_delta=is_delta, saver=saver, tool_steps=tool_steps, payload=payload)
+
+    history, results = [SystemMessage(content='You are a helpful business intelligence assistant.')], []
+    for turn in range(turns):
+        # Like the agent: every run gets the conversation so far on its own thread, which is deleted afterwards
+        config = {'configurable': {'thread_id': str(uuid4())}}
+        in_state = state_schema(messages=history + [HumanMessage(content=f'Question {turn}')],
+                                token_usage={MODEL: {'input_tokens': 0, 'output_tokens': 0}})
+        time1 = time.perf_counter()
+        out_state = await graph.ainvoke(in_state, config)
+        duration = time.perf_counter() - time1
+        results.append({'retained_bytes': get_retained_bytes(saver=saver), 'seconds': duration})
+        history = out_state['messages']
+        saver.delete_thread(config['configurable']['thread_id'])
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Checkpoint memory retained per turn, before and after delta state updates')
+    parser.add_argument('--turns', type=int, default=8)
+    parser.add_argument('--tool-steps', type=int, default=3)
+    parser.add_argument('--payload-kb', type=int, default=8)
+    args = parser.parse_args()
+
+    payload = make_payload(payload_kb=args.payload_kb)
+    before = await run_conversation(is_delta=False, turns=args.turns, tool_steps=args.tool_steps, payload=payload)
+    after = await run_conversation(is_delta=True, turns=args.turns, tool_steps=args.tool_steps, payload=payload)
+
+    table = Table(title=f'Checkpoint memory per run ({args.tool_steps} tool steps per turn, {args.payload_kb} KB tool outputs)')
+    for column in ['Turn', 'Before (KB)', 'After (KB)', 'Reduction', 'Before (ms)', 'After (ms)']:
+        table.add_column(column)
+    for turn, (x, y) in enumerate(zip(before, after)):
+        table.add_row(str(turn + 1),
+                      f"{x['retained_bytes'] / 1024:,.0f}",
+                      f"{y['retained_bytes'] / 1024:,.0f}",
+                      f"{x['retained_bytes'] / max(y['retained_bytes'], 1):.1f}x",
+                      f"{x['seconds'] * 1000:.1f}",
+                      f"{y['seconds'] * 1000:.1f}")
+    rich.print(table)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
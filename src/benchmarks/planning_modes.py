@@ -0,0 +1,70 @@
+"""
+Compares the planning modes of the deep agent by LLM calls, cost and latency per request.
+
+Runs the same queries against a fresh agent per planning mode (live LLM, search and database).
+Run from the src folder:
+    python -m benchmarks.planning_modes
+"""
+import asyncio
+import os
+import statistics
+import time
+
+import rich
+from rich.table import Table
+
+from config import settings
+from ragnar import BusinessIntelligenceAgent, PlanningMode, get_agent_config, get_llm_config
+
+QUERIES = [
+    'What do we know about Anthropic?',
+    'Who is the CEO of Perplexity AI and what is the latest funding round of the company?',
+    'Compare LangChain and LlamaIndex.',
+    'List the persons at OpenAI in the database and tell me which of them are executives.',
+]
+
+
+async def benchmark_planning_mode(planning_mode: str) -> dict[str, float]:
+    agent_config = get_agent_config()
+    agent_config['fast_path']['enabled'] = False # Every query should go through the graph
+    llm_calls, costs, durations = [], [], []
+    for query in QUERIES:
+        agent = BusinessIntelligenceAgent(llm_config=get_llm_config(),
+                                          web_search_api_key=settings.TAVILY_API_KEY,
+                                          database_url=settings.SUPABASE_URL,
+                                          database_key=settings.SUPABASE_SECRET_KEY,
+                                          agent_config=agent_config)
+        time1 = time.perf_counter()
+        out_dict = await agent.run(query=query, planning_mode=planning_mode)
+        durations.append(time.perf_counter() - time1)
+        llm_calls.append(out_dict['llm_calls'])
+        costs.append(out_dict['total_cost'])
+
+    return {
+        'llm_calls': statistics.mean(llm_calls),
+        'cost': statistics.mean(costs),
+        'duration': statistics.mean(durations),
+    }
+
+
+async def main():
+    os.environ['LANGSMITH_API_KEY'] = settings.LANGSMITH_API_KEY.get_secret_value()
+    os.environ['LANGSMITH_TRACING'] = settings.LANGSMITH_TRACING
+
+    table = Table(title=f'Planning modes ({len(QUERIES)} requests each)')
+    for column in ['Planning Mode', 'LLM Calls / Request', 'Cost / Request ($)', 'Latency / Request (s)']:
+        table.add_column(column)
+
+    results = {}
+    for planning_mode in [PlanningMode.TOOLS, PlanningMode.CONTEXT]:
+        results[planning_mode] = await benchmark_planning_mode(planning_mode=planning_mode)
+        r = results[planning_mode]
+        table.add_row(planning_mode, f"{r['llm_calls']:.2f}", f"{r['cost']:.4f}", f"{r['duration']:.2f}")
+
+    rich.print(table)
+    saved = results[PlanningMode.TOOLS]['llm_calls'] - results[PlanningMode.CONTEXT]['llm_calls']
+    rich.print(f'LLM calls saved per request by {PlanningMode.CONTEXT} planning: {saved:.2f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Records agent runs to a cassette and replays them, to measure the agent's own overhead on real traffic.
+
+`record` runs the queries live (LLM, search and database) and records every external call with its latency.
+`replay` re-runs the recorded queries against the recorded responses: with `--latency zero` the wall time is the
+agent's own overhead (graph, routing, serialization, tool handling), with `--latency original` it reproduces
+the recorded run. Run from the src folder:
+    python -m benchmarks.replay record out/cassette.jsonl "What do we know about Anthropic?" "Compare LangChain and LlamaIndex."
+    python -m benchmarks.replay replay out/cassette.jsonl --latency zero --repeat 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import rich
+from rich.table import Table
+
+from config import settings
+from ragnar import BusinessIntelligenceAgent, get_agent_config, get_llm_config
+from ragnar.agents import Cassette
+
+
+def create_agent(cassette: Cassette) -> BusinessIntelligenceAgent:
+    agent = BusinessIntelligenceAgent(llm_config=get_llm_config(),
+                                      web_search_api_key=settings.TAVILY_API_KEY,
+                                      database_url=settings.SUPABASE_URL,
+                                      database_key=settings.SUPABASE_SECRET_KEY,
+                                      agent_config=get_agent_config())
+    agent.use_cassette(cassette=cassette)
+    return agent
+
+
+async def record(path: str, queries: list[str]):
+    cassette = Cassette(path=path, mode=Cassette.RECORD)
+    agent = create_agent(cassette=cassette)
+    for query in queries:
+        time1 = time.perf_counter()
+        out_dict = await agent.run(query=query)
+        rich.print(f'[green]Recorded[/green] {query!r} in {time.perf_counter() - time1:.2f}s (${out_dict["total_cost"]:.4f})')
+    rich.print(f'{cassette.get_stats()["recorded"]} interactions recorded to {cassette.path}')
+
+
+async def replay(path: str, replay_latency: bool, repeat: int):
+    # The runs are replayed in their recorded order on a fresh agent, so that the conversations match the recording
+    durations, stats = {}, {}
+    for _ in range(repeat):
+        cassette = Cassette(path=path, mode=Cassette.REPLAY, replay_latency=replay_latency)
+        agent = create_agent(cassette=cassette)
+        for run in cassette.get_runs():
+            time1 = time.perf_counter()
+            await agent.run(query=run['query'], planning_mode=run['planning_mode'], budget=run['budget'])
+            durations.setdefault(run['query'], []).append(time.perf_counter() - time1)
+        stats = cassette.get_stats()
+
+    recorded_seconds = {}
+    for entry in Cassette(path=path, mode=Cassette.REPLAY).entries:
+        if entry['kind'] in ('llm', 'research', 'db'):
+            recorded_seconds[entry['kind']] = recorded_seconds.get(entry['kind'], 0.0) + entry['seconds']
+
+    table = Table(title=f'Replay of {path} ({"original" if replay_latency else "zero"} latency, {repeat} repeats)')
+    for column in ['Query', 'Mean (s)', 'Min (s)', 'Max (s)']:
+        table.add_column(column)
+    for query, values in durations.items():
+        table.add_row(query[:60], f'{statistics.mean(values):.3f}', f'{min(values):.3f}', f'{max(values):.3f}')
+    rich.print(table)
+    rich.print('Recorded external time: ' + ', '.join(f'{k}: {v:.2f}s' for k, v in recorded_seconds.items()))
+    rich.print(f'Last replay: {stats}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record agent runs to a cassette and replay them')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    record_parser = subparsers.add_parser('record')
+    record_parser.add_argument('path')
+    record_parser.add_argument('queries', nargs='+')
+    replay_parser = subparsers.add_parser('replay')
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--latency', choices=['original', 'zero'], default='zero')
+    replay_parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['LANGSMITH_API_KEY'] = settings.LANGSMITH_API_KEY.get_secret_value()
+    os.environ['LANGSMITH_TRACING'] = settings.LANGSMITH_TRACING
+
+    if args.command == 'record':
+        asyncio.run(record(path=args.path, queries=args.queries))
+    else:
+        asyncio.run(replay(path=args.path, replay_latency=args.latency == 'original', repeat=args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Measures the latency of the entity lookups the agent makes (company by name / alternative name / id, person by name
+and company, persons of a company, name lists) on the embedded SQLite backend, seeded with synthetic rows, and
+optionally on the configured Supabase database and on a read mirror of it, on names sampled from it (read-only).
+Run from the src folder:
+    python -m benchmarks.repository_lookup
+    python -m benchmarks.repository_lookup --companies 5000 --persons-per-company 10 --supabase
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Any, Callable
+
+import rich
+from rich.table import Table as RichTable
+
+from config import settings
+from ragnar.agents.enums import Table
+from ragnar.agents.read_mirror import ReadMirrorRepository
+from ragnar.agents.repository import EntityRepository, SQLiteRepository, get_repository
+from ragnar.agents.utils import insert_entities_to_db
+
+# Rows are sampled through the stale-entity query, with a cutoff that every row precedes
+SAMPLE_CUTOFF = datetime.datetime(9999, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def seed(repository: EntityRepository, n_companies: int, persons_per_company: int):
+    companies = [{'name': f'Company {i}', 'alternative_names': [f'Company {i} Inc.', f'C{i} Labs'],
+                  'company_summary': 'Develops large language models and AI assistants. ' * 8} for i in range(n_companies)]
+    company_ids = insert_entities_to_db(repository=repository, input_dicts=companies, table_name=Table.COMPANIES)
+    persons = [{'name': f'Person {i}-{j}', 'current_company_id': company_id, 'role': 'Chief Technology Officer'}
+               for i, company_id in enumerate(company_ids) for j in range(persons_per_company)]
+    insert_entities_to_db(repository=repository, input_dicts=persons, table_name=Table.PERSONS)
+
+
+def get_lookups(repository: EntityRepository, n_samples: int) -> dict[str, list[Callable[[], Any]]]:
+    companies = repository.fetch_stale(table_name=Table.COMPANIES, updated_before=SAMPLE_CUTOFF, limit=n_samples)
+    persons = repository.fetch_stale(table_name=Table.PERSONS, updated_before=SAMPLE_CUTOFF, limit=n_samples)
+    random.shuffle(companies)
+    random.shuffle(persons)
+    return {
+        'Company by name': [lambda x=x: repository.fetch_by_names(table_name=Table.COMPANIES, names=[x['name']]) for x in companies],
+        'Company by alternative name': [lambda x=x: repository.fetch_by_alternative_name(name=x['alternative_names'][0])
+                                        for x in companies if len(x.get('alternative_names') or []) > 0],
+        'Company by id': [lambda x=x: repository.fetch_by_id(table_name=Table.COMPANIES, entity_id=x['id']) for x in companies],
+        'Person by name and company': [lambda x=x: repository.fetch_person(name=x['name'], current_company_id=x['current_company_id'])
+                                       for x in persons],
+        'Persons of a company': [lambda x=x: repository.list_persons_from_company_id(company_id=x['id']) for x in companies],
+        'All person names': [lambda: repository.list_names(table_name=Table.PERSONS)] * 5,
+    }
+
+
+def measure(lookups: dict[str, list[Callable[[], Any]]]) -> dict[str, list[float]]:
+    durations = {}
+    for name, calls in lookups.items():
+        for call in calls:
+            time1 = time.perf_counter()
+            call()
+            durations.setdefault(name, []).append(time.perf_counter() - time1)
+    return durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of the entity lookups per database backend')
+    parser.add_argument('--companies', type=int, default=2000)
+    parser.add_argument('--persons-per-company', type=int, default=5)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--supabase', action='store_true', help='Also measure the configured Supabase database and its read mirror')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        repository = SQLiteRepository(path=os.path.join(folder, 'ragnar.sqlite'))
+        time1 = time.perf_counter()
+        seed(repository=repository, n_companies=args.companies, persons_per_company=args.persons_per_company)
+        rich.print(f'Seeded {args.companies} companies and {args.companies * args.persons_per_company} persons '
+                   f'in {time.perf_counter() - time1:.2f}s')
+        results['sqlite'] = measure(lookups=get_lookups(repository=repository, n_samples=args.samples))
+    if args.supabase:
+        repository = get_repository(backend='supabase',
+                                    database_url=settings.SUPABASE_URL.get_secret_value(),
+                                    database_key=settings.SUPABASE_SECRET_KEY.get_secret_value())
+        results['supabase'] = measure(lookups=get_lookups(repository=repository, n_samples=args.samples))
+        read_mirror = ReadMirrorRepository(primary=repository)
+        time1 = time.perf_counter()
+        n_rows = read_mirror.sync()
+        rich.print(f'Loaded {n_rows} rows to the read mirror in {time.perf_counter() - time1:.2f}s')
+        results['read mirror'] = measure(lookups=get_lookups(repository=read_mirror, n_samples=args.samples))
+
+    table = RichTable(title=f'Lookup latency ({args.companies} companies, {args.persons_per_company} persons per company)')
+    for column in ['Lookup', 'Backend', 'Calls', 'p50 (ms)', 'p99 (ms)']:
+        table.add_column(column)
+    for backend, durations in results.items():
+        for name, values in durations.items():
+            p99 = statistics.quantiles(values, n=100)[98] if len(values) > 1 else values[0]
+            table.add_row(name, backend, str(len(values)), f'{statistics.median(values) * 1000:.3f}', f'{p99 * 1000:.3f}')
+    rich.print(table)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Compares the JSON serialization of tool outputs and API responses: the previous indented stdlib output,
+the compact stdlib output and orjson (if installed), by time per call and output size.
+
+The payloads have the shape of database rows, research results and chat responses (no LLM, search or database calls).
+Run from the src folder:
+    python -m benchmarks.serialization
+"""
+import datetime
+import json
+import timeit
+from uuid import uuid4
+
+import rich
+from rich.table import Table
+
+from ragnar.agents.serialization import JSON_BACKEND, dumps_bytes, loads
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+N_CALLS = 2000
+SUMMARY = ('The company develops large language models and AI assistants for enterprises and consumers, '
+           'with a focus on safety research, interpretability and reliable deployment. ') * 4
+
+
+def make_company(i: int) -> dict:
+    now = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+    return {
+        'id': i,
+        'name': f'Company {i}',
+        'created_at': now,
+        'updated_at': now,
+        'created_by_id': str(uuid4()),
+        'updated_by_id': str(uuid4()),
+        'address': '548 Market St, San Francisco, CA 94104, United States',
+        'alternative_names': [f'Company {i} Inc.', f'C{i} Labs'],
+        'ceo': 'Jane Doe',
+        'company_summary': SUMMARY,
+        'crunchbase_profile': f'https://www.crunchbase.com/organization/company-{i}',
+        'distinguishing_features': 'Constitutional training; long context windows; enterprise-grade security.',
+        'is_verified': True,
+        'key_executives': [{'name': f'Executive {j}', 'title': 'VP Engineering'} for j in range(6)],
+        'latest_funding_round': 'Series E',
+        'latest_funding_round_date': '2025-03-01',
+        'latest_funding_round_amount_mm_usd': 3500.0,
+        'linkedin_profile': f'https://www.linkedin.com/company/company-{i}',
+        'main_products': ['Assistant', 'API', 'Developer Platform', 'Enterprise Suite'],
+        'org_chart_summary': SUMMARY[:300],
+        'services': ['Model hosting', 'Fine-tuning', 'Consulting'],
+        'similar_companies': ['OpenAI', 'Google DeepMind', 'Mistral AI', 'Cohere'],
+        'total_funding_mm_usd': 14300.5,
+        'website': f'https://company-{i}.com',
+        'year_founded': 2021,
+    }
+
+
+def make_person(i: int) -> dict:
+    now = datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+    return {
+        'id': i,
+        'name': f'Person {i}',
+        'created_at': now,
+        'updated_at': now,
+        'created_by_id': str(uuid4()),
+        'updated_by_id': str(uuid4()),
+        'companies': [f'Company {j}' for j in range(4)],
+        'current_company_id': i % 50,
+        'current_location': 'San Francisco, CA, United States',
+        'linkedin_profile': f'https://www.linkedin.com/in/person-{i}',
+        'role': 'Chief Technology Officer',
+        'work_email': f'person.{i}@company.com',
+        'years_experience': 17,
+    }
+
+
+PAYLOADS = {
+    'Company row': make_company(i=1),
+    'Person row': make_person(i=1),
+    'Company list (50 names)': [{'id': i, 'name': f'Company {i}'} for i in range(50)],
+    'Persons of a company (25)': [make_person(i=i) for i in range(25)],
+    'Chat response': {
+        'conversation_id': str(uuid4()),
+        'content': SUMMARY * 3,
+        'token_usage': {'claude-sonnet-4-5': {'input_tokens': 48210, 'output_tokens': 1532},
+                        'llama-3.3-70b-versatile': {'input_tokens': 9312, 'output_tokens': 412}},
+        'cost_list': [{'model': 'claude-sonnet-4-5', 'cost': 0.167}, {'model': 'llama-3.3-70b-versatile', 'cost': 0.006}],
+        'total_cost': 0.173,
+        'stop_reason': None,
+    },
+}
+
+
+def get_serializers() -> dict:
+    serializers = {
+        'json (indent=2)': lambda x: json.dumps(x, indent=2).encode('utf-8'),
+        'json (compact)': lambda x: json.dumps(x, separators=(',', ':'), ensure_ascii=False).encode('utf-8'),
+    }
+    if orjson is not None:
+        serializers['orjson'] = orjson.dumps
+    serializers[f'ragnar ({JSON_BACKEND})'] = dumps_bytes
+    return serializers
+
+
+def main():
+    table = Table(title=f'JSON serialization ({N_CALLS} calls per payload)')
+    for column in ['Payload', 'Serializer', 'Dump (µs)', 'Load (µs)', 'Size (bytes)']:
+        table.add_column(column)
+
+    for payload_name, payload in PAYLOADS.items():
+        for serializer_name, serializer in get_serializers().items():
+            data = serializer(payload)
+            dump_seconds = timeit.timeit(lambda: serializer(payload), number=N_CALLS) / N_CALLS
+            load_seconds = timeit.timeit(lambda: loads(data), number=N_CALLS) / N_CALLS
+            table.add_row(payload_name, serializer_name, f'{dump_seconds * 1e6:.1f}', f'{load_seconds * 1e6:.1f}', f'{len(data):,}')
+        table.add_section()
+
+    rich.print(table)
+
+
+if __name__ == '__main__':
+    main()
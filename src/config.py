@@ -26,6 +26,9 @@ class Settings(BaseSettings):
 
     BACKEND_PORT: int = 8080
     BACKEND_HOST: str = "0.0.0.0"
+    BACKEND_WORKERS: int = 1
+    WARM_UP_ON_STARTUP: bool = True  # Warm up connections, indexes and the graph before reporting ready
+    STATUS_CACHE_TTL_SECONDS: float = 10.0  # Health checks re-probe the database at most this often
 
     FRONTEND_HOST: str = "http://localhost:5173"
     BACKEND_CORS_ORIGINS: list[str] = ["http://localhost:8000"]
@@ -5,7 +5,7 @@ import time
 import rich
 
 from config import settings
-from ragnar import BusinessIntelligenceAgent, get_llm_config
+from ragnar import BusinessIntelligenceAgent, get_agent_config, get_llm_config
 
 
 def main():
@@ -17,7 +17,8 @@ def main():
     bia = BusinessIntelligenceAgent(llm_config=llm_config,
                                     web_search_api_key=settings.TAVILY_API_KEY,
                                     database_url=settings.SUPABASE_URL,
-                                    database_key=settings.SUPABASE_SECRET_KEY)
+                                    database_key=settings.SUPABASE_SECRET_KEY,
+                                    agent_config=get_agent_config())
     print('\n')
     print('Welcome! Type "exit" to quit.')
     while True:
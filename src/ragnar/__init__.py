@@ -1,5 +1,6 @@
 from .agents import BusinessIntelligenceAgent
 from .agents import Table as DatabaseTable
+from .agents import WEB_SEARCH_PROVIDER, ExecutionBudget, PlanningMode, ResearchDepth
 from config import settings
 from ai_common import LlmServers, ModelNames
 
@@ -13,7 +14,7 @@ def get_llm_config():
             'max_llm_retries': 3,
             'model_args': {
                 'temperature': 0,
-                'max_tokens': 131_072,
+                'max_tokens': 32_768,
                 'top_p': 0.95,
                 }
             },
@@ -33,8 +34,116 @@ def get_llm_config():
 
     return llm_config
 
+
+def get_agent_config():
+    agent_config = {
+        # Process-wide limits per provider. None disables a limit. Adjust to the tier of your accounts.
+        'rate_limits': {
+            LlmServers.GROQ: {
+                'requests_per_minute': 30,
+                'tokens_per_minute': 12_000,
+                'max_in_flight': 4,
+                },
+            LlmServers.OLLAMA: {
+                'requests_per_minute': None,
+                'tokens_per_minute': None,
+                'max_in_flight': 4,
+                },
+            WEB_SEARCH_PROVIDER: {
+                'requests_per_minute': 100,
+                'tokens_per_minute': None,
+                'max_in_flight': 4,
+                },
+            },
+        # Routine turns (e.g. listing companies, answering from a database record) go to the fast language_model
+        'model_routing': {
+            'enabled': True,
+            'max_query_chars': 200,
+            'max_context_chars': 60_000,
+            },
+        # Simple structured commands (e.g. "list all companies") are answered without any LLM call
+        'fast_path': {
+            'enabled': True,
+            },
+        # Database lookups of entities named in the query start concurrently with the first LLM call
+        'prefetch': {
+            'enabled': True,
+            'max_workers': 4,
+            'max_entities': 3,
+            'index_ttl_seconds': 300,
+            },
+        # 'context' renders the TODO list into every LLM call instead of WriteTodos / ReadTodos round trips.
+        # Can be overridden per request with run(planning_mode=...).
+        'planning': {
+            'mode': PlanningMode.CONTEXT,
+            },
+        # Per-run limits (see ExecutionBudget); None disables a limit. Can be overridden per request with run(budget=...).
+        'budget': {
+            'max_iterations': 25,
+            'max_input_tokens': None,
+            'max_output_tokens': None,
+            'max_cost': 1.0,
+            'max_wall_time_seconds': 600,
+            },
+        # Business research profile used when neither the tool call nor the request asks for a depth (see ResearchDepth).
+        # With a latency target, the most thorough profile whose observed latency fits the target is used instead.
+        'research': {
+            'default_profile': ResearchDepth.STANDARD,
+            'latency_target_seconds': None,
+            },
+        # Where the business researcher keeps its web search client, which the search cache and rate limiter wrap
+        'web_search': {
+            'client_path': 'web_search.client',
+            },
+        # On-disk cache of web search responses, shared by the research runs of all processes
+        'search_cache': {
+            'enabled': True,
+            'path': '~/.cache/ragnar/search_cache.sqlite',
+            'ttl_seconds': 24 * 3600,
+            },
+        # Background re-research of stored entities older than max_age_hours. Spends LLM / search budget unattended.
+        'refresh': {
+            'enabled': False,
+            'max_age_hours': 24 * 30,
+            'interval_seconds': 3600,
+            'max_concurrency': 2,
+            'max_cost_per_cycle': 1.0,
+            'batch_size': 20,
+            'candidates_per_table': 500,
+            'max_failure_backoff_hours': 24 * 7,
+            # Only the worker process holding this file lock refreshes; the others take over if it exits
+            'lock_path': '~/.cache/ragnar/refresh.lock',
+            },
+        # Conversations of the API: the agent's state and the history shown to users. The sqlite backend is shared by
+        # all the worker processes of a host
+        'session_store': {
+            'backend': 'sqlite',
+            'path': '~/.cache/ragnar/sessions.sqlite',
+            },
+        # Storage of the companies and persons: 'supabase' (the database URL and key of the settings) or an embedded
+        # 'sqlite' file at `path`, for single-node deployments, tests and offline benchmarks
+        'database': {
+            'backend': 'supabase',
+            'path': '~/.cache/ragnar/ragnar.sqlite',
+            # Local copy of the tables serving the reads, synced from the database every sync_interval_seconds.
+            # Reads go to the database while the copy is older than max_staleness_seconds; writes always do.
+            'read_mirror': {
+                'enabled': False,
+                'path': ':memory:',
+                'sync_interval_seconds': 30,
+                'max_staleness_seconds': 300,
+                },
+            },
+        }
+
+    return agent_config
+
 __all__ = [
     'BusinessIntelligenceAgent',
     'DatabaseTable',
+    'ExecutionBudget',
+    'PlanningMode',
+    'ResearchDepth',
+    'get_agent_config',
     'get_llm_config',
 ]
\ No newline at end of file
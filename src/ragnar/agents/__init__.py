@@ -1,7 +1,20 @@
+from .budget import ExecutionBudget
 from .business_intelligence_agent import BusinessIntelligenceAgent
-from .enums import Table
+from .cassette import Cassette, CassetteMissError
+from .enums import Table, PlanningMode, ResearchDepth
+from .rate_limiter import WEB_SEARCH_PROVIDER, get_rate_limiter_stats
+from .run_context import CancellationToken, RunCancelledError
 
 __all__ = [
     'BusinessIntelligenceAgent',
+    'CancellationToken',
+    'Cassette',
+    'CassetteMissError',
+    'ExecutionBudget',
+    'PlanningMode',
+    'ResearchDepth',
+    'RunCancelledError',
     'Table',
+    'WEB_SEARCH_PROVIDER',
+    'get_rate_limiter_stats',
 ]
\ No newline at end of file
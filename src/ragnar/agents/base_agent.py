@@ -1,17 +1,30 @@
+import asyncio
+import threading
+import time
 from abc import ABC
-from typing import Any, Literal
+from typing import Any, AsyncIterator, Callable, Literal
+from uuid import uuid4
 from pydantic import BaseModel
 
 from ai_common import calculate_token_cost, get_llm
 from langchain.chat_models import init_chat_model
 from langchain_core.callbacks import get_usage_metadata_callback
-from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import START, END, StateGraph
 
 from .configuration import Configuration
-from .enums import Node
+from .budget import ExecutionBudget, check_budget
+from .cassette import Cassette, CassetteLLM
+from .checkpoint import DeltaMemorySaver
+from .enums import Node, PlanningMode, StopReason
+from .fast_path import FastPath
+from .model_router import ModelRouter
+from .planning_tools import CURRENT_TODOS_TEMPLATE, get_planning_tools, render_todos, write_todos
+from .prefetch import Prefetcher
+from .run_context import CancellationToken, RunCancelledError, get_cancellation_token, use_cancellation_token, use_run_options
+from .rate_limiter import get_rate_limiter, is_rate_limit_error, get_backoff_seconds, estimate_tokens
+from .session_store import get_session_store
 from .state import AgentState, DeepAgentState
 
 
@@ -23,6 +36,29 @@ def _should_continue(state: AgentState) -> Literal['continue', 'end']:
         return "continue"
 
 
+def _raise_if_cancelled():
+    token = get_cancellation_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def _get_best_effort_answer(messages: list, stop_reason: dict[str, Any], max_chars: int = 4_000) -> str:
+    if stop_reason['limit'] is None:
+        answer = f"I had to stop before completing your request ({stop_reason['code']}: {stop_reason['value']})."
+    else:
+        answer = (
+            f"I had to stop before completing your request because the {stop_reason['code']} limit was reached "
+            f"({stop_reason['value']:.4g} of {stop_reason['limit']:.4g})."
+        )
+    # The latest non-empty model text or tool result since the user's request is the best partial answer there is
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, (AIMessage, ToolMessage)) and isinstance(message.content, str) and len(message.content.strip()) > 0:
+            return answer + " Here is what I have so far:\n\n" + message.content[:max_chars]
+    return answer
+
+
 class BaseAgent(ABC):
     """
     Abstract base class for LLM-based agents with tool calling capabilities.
@@ -61,80 +97,484 @@ class BaseAgent(ABC):
                  llm_config: dict[str, Any],
                  tools: list, agent_instructions: str,
                  runnable_config: RunnableConfig,
-                 is_deep_agent: bool = False):
-        self._memory_saver = MemorySaver()
+                 is_deep_agent: bool = False,
+                 agent_config: dict[str, Any] | None = None,
+                 planning_instructions: dict[str, str] | None = None):
+        self._memory_saver = DeltaMemorySaver()
         self._models = list({*[v['model'] for k, v in llm_config.items()]})
         self._message_memory = []
         self._llm_config = llm_config
         self._is_deep_agent = is_deep_agent
         self._runnable_config = runnable_config
+        self._agent_config = agent_config or {}
+        self._planning_instructions = planning_instructions or {}
+        self._default_planning_mode = self._agent_config.get('planning', {}).get('mode', PlanningMode.TOOLS)
+        planning_modes = [PlanningMode.TOOLS, PlanningMode.CONTEXT] if is_deep_agent else [None]
 
-        model_params = llm_config['reasoning_model']
-        base_llm = get_llm(model_name=model_params['model'],
-                           model_provider=model_params['model_provider'],
-                           api_key=model_params['api_key'],
-                           model_args=model_params['model_args'])
-
-
-        self._model_name = model_params['model']
-        self._structured_llm = base_llm.bind_tools(tools=tools)
+        # Tools are bound to every configured model (and planning mode), so both can be picked per LLM iteration
+        self._structured_llms = dict()
+        self._model_names = dict()
+        self._max_llm_retries = dict()
+        self._llm_rate_limiters = dict()
+        for model_key, model_params in llm_config.items():
+            base_llm = get_llm(model_name=model_params['model'],
+                               model_provider=model_params['model_provider'],
+                               api_key=model_params['api_key'],
+                               model_args=model_params['model_args'])
+            for planning_mode in planning_modes:
+                bound_tools = tools if planning_mode is None else get_planning_tools(tools=tools, planning_mode=planning_mode)
+                self._structured_llms[(model_key, planning_mode)] = base_llm.bind_tools(tools=bound_tools)
+            self._model_names[model_key] = model_params['model']
+            self._max_llm_retries[model_key] = model_params.get('max_llm_retries', 0)
+            self._llm_rate_limiters[model_key] = get_rate_limiter(
+                provider=model_params['model_provider'],
+                limits=self._agent_config.get('rate_limits', {}).get(model_params['model_provider']),
+            )
+        self._model_router = ModelRouter(**self._agent_config.get('model_routing', {}))
         self._graph = self._build_graph()
         self._message_memory.append(SystemMessage(content=agent_instructions))
         self._tool_handlers = dict()
+        # Child classes provide the rules; the fast path stays inactive without them
+        self._fast_path = FastPath(rules=[])
+        self._prefetcher = Prefetcher(max_workers=self._agent_config.get('prefetch', {}).get('max_workers', 4))
+        self.session_store = get_session_store(**self._agent_config.get('session_store', {}))
+        self._cassette: Cassette | None = None
+        self._stats_lock = threading.Lock()
+        self._run_stats = {
+            'completed_runs': 0,
+            'completed_runs_cost': 0.0,
+            'cancelled_runs': 0,
+            'cancelled_research': 0,
+            'cancelled_runs_spent_cost': 0.0,
+            'cancelled_runs_saved_cost': 0.0,
+        }
 
     def get_model_names(self) -> list[str]:
         return self._models
 
-    async def run(self, query: str) -> dict[str, Any]:
-        self._message_memory.append(HumanMessage(content=query))
+    def get_model_routing_stats(self) -> dict[str, Any]:
+        return self._model_router.get_stats()
+
+    def get_fast_path_stats(self) -> dict[str, Any]:
+        return self._fast_path.get_stats()
+
+    def get_prefetch_stats(self) -> dict[str, Any]:
+        return self._prefetcher.get_stats()
+
+    def get_llm_config(self) -> dict[str, Any]:
+        return self._llm_config
+
+    def get_run_stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            return dict(self._run_stats)
+
+    def _add_run_stats(self, **increments):
+        with self._stats_lock:
+            for k, v in increments.items():
+                self._run_stats[k] += v
+
+    async def run(self,
+                  query: str,
+                  planning_mode: str | None = None,
+                  budget: ExecutionBudget | dict[str, Any] | None = None,
+                  cancellation_token: CancellationToken | None = None,
+                  session_id: str | None = None,
+                  **run_options) -> dict[str, Any]:
+        """
+        Run the agent on the query and return the answer with its usage and cost.
+
+        With a `session_id`, the conversation is continued from (and saved to) the session store, so that any
+        process can serve it; otherwise the agent's own in-process conversation is used.
+        `run_options` are per-request options visible to the tool handlers through `get_run_option`.
+        """
+        with use_run_options(**run_options):
+            return await self._run(query=query, planning_mode=planning_mode, budget=budget,
+                                   cancellation_token=cancellation_token, session_id=session_id)
+
+    async def astream(self,
+                      query: str,
+                      planning_mode: str | None = None,
+                      budget: ExecutionBudget | dict[str, Any] | None = None,
+                      cancellation_token: CancellationToken | None = None,
+                      session_id: str | None = None,
+                      **run_options) -> AsyncIterator[dict[str, Any]]:
+        """
+        Run the agent on the query, yielding progress events as they happen:
+            {'type': 'token', 'content': str}: text generated by the model
+            {'type': 'tool_start', 'name': str, 'args': dict}: a tool call requested by the model
+            {'type': 'tool_end', 'name': str}: a tool call finished
+            {'type': 'done', 'output': dict}: the output of `run`, always the last event
+        """
+        token = cancellation_token or CancellationToken()
+        events = asyncio.Queue()
+        with use_run_options(**run_options):
+            task = asyncio.create_task(self._run(query=query, planning_mode=planning_mode, budget=budget, cancellation_token=token,
+                                                 session_id=session_id, on_event=events.put_nowait))
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            yield {'type': 'done', 'output': await task}
+        finally:
+            # The consumer stopped early (e.g. the client went away)
+            if not task.done():
+                token.cancel(reason='stream_closed')
+                task.cancel()
+
+    async def _run(self,
+                   query: str,
+                   planning_mode: str | None,
+                   budget: ExecutionBudget | dict[str, Any] | None,
+                   cancellation_token: CancellationToken | None,
+                   session_id: str | None = None,
+                   on_event: Callable[[dict[str, Any]], None] | None = None) -> dict[str, Any]:
+        if planning_mode is not None and planning_mode not in (PlanningMode.TOOLS, PlanningMode.CONTEXT):
+            raise ValueError(f'Invalid planning mode {planning_mode}! - Can be either {PlanningMode.TOOLS} or {PlanningMode.CONTEXT}')
+        token = cancellation_token or CancellationToken()
+        token.raise_if_cancelled()
+        if self._cassette is not None:
+            self._cassette.note(kind='run', label='run', request=query,
+                                response={'query': query, 'planning_mode': planning_mode, 'budget': budget.model_dump() if isinstance(budget, BaseModel) else budget})
+        if session_id is None:
+            messages, todos = list(self._message_memory), []
+        else:
+            session = await asyncio.to_thread(self.session_store.load, session_id)
+            messages, todos = [self._message_memory[0]] + session['messages'], session['todos']
+        n_prior_messages = len(messages)
+
+        out_dict = await self._run_fast_path(query=query, messages=messages)
+        if out_dict is not None:
+            await self._save_conversation(session_id=session_id, messages=messages, n_prior_messages=n_prior_messages,
+                                          todos=todos, token_usage=out_dict['token_usage'], stop_reason=out_dict['stop_reason'])
+            if on_event is not None:
+                on_event({'type': 'token', 'content': out_dict['content']})
+            return out_dict
+
+        messages.append(HumanMessage(content=query))
+        if budget is None:
+            budget = self._agent_config.get('budget')
+        if isinstance(budget, dict):
+            budget = ExecutionBudget(**budget)
 
         if self._is_deep_agent:
             in_state = DeepAgentState(
-                messages=self._message_memory,
-                token_usage={m: {'input_tokens': 0, 'output_tokens': 0} for m in self._models},
-                todos=[]
+                messages=messages,
+                token_usage=self._get_empty_token_usage(),
+                started_at=time.time(),
+                budget=budget,
+                todos=todos,
+                planning_mode=planning_mode or self._default_planning_mode,
             )
         else:
             in_state = AgentState(
-                messages=self._message_memory,
-                token_usage={m: {'input_tokens': 0, 'output_tokens': 0} for m in self._models},
+                messages=messages,
+                token_usage=self._get_empty_token_usage(),
+                started_at=time.time(),
+                budget=budget,
             )
 
-        out_state = await self._graph.ainvoke(in_state, self._runnable_config)
-        self._message_memory = out_state['messages']
+        # Lookups the model is expected to ask for run concurrently with the first LLM call
+        prefetch_keys = self._start_prefetch(query=query) if self._agent_config.get('prefetch', {}).get('enabled', False) else []
+        timeouts = [x for x in [budget.max_wall_time_seconds if budget is not None else None, token.get_remaining_seconds()] if x is not None]
+        config = self._get_run_config()
+        try:
+            # The token is visible to the graph nodes, tool handlers and research through a context variable
+            with use_cancellation_token(token=token):
+                out_state = await asyncio.wait_for(self._execute_graph(in_state=in_state, config=config, on_event=on_event),
+                                                   timeout=min(timeouts) if len(timeouts) > 0 else None)
+        except asyncio.TimeoutError:
+            # Wall time or deadline ran out in the middle of a node; stop its worker and finish from the last checkpoint
+            is_deadline = token.deadline is not None and (budget is None or budget.max_wall_time_seconds is None or
+                                                          token.deadline <= in_state.started_at + budget.max_wall_time_seconds)
+            token.cancel(reason=StopReason.DEADLINE if is_deadline else StopReason.MAX_WALL_TIME)
+            out_state = await self._stop_from_checkpoint(stop_reason={
+                'code': token.reason,
+                'limit': token.deadline - in_state.started_at if is_deadline else budget.max_wall_time_seconds,
+                'value': time.time() - in_state.started_at,
+            }, in_state=in_state, config=config)
+        except (RunCancelledError, asyncio.CancelledError):
+            token.cancel()
+            out_state = await self._stop_from_checkpoint(stop_reason={'code': StopReason.CANCELLED, 'limit': None, 'value': token.reason},
+                                                   in_state=in_state, config=config)
+            await self._save_conversation(session_id=session_id, messages=out_state['messages'], n_prior_messages=n_prior_messages,
+                                          todos=out_state.get('todos', []), token_usage=out_state['token_usage'],
+                                          stop_reason=out_state['stop_reason'])
+            self._record_cancelled_run(token_usage=out_state['token_usage'])
+            raise
+        finally:
+            self._prefetcher.discard(keys=prefetch_keys)
+            self._memory_saver.delete_thread(config['configurable']['thread_id'])
+        await self._save_conversation(session_id=session_id, messages=out_state['messages'], n_prior_messages=n_prior_messages,
+                                      todos=out_state.get('todos', []), token_usage=out_state['token_usage'],
+                                      stop_reason=out_state['stop_reason'])
         cost_list, total_cost = calculate_token_cost(llm_config=self._llm_config, token_usage=out_state['token_usage'])
+        self._add_run_stats(completed_runs=1, completed_runs_cost=total_cost)
 
         out_dict = {
             'content': out_state['messages'][-1].content,
             'token_usage': out_state['token_usage'],
             'cost_list': cost_list,
             'total_cost': total_cost,
+            'llm_calls': out_state['llm_calls'],
+            'stop_reason': out_state['stop_reason'],
+            'fast_path': False,
         }
 
         return out_dict
 
-    def _llm_call(self, state: BaseModel) -> BaseModel:
+    def use_cassette(self, cassette: Cassette):
+        """
+        Record the external calls of the following runs to the cassette, or replay them from it.
+        Child classes route their own external clients (database, research, ...) through it as well.
+        """
+        self._cassette = cassette
+        self._structured_llms = {
+            k: CassetteLLM(llm=v, cassette=cassette, model_name=self._model_names[k[0]]) for k, v in self._structured_llms.items()
+        }
+
+    async def warm_up(self) -> dict[str, float]:
+        """
+        Pass through the compiled graph once on a throwaway thread, stopped by a zero iteration budget before any
+        LLM call, so that the first request does not pay for first-use initialization. Returns the timings in seconds.
+        """
+        time1 = time.perf_counter()
+        state_kwargs = {
+            'messages': [self._message_memory[0], HumanMessage(content='warm-up')],
+            'token_usage': self._get_empty_token_usage(),
+            'started_at': time.time(),
+            'budget': ExecutionBudget(max_iterations=0),
+        }
+        if self._is_deep_agent:
+            in_state = DeepAgentState(**state_kwargs, todos=[], planning_mode=self._default_planning_mode)
+        else:
+            in_state = AgentState(**state_kwargs)
+        config = self._get_run_config()
+        try:
+            await self._graph.ainvoke(in_state, config)
+        finally:
+            self._memory_saver.delete_thread(config['configurable']['thread_id'])
+        return {'graph': time.perf_counter() - time1}
+
+    def _get_run_config(self) -> RunnableConfig:
+        # Every run gets its own graph thread, so that concurrent runs (sessions) do not share checkpoints
+        return RunnableConfig(**{**self._runnable_config,
+                                 'configurable': {**self._runnable_config['configurable'], 'thread_id': str(uuid4())}})
+
+    async def _save_conversation(self,
+                                 session_id: str | None,
+                                 messages: list,
+                                 n_prior_messages: int,
+                                 todos: list,
+                                 token_usage: dict[str, dict[str, int]],
+                                 stop_reason: dict[str, Any] | None):
+        if session_id is None:
+            self._message_memory = messages
+        else:
+            # Shown with the answer in the conversation history
+            _, total_cost = calculate_token_cost(llm_config=self._llm_config, token_usage=token_usage)
+            metadata = {'token_usage': token_usage, 'total_cost': total_cost, 'stop_reason': stop_reason}
+            await asyncio.to_thread(self.session_store.save, session_id, messages[n_prior_messages:], todos, token_usage, metadata)
+
+    async def _execute_graph(self, in_state: BaseModel, config: RunnableConfig, on_event: Callable[[dict[str, Any]], None] | None) -> dict[str, Any]:
+        if on_event is None:
+            return await self._graph.ainvoke(in_state, config)
+
+        async for mode, chunk in self._graph.astream(in_state, config, stream_mode=['messages', 'updates']):
+            if mode == 'messages':
+                message, metadata = chunk
+                if metadata.get('langgraph_node') == Node.LLM_CALL and isinstance(message.content, str) and len(message.content) > 0:
+                    on_event({'type': 'token', 'content': message.content})
+                continue
+            for node, update in chunk.items():
+                messages = dict(update or {}).get('messages', [])
+                if node == Node.LLM_CALL and len(messages) > 0 and isinstance(messages[-1], AIMessage):
+                    for tool_call in messages[-1].tool_calls:
+                        on_event({'type': 'tool_start', 'name': tool_call['name'], 'args': tool_call['args']})
+                elif node == Node.TOOLS_CALL:
+                    for message in reversed(messages):
+                        if not isinstance(message, ToolMessage):
+                            break
+                        on_event({'type': 'tool_end', 'name': message.name})
+        snapshot = await self._graph.aget_state(config)
+        return dict(snapshot.values)
+
+    def _record_cancelled_run(self, token_usage: dict[str, Any]):
+        # What a cancelled run would have cost is unknown; the mean cost of completed runs is the estimate
+        _, spent_cost = calculate_token_cost(llm_config=self._llm_config, token_usage=token_usage)
+        with self._stats_lock:
+            n_completed = self._run_stats['completed_runs']
+            mean_cost = self._run_stats['completed_runs_cost'] / n_completed if n_completed > 0 else 0.0
+        self._add_run_stats(cancelled_runs=1,
+                            cancelled_runs_spent_cost=spent_cost,
+                            cancelled_runs_saved_cost=max(mean_cost - spent_cost, 0.0))
+
+    async def _stop_from_checkpoint(self, stop_reason: dict[str, Any], in_state: BaseModel, config: RunnableConfig) -> dict[str, Any]:
+        snapshot = await self._graph.aget_state(config)
+        # Before the first checkpoint, the input state is the latest state there is
+        out_state = dict(snapshot.values) if len(snapshot.values) > 0 else {k: getattr(in_state, k) for k in type(in_state).model_fields}
+        messages = list(out_state['messages'])
+        # Tool calls that never ran still need a result, otherwise the conversation cannot be continued
+        last_message = messages[-1]
+        if isinstance(last_message, AIMessage) and len(last_message.tool_calls) > 0:
+            messages.extend(ToolMessage(content="Not executed: the run was stopped.", name=x['name'], tool_call_id=x['id'])
+                            for x in last_message.tool_calls)
+        messages.append(AIMessage(content=_get_best_effort_answer(messages=messages, stop_reason=stop_reason)))
+        out_state['messages'] = messages
+        out_state['stop_reason'] = stop_reason
+        return out_state
+
+    async def _run_fast_path(self, query: str, messages: list) -> dict[str, Any] | None:
+        """Answer the query without the LLM if a fast path rule matches; the exchange is appended to `messages`."""
+        matched = self._fast_path.match(query=query)
+        if matched is None:
+            return None
+
+        rule, args = matched
+        tool_call = {'name': rule.tool_name, 'args': args, 'id': f'fast_path_{uuid4().hex}'}
+        state = AgentState(messages=list(messages), token_usage=self._get_empty_token_usage())
+        # Handlers are blocking (database / network), keep them off the event loop
+        _, tool_message_content = await asyncio.to_thread(self._tool_handlers[rule.tool_name], tool_call, state)
+        answer = rule.format_answer(args, tool_message_content)
+        if answer is None:
+            self._fast_path.record_fallback()
+            return None
+
+        self._fast_path.record_hit()
+        messages.extend([HumanMessage(content=query), AIMessage(content=answer)])
+        token_usage = self._get_empty_token_usage()
+        cost_list, total_cost = calculate_token_cost(llm_config=self._llm_config, token_usage=token_usage)
+        return {
+            'content': answer,
+            'token_usage': token_usage,
+            'cost_list': cost_list,
+            'total_cost': total_cost,
+            'llm_calls': 0,
+            'stop_reason': None,
+            'fast_path': True,
+        }
+
+    def _start_prefetch(self, query: str) -> list[tuple]:
+        """Submit speculative lookups for the query to `self._prefetcher` and return their keys. Child classes override this."""
+        return []
+
+    def _get_empty_token_usage(self) -> dict[str, dict[str, int]]:
+        return {m: {'input_tokens': 0, 'output_tokens': 0} for m in self._models}
+
+    def _get_llm_messages(self, state: BaseModel) -> list:
+        # The system message is assembled per call, so that the planning mode can change per request
+        if not self._is_deep_agent:
+            return state.messages
+        system_prompt = state.messages[0].content + self._planning_instructions.get(state.planning_mode, '')
+        if state.planning_mode == PlanningMode.CONTEXT:
+            todos = render_todos(todos=state.todos) if len(state.todos) > 0 else "The TODO list is empty.\n"
+            system_prompt += CURRENT_TODOS_TEMPLATE.format(todos=todos)
+        return [SystemMessage(content=system_prompt)] + state.messages[1:]
+
+    def _llm_call(self, state: BaseModel) -> dict[str, Any]:
+        _raise_if_cancelled()
+        n_messages, token_usage = self._start_update(state=state)
+        _, state.total_cost = calculate_token_cost(llm_config=self._llm_config, token_usage=state.token_usage)
+        stop_reason = check_budget(budget=state.budget,
+                                   llm_calls=state.llm_calls,
+                                   token_usage=state.token_usage,
+                                   total_cost=state.total_cost,
+                                   elapsed_seconds=time.time() - state.started_at)
+        if stop_reason is not None:
+            # Ends the run: the answer has no tool calls
+            state.stop_reason = stop_reason
+            state.messages.append(AIMessage(content=_get_best_effort_answer(messages=state.messages, stop_reason=stop_reason)))
+            return self._get_update(state=state, n_messages=n_messages, token_usage=token_usage)
+
+        model_key = self._model_router.select(messages=state.messages)
+        model_name = self._model_names[model_key]
+        rate_limiter = self._llm_rate_limiters[model_key]
+        max_llm_retries = self._max_llm_retries[model_key]
+        structured_llm = self._structured_llms[(model_key, state.planning_mode if self._is_deep_agent else None)]
+
+        messages = self._get_llm_messages(state=state)
+        estimated_tokens = estimate_tokens(messages=messages)
         with get_usage_metadata_callback() as cb:
-            response = self._structured_llm.invoke(state.messages)
-            state.token_usage[self._model_name]['input_tokens'] += cb.usage_metadata[self._model_name]['input_tokens']
-            state.token_usage[self._model_name]['output_tokens'] += cb.usage_metadata[self._model_name]['output_tokens']
+            for attempt in range(max_llm_retries + 1):
+                try:
+                    # The tokens are reserved once; `record_usage` below corrects the reservation for the whole call
+                    with rate_limiter.acquire(tokens=estimated_tokens if attempt == 0 else 0):
+                        response = structured_llm.invoke(messages)
+                    break
+                except Exception as e:
+                    if attempt == max_llm_retries:
+                        raise
+                    backoff = get_backoff_seconds(attempt=attempt)
+                    if is_rate_limit_error(error=e):
+                        # Pause every caller of the provider instead of letting each one retry on its own
+                        rate_limiter.back_off(seconds=backoff)
+                    else:
+                        time.sleep(backoff)
+                    rate_limiter.record_retry()
+
+            # A replayed response does not reach the callback, but carries its usage metadata
+            usage = cb.usage_metadata.get(model_name) or response.usage_metadata
+            rate_limiter.record_usage(
+                estimated_tokens=estimated_tokens,
+                actual_tokens=usage['input_tokens'] + usage['output_tokens'],
+            )
+            state.token_usage[model_name]['input_tokens'] += usage['input_tokens']
+            state.token_usage[model_name]['output_tokens'] += usage['output_tokens']
             state.messages.extend([response])
-        return state
+            state.llm_calls += 1
+        _, state.total_cost = calculate_token_cost(llm_config=self._llm_config, token_usage=state.token_usage)
+        return self._get_update(state=state, n_messages=n_messages, token_usage=token_usage)
 
-    def _tools_call(self, state: BaseModel) -> BaseModel:
+    def _tools_call(self, state: BaseModel) -> dict[str, Any]:
+        n_messages, token_usage = self._start_update(state=state)
         for tool_call in state.messages[-1].tool_calls:
+            _raise_if_cancelled()
+            # TODO list updates piggy-backed on regular tool calls (PlanningMode.CONTEXT). The tool call is copied,
+            # as the recorded message must keep the arguments the model emitted
+            tool_call = {**tool_call, 'args': dict(tool_call['args'])}
+            todos = tool_call['args'].pop('todos', None) if tool_call['name'] != 'WriteTodos' else None
+            if todos is not None and self._is_deep_agent:
+                state, _ = write_todos(todos=todos, state=state)
+
             handler = self._tool_handlers.get(tool_call['name'])
+            time1 = time.perf_counter()
             if handler:
                 state, tool_message_content = handler(tool_call, state)
             else:
                 tool_message_content = f"Unknown tool call: {tool_call['name']}"
+            if self._cassette is not None:
+                self._cassette.note(kind='tool', label=tool_call['name'], request=tool_call['args'],
+                                    response=tool_message_content, seconds=time.perf_counter() - time1)
 
             state.messages.append(ToolMessage(
                 content=tool_message_content,
                 name=tool_call["name"],
                 tool_call_id=tool_call["id"],
             ))
-        return state
+        return self._get_update(state=state, n_messages=n_messages, token_usage=token_usage)
+
+    @staticmethod
+    def _start_update(state: BaseModel) -> tuple[int, dict[str, dict[str, int]]]:
+        # Nodes (and the tool handlers) change the state in place; they get their own copies of the reduced fields,
+        # so that the graph's values only change through the reducers
+        token_usage = state.token_usage
+        state.messages = list(state.messages)
+        state.token_usage = {k: dict(v) for k, v in token_usage.items()}
+        return len(state.messages), token_usage
+
+    def _get_update(self, state: BaseModel, n_messages: int, token_usage: dict[str, dict[str, int]]) -> dict[str, Any]:
+        """What the node changed: the added messages and used tokens as deltas, and the new values of the other fields."""
+        update = {
+            'messages': state.messages[n_messages:],
+            'token_usage': {
+                m: {k: v - token_usage.get(m, {}).get(k, 0) for k, v in usage.items()} for m, usage in state.token_usage.items()
+            },
+            'llm_calls': state.llm_calls,
+            'total_cost': state.total_cost,
+            'stop_reason': state.stop_reason,
+        }
+        if self._is_deep_agent:
+            update['todos'] = state.todos
+        return update
 
     def _update_token_usage(self, state: AgentState, token_usage: dict[str, Any]) -> AgentState:
         for m in self._models:
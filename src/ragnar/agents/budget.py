@@ -0,0 +1,37 @@
+from typing import Any
+from pydantic import BaseModel, Field
+
+from .enums import StopReason
+
+
+class ExecutionBudget(BaseModel):
+    """Limits of a single agent run. None disables a limit."""
+    max_iterations: int | None = Field(default=None, description="Maximum number of LLM calls.")
+    max_input_tokens: int | None = Field(default=None, description="Maximum input tokens over all models, including research.")
+    max_output_tokens: int | None = Field(default=None, description="Maximum output tokens over all models, including research.")
+    max_cost: float | None = Field(default=None, description="Maximum cost in USD, as computed by calculate_token_cost.")
+    max_wall_time_seconds: float | None = Field(default=None, description="Maximum wall time of the run.")
+
+
+def check_budget(budget: ExecutionBudget | None,
+                 llm_calls: int,
+                 token_usage: dict[str, dict[str, int]],
+                 total_cost: float,
+                 elapsed_seconds: float) -> dict[str, Any] | None:
+    """Return a machine-readable stop reason if any limit of the budget is exhausted, else None."""
+    if budget is None:
+        return None
+
+    input_tokens = sum(x['input_tokens'] for x in token_usage.values())
+    output_tokens = sum(x['output_tokens'] for x in token_usage.values())
+    checks = [
+        (StopReason.MAX_ITERATIONS, budget.max_iterations, llm_calls),
+        (StopReason.MAX_INPUT_TOKENS, budget.max_input_tokens, input_tokens),
+        (StopReason.MAX_OUTPUT_TOKENS, budget.max_output_tokens, output_tokens),
+        (StopReason.MAX_COST, budget.max_cost, total_cost),
+        (StopReason.MAX_WALL_TIME, budget.max_wall_time_seconds, elapsed_seconds),
+    ]
+    for code, limit, value in checks:
+        if limit is not None and value >= limit:
+            return {'code': code, 'limit': limit, 'value': value}
+    return None
@@ -1,17 +1,31 @@
 import asyncio
-import json
+import threading
+import time
+from collections import Counter
+from functools import partial
 from typing import Any
 from uuid import uuid4
 
 from business_researcher import BusinessResearcher, SearchType
 from langchain_core.runnables import RunnableConfig
-from supabase import create_client, Client
-from ai_common import TavilySearchCategory, TavilySearchDepth
+from ai_common import calculate_token_cost
 
 from .base_agent import BaseAgent
-from .enums import Table, ColumnsBase, CompaniesColumns, PersonsColumns
+from .cassette import Cassette, CassetteRepository, CassetteResearcher
+from .fast_path import FastPath, FastPathRule
+from .merge import merge_entity
+from .name_index import NameIndex
+from .enums import Table, CompaniesColumns, PersonsColumns, PlanningMode
+from .read_mirror import ReadMirrorRepository
+from .repository import EntityRepository, get_repository
+from .rate_limiter import WEB_SEARCH_PROVIDER, get_rate_limiter
+from .research_profiles import ResearchProfileSelector, get_research_config
+from .search_cache import SEARCH_CLIENT_PATH, SearchCache, install_search_client
+from .run_context import RunCancelledError, get_cancellation_token, get_run_option, run_cancellable
+from .serialization import dumps, loads
+from .single_flight import SingleFlight
 from .state import AgentState
-from .planning_tools import WriteTodos, ReadTodos, PLANNING_INSTRUCTIONS, handle_write_todos, handle_read_todos
+from .planning_tools import PLANNING_INSTRUCTIONS, CONTEXT_PLANNING_INSTRUCTIONS, handle_write_todos, handle_read_todos
 from .tools import (
     ResearchPerson,
     ResearchCompany,
@@ -25,7 +39,12 @@ from .tools import (
     ListAllCompanyNamesFromDataBase,
     ListPersonsFromCompanyId,
 )
-from .utils import insert_entity_to_db, update_entity_in_db, fetch_entity_by_id, fetch_entity_by_name
+from .utils import (
+    insert_entity_to_db,
+    update_entity_in_db,
+    get_changed_columns,
+    normalize_name,
+)
 
 AGENT_INSTRUCTIONS = """
 You are a smart and helpful business intelligence assistant. Your name is Bia. You are a member of King Ragnar's team.
@@ -45,7 +64,7 @@ You have access to the following main tools:
 5. **FetchCompanyFromDataBase**: To get information about a company from the database.
 6. **FetchPersonFromDataBase**: To get information about a person from the database.
 7. **UpdateCompanyInDatabase**: To update already existing information about a company in the database.
-8. **UpdatePersonInDatabase**: To update already existing information about a person in the database. 
+8. **UpdatePersonInDatabase**: To update already existing information about a person in the database.
 9. **ListAllPersonNamesFromDataBase**: To get the list of all person names in the database.
 10. **ListAllCompanyNamesFromDataBase**: To get the list of all company names in the database.
 11. **ListPersonsFromCompanyId**: To get the list of all persons in a given company.
@@ -64,30 +83,8 @@ You have access to the following main tools:
     - If there is information about the person in the database, return the information.
     - If there is not any information about the person in the database, perform a research about the person (by using ResearchPerson).
     - If you perform a research about a person (by using ResearchPerson), ask the user for confirmation to save the new information to the database.
-* When the user wants you to update the information about a specific company in the database:
-    - Be sure to include the union of the alternative names information both from the existing database record, and the fresh information about the company.
-    - If the name of the company is found as an alternative name in the new information, add the name of the company in the old record to the union of alternative names.
-    - Be sure to include the union of key executives both from the existing database record, and the fresh information about the company.
-    - Be sure to include the union of similar companies both from the existing database record, and the fresh information about the company.
-    - Example: 
-        + old record in the database: {
-            name: 'Perplexity AI', 
-            alternative_names: ['Perplexity', 'Perplexity Inc'], 
-            key_executives: ['Aravind Srinivas'], 
-            similar_companies: ['Anthropic', 'OpenAI']
-        }
-        + new record for update: {
-            name: 'Perplexity', 
-            alternative_names: ['Perplexity Inc.'], 
-            key_executives: ['Denis Yarats'],
-            similar_companies: ['Hugging Face', 'Glean']
-        }
-        + updated record should be: {
-            name: 'Perplexity', 
-            alternative_names: ['Perplexity Inc.', 'Perplexity', 'Perplexity Inc', 'Perplexity AI'], 
-            key_executives: ['Aravind Srinivas', 'Denis Yarats'],
-            similar_companies: ['Anthropic', 'OpenAI', 'Hugging Face', 'Glean']
-        }        
+* When the user wants you to update the information about a specific company or person in the database:
+    - Only send the id and the new values of the fields that changed. List fields (alternative names, key executives, similar companies) are merged with the existing record, and the old name of a renamed company is kept as an alternative name.
 </Main Tools>
 """
 
@@ -99,20 +96,6 @@ You have access to the following advanced tools:
 </Advanced Tools>
 """
 
-BUSINESS_RESEARCH_CONFIG = RunnableConfig(
-        recursion_limit=100,
-        configurable = {
-            'thread_id': str(uuid4()),
-            'max_iterations': 5,
-            'max_results_per_query': 5,
-            'max_tokens_per_source': 10000,
-            'number_of_days_back': 360,
-            'number_of_queries': 4,
-            'search_category': TavilySearchCategory.GENERAL,
-            'search_depth': TavilySearchDepth.ADVANCED,
-            },
-        )
-
 TOOLS = [
             ResearchPerson,
             ResearchCompany,
@@ -127,27 +110,91 @@ TOOLS = [
             ListPersonsFromCompanyId,
         ]
 
-DEEP_AGENT_TOOLS = [
-            WriteTodos,
-            ReadTodos,
-        ]
+_FAST_PATH_PREFIX = r'(?:please\s+)?'
+_FAST_PATH_SUFFIX = r'(?:\s+(?:in|from)\s+the\s+(?:database|db))?\s*[.!?]?'
+
+
+def _format_changed_columns(changed_columns: list[str]) -> str:
+    if len(changed_columns) == 0:
+        return " No column was changed."
+    return f" Changed columns: {', '.join(changed_columns)}."
+
+
+def _format_company_names(_args: dict[str, Any], content: str) -> str | None:
+    companies = loads(content)
+    if len(companies) == 0:
+        return "There are no companies in the database."
+    return "Companies in the database:\n\n" + "\n".join(f"- {x['name']}" for x in companies)
+
+
+def _format_person_names(_args: dict[str, Any], content: str) -> str | None:
+    persons = loads(content)
+    if len(persons) == 0:
+        return "There are no persons in the database."
+    return "Persons in the database:\n\n" + "\n".join(f"- {x['name']} ({x['current_company']})" for x in persons)
+
+
+def _format_persons_from_company(args: dict[str, Any], content: str) -> str | None:
+    persons = loads(content)
+    if len(persons) == 0:
+        return f"There are no persons with company id {args['company_id']} in the database."
+    return f"Persons at company {args['company_id']}:\n\n" + "\n".join(f"- {x['name']}" for x in persons)
+
+
+def _format_company_record(_args: dict[str, Any], content: str) -> str | None:
+    if content.startswith("There is no record"):
+        return None # The model decides whether to research instead
+    company = loads(content)
+    return "\n".join(f"- **{k}**: {v}" for k, v in company.items() if v not in (None, '', []))
+
+
+FAST_PATH_RULES = [
+    FastPathRule(
+        pattern=_FAST_PATH_PREFIX + r'(?:list|show)(?:\s+me)?(?:\s+all)?(?:\s+the)?\s+companies' + _FAST_PATH_SUFFIX,
+        tool_name='ListAllCompanyNamesFromDataBase',
+        build_args=lambda m: {},
+        format_answer=_format_company_names,
+    ),
+    FastPathRule(
+        pattern=_FAST_PATH_PREFIX + r'(?:list|show)(?:\s+me)?(?:\s+all)?(?:\s+the)?\s+(?:persons|people)' + _FAST_PATH_SUFFIX,
+        tool_name='ListAllPersonNamesFromDataBase',
+        build_args=lambda m: {},
+        format_answer=_format_person_names,
+    ),
+    FastPathRule(
+        pattern=_FAST_PATH_PREFIX + r'(?:list|show)(?:\s+me)?(?:\s+all)?(?:\s+the)?\s+(?:persons|people|employees)\s+(?:at|in|of|from)\s+company\s+(?:id\s+)?#?(?P<company_id>\d+)' + _FAST_PATH_SUFFIX,
+        tool_name='ListPersonsFromCompanyId',
+        build_args=lambda m: {'company_id': int(m.group('company_id'))},
+        format_answer=_format_persons_from_company,
+    ),
+    FastPathRule(
+        pattern=_FAST_PATH_PREFIX + r'(?:fetch|get)\s+(?:the\s+)?(?:company\s+)?(?P<company_name>[^,;]+?)\s+from\s+the\s+(?:database|db)\s*[.!?]?',
+        tool_name='FetchCompanyFromDataBase',
+        build_args=lambda m: {'company_name': m.group('company_name')},
+        format_answer=_format_company_record,
+    ),
+]
 
 class BusinessIntelligenceAgent(BaseAgent):
     def __init__(self,
                  llm_config: dict[str, Any],
                  web_search_api_key: str,
                  database_url: str,
-                 database_key: str):
+                 database_key: str,
+                 agent_config: dict[str, Any] | None = None):
 
         is_deep_agent = True
-        tools = TOOLS + DEEP_AGENT_TOOLS if is_deep_agent else TOOLS
-        instructions = AGENT_INSTRUCTIONS + ADVANCED_TOOL_INSTRUCTIONS.format(advanced_tools=PLANNING_INSTRUCTIONS) if is_deep_agent else AGENT_INSTRUCTIONS
 
         super().__init__(
             llm_config=llm_config,
-            tools=tools,
-            agent_instructions=instructions,
+            tools=TOOLS,
+            agent_instructions=AGENT_INSTRUCTIONS,
             is_deep_agent=is_deep_agent,
+            agent_config=agent_config,
+            planning_instructions={
+                PlanningMode.TOOLS: ADVANCED_TOOL_INSTRUCTIONS.format(advanced_tools=PLANNING_INSTRUCTIONS),
+                PlanningMode.CONTEXT: ADVANCED_TOOL_INSTRUCTIONS.format(advanced_tools=CONTEXT_PLANNING_INSTRUCTIONS),
+                },
             runnable_config=RunnableConfig(
                 recursion_limit=1_000,
                 configurable={
@@ -157,7 +204,33 @@ class BusinessIntelligenceAgent(BaseAgent):
                 ),
             )
         self.business_researcher = BusinessResearcher(llm_config = llm_config, web_search_api_key = web_search_api_key)
-        self.db_client: Client = create_client(supabase_url=database_url, supabase_key=database_key)
+        search_cache_config = {**self._agent_config.get('search_cache', {})}
+        self._search_cache = SearchCache(**search_cache_config) if search_cache_config.pop('enabled', False) else None
+        self._search_rate_limiter = get_rate_limiter(
+            provider=WEB_SEARCH_PROVIDER,
+            limits=self._agent_config.get('rate_limits', {}).get(WEB_SEARCH_PROVIDER),
+        )
+        # Every search of a research goes through the cache, then through the rate limiter on a miss
+        install_search_client(
+            researcher=self.business_researcher,
+            client_path=self._agent_config.get('web_search', {}).get('client_path', SEARCH_CLIENT_PATH),
+            cache=self._search_cache,
+            rate_limiter=self._search_rate_limiter,
+        )
+        database_config = {**self._agent_config.get('database', {})}
+        read_mirror_config = {**database_config.pop('read_mirror', {})}
+        self.repository: EntityRepository = get_repository(
+            **database_config,
+            database_url=database_url,
+            database_key=database_key,
+        )
+        self.read_mirror = None
+        if read_mirror_config.pop('enabled', False):
+            self.read_mirror = ReadMirrorRepository(primary=self.repository, **read_mirror_config)
+            self.repository = self.read_mirror
+        self._single_flight = SingleFlight(retry_on=(RunCancelledError,))
+        self._access_counts_lock = threading.Lock()
+        self._access_counts = Counter()  # (table name, id) -> number of times fetched
 
         # Tool dispatcher mapping
         self._tool_handlers = {
@@ -175,149 +248,330 @@ class BusinessIntelligenceAgent(BaseAgent):
             'WriteTodos': handle_write_todos,
             'ReadTodos': handle_read_todos,
         }
+        self._fast_path = FastPath(rules=FAST_PATH_RULES, **self._agent_config.get('fast_path', {}))
+        self._research_profile_selector = ResearchProfileSelector(**self._agent_config.get('research', {}))
+        self._name_index = NameIndex(
+            load_companies=self._load_company_names_and_aliases,
+            load_persons=lambda: [(x['name'], x['current_company']) for x in self.list_all_names(table_name=Table.PERSONS)],
+            ttl_seconds=self._agent_config.get('prefetch', {}).get('index_ttl_seconds', 300),
+        )
 
-    def research_person(self, name: str, company: str, state: AgentState) -> tuple[AgentState, dict[str, Any]]:
+    def research_person(self, name: str, company: str, state: AgentState, depth: str | None = None) -> tuple[AgentState, dict[str, Any]]:
         input_dict = {
             "name": name,
             "company": company,
             'search_type': SearchType.PERSON
         }
-        out_dict = self.run_research_loop(input_dict=input_dict)
-        state = self._update_token_usage(state=state, token_usage=out_dict['token_usage'])
+        profile = self.select_research_profile(requested=depth)
+        out_dict, is_shared = self._single_flight.do(
+            key=('research_person', normalize_name(name), normalize_name(company), profile),
+            fn=lambda: self.run_research_loop(input_dict=input_dict, profile=profile),
+        )
+        if not is_shared: # Coalesced callers did not spend any tokens
+            state = self._update_token_usage(state=state, token_usage=out_dict['token_usage'])
         return state, out_dict
 
-    def research_company(self, company_name: str, state: AgentState) -> tuple[AgentState, dict[str, Any]]:
+    def research_company(self, company_name: str, state: AgentState, depth: str | None = None) -> tuple[AgentState, dict[str, Any]]:
         input_dict = {
             "name": company_name,
             'search_type': SearchType.COMPANY
         }
-        out_dict = self.run_research_loop(input_dict=input_dict)
-        state = self._update_token_usage(state=state, token_usage=out_dict['token_usage'])
+        profile = self.select_research_profile(requested=depth)
+        out_dict, is_shared = self._single_flight.do(
+            key=('research_company', normalize_name(company_name), profile),
+            fn=lambda: self.run_research_loop(input_dict=input_dict, profile=profile),
+        )
+        if not is_shared: # Coalesced callers did not spend any tokens
+            state = self._update_token_usage(state=state, token_usage=out_dict['token_usage'])
         return state, out_dict
 
-    def run_research_loop(self, input_dict: dict[str, Any]) -> dict[str, Any]:
+    def select_research_profile(self, requested: str | None = None) -> str:
+        # `research_profile` / `research_latency_target_seconds` can be given per request as run options
+        return self._research_profile_selector.select(
+            requested=requested or get_run_option('research_profile'),
+            latency_target_seconds=get_run_option('research_latency_target_seconds'),
+        )
+
+    def run_research_loop(self, input_dict: dict[str, Any], profile: str | None = None) -> dict[str, Any]:
+        profile = profile or self.select_research_profile()
+        config = get_research_config(profile=profile)
+        # Searches are rate limited one by one by the search client wrapper. The researcher's LLM calls cannot be,
+        # so the tokens a research of this profile is expected to use are reserved up front and corrected afterwards.
+        estimated_tokens = self._research_profile_selector.get_expected_tokens(profile=profile)
+        self._reserve_research_llm_tokens(estimated_tokens=estimated_tokens)
+        time1 = time.time()
         event_loop = asyncio.new_event_loop()
-        out_dict = event_loop.run_until_complete(self.business_researcher.run(input_dict=input_dict, config=BUSINESS_RESEARCH_CONFIG))
-        event_loop.close()
+        try:
+            # Stops the research as soon as the run it belongs to is cancelled
+            out_dict = event_loop.run_until_complete(run_cancellable(
+                coroutine=self.business_researcher.run(input_dict=input_dict, config=config),
+                token=get_cancellation_token(),
+            ))
+        except RunCancelledError:
+            self._add_run_stats(cancelled_research=1)
+            raise
+        finally:
+            event_loop.run_until_complete(event_loop.shutdown_asyncgens())
+            event_loop.close()
+        self._record_research_llm_usage(token_usage=out_dict['token_usage'], estimated_tokens=estimated_tokens)
+        _, cost = calculate_token_cost(llm_config=self._llm_config, token_usage=out_dict['token_usage'])
+        self._research_profile_selector.record(profile=profile, seconds=time.time() - time1, token_usage=out_dict['token_usage'], cost=cost)
         return out_dict
 
+    def get_search_cache_stats(self) -> dict[str, Any]:
+        return self._search_cache.get_stats() if self._search_cache is not None else {}
+
+    def get_read_mirror_stats(self) -> dict[str, Any]:
+        return self.read_mirror.get_stats() if self.read_mirror is not None else {}
+
+    def get_research_profile_stats(self) -> dict[str, dict[str, Any]]:
+        return self._research_profile_selector.get_stats()
+
+    def _get_model_rate_limiters(self) -> dict[str, Any]:
+        model_providers = {v['model']: v['model_provider'] for v in self._llm_config.values()}
+        return {
+            model: get_rate_limiter(provider=provider, limits=self._agent_config.get('rate_limits', {}).get(provider))
+            for model, provider in model_providers.items()
+        }
+
+    def _reserve_research_llm_tokens(self, estimated_tokens: dict[str, int]):
+        # Waits until the providers' token budgets cover the estimate
+        for model, limiter in self._get_model_rate_limiters().items():
+            if estimated_tokens.get(model, 0) > 0:
+                limiter.reserve_tokens(tokens=estimated_tokens[model])
+
+    def _record_research_llm_usage(self, token_usage: dict[str, Any], estimated_tokens: dict[str, int]):
+        # The researcher calls the LLM providers internally; correct their limiters with the actual usage
+        for model, limiter in self._get_model_rate_limiters().items():
+            if model in token_usage or model in estimated_tokens:
+                usage = token_usage.get(model, {'input_tokens': 0, 'output_tokens': 0})
+                limiter.record_usage(
+                    estimated_tokens=estimated_tokens.get(model, 0),
+                    actual_tokens=usage['input_tokens'] + usage['output_tokens'],
+                )
+
     def insert_company_to_db(self, input_dict: dict[str, Any]):
-        idx = insert_entity_to_db(db_client=self.db_client, input_dict=input_dict, table_name=Table.COMPANIES)
+        idx = insert_entity_to_db(repository=self.repository, input_dict=input_dict, table_name=Table.COMPANIES)
         return idx
 
     def insert_person_to_db(self, input_dict: dict[str, Any], current_company_id: int):
         input_dict[PersonsColumns.CURRENT_COMPANY_ID] = current_company_id
         input_dict.pop('current_company')
-        idx = insert_entity_to_db(db_client=self.db_client, input_dict=input_dict, table_name=Table.PERSONS)
+        idx = insert_entity_to_db(repository=self.repository, input_dict=input_dict, table_name=Table.PERSONS)
         return idx
 
-    def update_company_in_db(self, input_dict: dict[str, Any]):
-        idx = update_entity_in_db(db_client=self.db_client, input_dict=input_dict, table_name=Table.COMPANIES)
-        return idx
-
-    def update_person_in_db(self, input_dict: dict[str, Any], new_company_id: int):
-        input_dict[PersonsColumns.CURRENT_COMPANY_ID] = new_company_id
-        input_dict.pop('current_company')
-        idx = update_entity_in_db(db_client=self.db_client, input_dict=input_dict, table_name=Table.PERSONS)
-        return idx
+    def update_company_in_db(self, input_dict: dict[str, Any], current_row: dict[str, Any], touch: bool = False) -> list[str]:
+        """
+        Merge the patch into the current row and write the changes. With `touch`, updated_at is written even if
+        nothing changed. Returns the changed columns.
+        """
+        patch = merge_entity(current_row=current_row, patch=input_dict, table_name=Table.COMPANIES)
+        changed_columns = list(get_changed_columns(current_row=current_row, patch=patch))
+        update_entity_in_db(repository=self.repository, input_dict=patch, table_name=Table.COMPANIES, current_row=current_row, touch=touch)
+        return changed_columns
+
+    def update_person_in_db(self,
+                            input_dict: dict[str, Any],
+                            new_company_id: int,
+                            current_row: dict[str, Any],
+                            touch: bool = False) -> list[str]:
+        """
+        Merge the patch into the current row and write the changes. With `touch`, updated_at is written even if
+        nothing changed. Returns the changed columns.
+        """
+        patch = {k: v for k, v in input_dict.items() if k != 'current_company'}
+        patch[PersonsColumns.CURRENT_COMPANY_ID] = new_company_id
+        patch = merge_entity(current_row=current_row, patch=patch, table_name=Table.PERSONS)
+        changed_columns = list(get_changed_columns(current_row=current_row, patch=patch))
+        update_entity_in_db(repository=self.repository, input_dict=patch, table_name=Table.PERSONS, current_row=current_row, touch=touch)
+        return changed_columns
 
     def fetch_company_by_name(self, company_name: str) -> list[dict[str, Any]]:
-        data = fetch_entity_by_name(db_client=self.db_client, entity_name=company_name, table_name=Table.COMPANIES)
+        # Database lookups are exact matches, so the raw name is the key
+        data, _ = self._single_flight.do(
+            key=('fetch_company_by_name', company_name),
+            fn=lambda: self._fetch_company_by_name(company_name=company_name),
+        )
+        return data
+
+    def _fetch_company_by_name(self, company_name: str) -> list[dict[str, Any]]:
+        data = self.repository.fetch_by_names(table_name=Table.COMPANIES, names=[company_name])
         if len(data) == 0:
-            response = (
-                self.db_client.table(Table.COMPANIES)
-                .select("*")
-                .contains(CompaniesColumns.ALTERNATIVE_NAMES, [company_name])
-                .execute()
-            )
-            data = response.data
+            data = self.repository.fetch_by_alternative_name(name=company_name)
         return data
 
     def fetch_company_by_id(self, company_id: int) -> list[dict[str, Any]]:
-        data = fetch_entity_by_id(db_client=self.db_client, table_name=Table.COMPANIES, entity_id=company_id)
+        data = self.repository.fetch_by_id(table_name=Table.COMPANIES, entity_id=company_id)
         return data
 
     def fetch_person_from_db(self, name: str, current_company_id: int | None) -> list[dict[str, Any]]:
+        data, _ = self._single_flight.do(
+            key=('fetch_person_from_db', name, current_company_id),
+            fn=lambda: self._fetch_person_from_db(name=name, current_company_id=current_company_id),
+        )
+        return data
+
+    def _fetch_person_from_db(self, name: str, current_company_id: int | None) -> list[dict[str, Any]]:
         if current_company_id is None:
-            data = fetch_entity_by_name(db_client=self.db_client, entity_name=name, table_name=Table.PERSONS)
+            data = self.repository.fetch_by_names(table_name=Table.PERSONS, names=[name])
         else:
-            response = (
-                self.db_client.table(Table.PERSONS)
-                .select("*")
-                .eq(PersonsColumns.NAME, name)
-                .eq(PersonsColumns.CURRENT_COMPANY_ID, current_company_id)
-                .execute()
-            )
-            data = response.data
+            data = self.repository.fetch_person(name=name, current_company_id=current_company_id)
         return data
 
-    def list_persons_from_company_id(self, company_id: int) -> list[dict[str, Any]]:
-        response = (
-            self.db_client.table(Table.PERSONS)
-            .select(PersonsColumns.NAME)
-            .eq(PersonsColumns.CURRENT_COMPANY_ID, company_id)
-            .execute()
+    def _load_company_names_and_aliases(self) -> list[tuple[str, list[str]]]:
+        data = self.repository.list_company_aliases()
+        return [(x[CompaniesColumns.NAME], x[CompaniesColumns.ALTERNATIVE_NAMES]) for x in data]
+
+    def _start_prefetch(self, query: str) -> list[tuple]:
+        max_entities = self._agent_config.get('prefetch', {}).get('max_entities', 3)
+        keys = []
+        for name, all_names in self._name_index.find_companies(query=query)[:max_entities]:
+            keys += self._prefetcher.submit(
+                keys=[('fetch_company', normalize_name(x)) for x in all_names],
+                fn=partial(self.fetch_company_by_name, company_name=name),
+            )
+        for name, company_name in self._name_index.find_persons(query=query)[:max_entities]:
+            keys += self._prefetcher.submit(
+                keys=[('fetch_person', normalize_name(name), normalize_name(company_name))],
+                fn=partial(self.fetch_person_with_company, name=name, company_name=company_name),
+            )
+        return keys
+
+    def fetch_person_with_company(self, name: str, company_name: str) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+        companies = self.fetch_company_by_name(company_name=company_name)
+        if len(companies) == 0:
+            return companies, []
+        persons = self.fetch_person_from_db(name=name, current_company_id=companies[0]['id'])
+        return companies, persons
+
+    def _count_access(self, table_name: str, rows: list[dict[str, Any]]):
+        with self._access_counts_lock:
+            self._access_counts.update((table_name, x['id']) for x in rows[:1])
+
+    def get_access_count(self, table_name: str, entity_id: int) -> int:
+        with self._access_counts_lock:
+            return self._access_counts[(table_name, entity_id)]
+
+    def get_most_accessed(self, table_name: str, limit: int) -> list[int]:
+        """Ids of the entities of the table fetched most often, most accessed first."""
+        with self._access_counts_lock:
+            counts = [(k[1], v) for k, v in self._access_counts.items() if k[0] == table_name]
+        counts.sort(key=lambda x: -x[1])
+        return [x[0] for x in counts[:limit]]
+
+    def refresh_company(self, company: dict[str, Any]) -> dict[str, Any]:
+        """Re-research a stored company and write the result back to its row."""
+        profile = self.select_research_profile()
+        out_dict, _ = self._single_flight.do(
+            key=('research_company', normalize_name(company['name']), profile),
+            fn=lambda: self.run_research_loop(input_dict={'name': company['name'], 'search_type': SearchType.COMPANY}, profile=profile),
         )
-        return response.data
+        # Marked as refreshed even if nothing changed, so that it is not picked again by the next cycle
+        self.update_company_in_db(input_dict={**out_dict['content'], 'id': company['id']}, current_row=company, touch=True)
+        self._prefetcher.invalidate()
+        return out_dict
 
-    def list_all_names(self, table_name: str) -> list[dict[str, Any]]:
-        out = []
-        match table_name:
-            case Table.COMPANIES:
-                response = (
-                    self.db_client.table(table_name)
-                    .select(ColumnsBase.NAME)
-                    .execute()
-                )
-                out = response.data
-            case Table.PERSONS:
-                response = (
-                    self.db_client.table(table_name)
-                    .select(f"{ColumnsBase.NAME}, {PersonsColumns.CURRENT_COMPANY_ID}, {Table.COMPANIES}!inner({ColumnsBase.NAME})")
-                    .execute()
-                )
-                out = [{'name': x['name'], 'current_company': x['companies']['name']} for x in response.data]
-            case _: # noinspection PyUnreachableCode
-                raise ValueError(f'Invalid table name! - Can be either {Table.COMPANIES} or {Table.PERSONS}')
+    def refresh_person(self, person: dict[str, Any]) -> dict[str, Any]:
+        """Re-research a stored person (row joined with the name of the current company) and write the result back."""
+        company_name = person[Table.COMPANIES]['name']
+        profile = self.select_research_profile()
+        out_dict, _ = self._single_flight.do(
+            key=('research_person', normalize_name(person['name']), normalize_name(company_name), profile),
+            fn=lambda: self.run_research_loop(input_dict={'name': person['name'], 'company': company_name, 'search_type': SearchType.PERSON}, profile=profile),
+        )
+        # Keep the stored company if the one found by the research is not in the database
+        companies = self.fetch_company_by_name(company_name=out_dict['content'].get('current_company') or company_name)
+        new_company_id = companies[0]['id'] if len(companies) > 0 else person[PersonsColumns.CURRENT_COMPANY_ID]
+        # Marked as refreshed even if nothing changed, so that it is not picked again by the next cycle
+        self.update_person_in_db(input_dict={**out_dict['content'], 'id': person['id']}, new_company_id=new_company_id,
+                                 current_row=person, touch=True)
+        self._prefetcher.invalidate()
+        return out_dict
+
+    def get_single_flight_stats(self) -> dict[str, dict[str, int]]:
+        return self._single_flight.get_stats()
+
+    def list_persons_from_company_id(self, company_id: int) -> list[dict[str, Any]]:
+        return self.repository.list_persons_from_company_id(company_id=company_id)
+
+    def use_cassette(self, cassette: Cassette):
+        super().use_cassette(cassette=cassette)
+        self.repository = CassetteRepository(repository=self.repository, cassette=cassette)
+        self.business_researcher = CassetteResearcher(researcher=self.business_researcher, cassette=cassette)
+
+    async def warm_up(self) -> dict[str, float]:
+        """
+        Open the database connection, load the read mirror (if enabled) and the name index, then warm up the graph.
+        Returns the timings in seconds.
+        """
+        timings = {}
+        steps = [('database', self.check_database)]
+        if self.read_mirror is not None:
+            steps.append(('read_mirror', self.read_mirror.sync))
+        for name, fn in steps + [('name_index', self._name_index.refresh)]:
+            time1 = time.perf_counter()
+            await asyncio.to_thread(fn)
+            timings[name] = time.perf_counter() - time1
+        return {**timings, **await super().warm_up()}
+
+    def check_database(self):
+        """Raises if the database cannot be reached. Costs a single-row query, so it is safe for frequent health checks."""
+        self.repository.probe()
 
-        return out
+    def list_all_names(self, table_name: str) -> list[dict[str, Any]]:
+        return self.repository.list_names(table_name=table_name)
 
     def _handle_research_person(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
         state, out_dict = self.research_person(
             name=tool_call['args']['name'],
             company=tool_call['args']['company'],
-            state=state
+            state=state,
+            depth=tool_call['args'].get('depth'),
         )
-        return state, json.dumps(out_dict['content'], indent=2)
+        return state, dumps(out_dict['content'])
 
     def _handle_research_company(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
         state, out_dict = self.research_company(
             company_name=tool_call['args']['company_name'],
-            state=state
+            state=state,
+            depth=tool_call['args'].get('depth'),
         )
-        return state, json.dumps(out_dict['content'], indent=2)
+        return state, dumps(out_dict['content'])
 
     def _handle_fetch_company(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
-        response = self.fetch_company_by_name(company_name=tool_call['args']['company_name'])
+        company_name = tool_call['args']['company_name']
+        # Prefetches are keyed by normalized names and aliases; one is served only if it is the record the exact
+        # lookup of the argument would return
+        is_prefetched, response = self._prefetcher.take(
+            key=('fetch_company', normalize_name(company_name)),
+            is_valid=lambda x: len(x) > 0 and x[0]['name'] == company_name,
+        )
+        if not is_prefetched:
+            response = self.fetch_company_by_name(company_name=company_name)
+        self._count_access(table_name=Table.COMPANIES, rows=response)
         if len(response) > 0:
             company = response[0]
-            message = json.dumps(company, indent=2)
+            message = dumps(company)
         else:
-            message = f"There is no record for {tool_call['args']['company_name']} in database."
+            message = f"There is no record for {company_name} in database."
         return state, message
 
     def _handle_fetch_person(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
         name = tool_call['args']['name']
         company_name = tool_call['args']['company']
-        response = self.fetch_company_by_name(company_name=company_name)
-
-        if len(response) > 0:
-            company = response[0]
-            current_company_id = company['id']
-            response = self.fetch_person_from_db(name=name, current_company_id=current_company_id)
-            if len(response) > 0:
-                person = response[0]
-                message = json.dumps(person, indent=2)
+        is_prefetched, response = self._prefetcher.take(
+            key=('fetch_person', normalize_name(name), normalize_name(company_name)),
+            is_valid=lambda x: len(x[0]) > 0 and x[0][0]['name'] == company_name and len(x[1]) > 0 and x[1][0]['name'] == name,
+        )
+        if not is_prefetched:
+            response = self.fetch_person_with_company(name=name, company_name=company_name)
+        companies, persons = response
+        self._count_access(table_name=Table.PERSONS, rows=persons)
+
+        if len(companies) > 0:
+            if len(persons) > 0:
+                person = persons[0]
+                message = dumps(person)
             else:
                 message = f"There is no record for {name} from {company_name} in database."
         else:
@@ -328,6 +582,7 @@ class BusinessIntelligenceAgent(BaseAgent):
         return state, message
 
     def _handle_insert_company(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
+        self._prefetcher.invalidate() # Prefetched reads may be stale after a write
         company_name = tool_call['args']['name']
         response = self.fetch_company_by_name(company_name=company_name)
         if len(response) > 0:
@@ -339,6 +594,7 @@ class BusinessIntelligenceAgent(BaseAgent):
         return state, message
 
     def _handle_insert_person(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
+        self._prefetcher.invalidate() # Prefetched reads may be stale after a write
         name = tool_call['args']['name']
         current_company = tool_call['args']['current_company']
 
@@ -363,37 +619,50 @@ class BusinessIntelligenceAgent(BaseAgent):
         return state, message
 
     def _handle_update_company(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
-        idx = self.update_company_in_db(input_dict=tool_call['args'])
-        message = f"{tool_call['args']['name']} in database {Table.COMPANIES} table with id {idx} is successfully updated."
-        return state, message
+        self._prefetcher.invalidate() # Prefetched reads may be stale after a write
+        patch = {k: v for k, v in tool_call['args'].items() if v is not None}
+        response = self.fetch_company_by_id(company_id=patch['id'])
+        if len(response) == 0:
+            return state, f"There is no record with id {patch['id']} in database {Table.COMPANIES} table."
+
+        company = response[0]
+        changed_columns = self.update_company_in_db(input_dict=patch, current_row=company)
+        message = f"{patch.get('name', company['name'])} in database {Table.COMPANIES} table with id {company['id']} is successfully updated."
+        return state, message + _format_changed_columns(changed_columns)
 
     def _handle_update_person(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
-        name = tool_call['args']['name']
-        new_company = tool_call['args']['current_company']
+        self._prefetcher.invalidate() # Prefetched reads may be stale after a write
+        patch = {k: v for k, v in tool_call['args'].items() if v is not None}
+        response = self.repository.fetch_by_id(table_name=Table.PERSONS, entity_id=patch['id'])
+        if len(response) == 0:
+            return state, f"There is no record with id {patch['id']} in database {Table.PERSONS} table."
+
+        person = response[0]
+        name = patch.get('name', person['name'])
+        new_company_id = person[PersonsColumns.CURRENT_COMPANY_ID]
+        new_company = patch.get('current_company')
+        if new_company is not None:
+            response = self.fetch_company_by_name(company_name=new_company)
+            if len(response) > 0:
+                new_company_id = response[0]['id']
+            else:
+                state, out_dict = self.research_company(company_name=new_company, state=state)
+                new_company_id = self.insert_company_to_db(input_dict=out_dict['content'])
 
-        response = self.fetch_company_by_name(company_name=new_company)
-        if len(response) > 0:
-            company = response[0]
-            new_company_id = company['id']
-            idx = self.update_person_in_db(input_dict=tool_call['args'], new_company_id=new_company_id)
-            message = f"{name} in database {Table.PERSONS} table with id {idx} is successfully updated."
-        else:
-            state, out_dict = self.research_company(company_name=new_company, state=state)
-            new_company_id = self.insert_company_to_db(input_dict=out_dict['content'])
-            idx = self.update_person_in_db(input_dict=tool_call['args'], new_company_id=new_company_id)
-            message = f"{name} in database {Table.PERSONS} table with id {idx} is successfully updated."
-        return state, message
+        changed_columns = self.update_person_in_db(input_dict=patch, new_company_id=new_company_id, current_row=person)
+        message = f"{name} in database {Table.PERSONS} table with id {person['id']} is successfully updated."
+        return state, message + _format_changed_columns(changed_columns)
 
     def _handle_list_persons(self, _tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
         response = self.list_all_names(table_name=Table.PERSONS)
-        return state, json.dumps(response, indent=2)
+        return state, dumps(response)
 
     def _handle_list_companies(self, _tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
         response = self.list_all_names(table_name=Table.COMPANIES)
-        return state, json.dumps(response, indent=2)
+        return state, dumps(response)
 
     def _handle_list_persons_from_company(self, tool_call: dict, state: AgentState) -> tuple[AgentState, str]:
         response = self.list_persons_from_company_id(company_id=tool_call['args']['company_id'])
-        return state, json.dumps(response, indent=2)
+        return state, dumps(response)
 
 
@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable
+
+from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
+
+from .serialization import dumps, loads
+
+
+class CassetteMissError(KeyError):
+    """A replayed run made a call that is not in the cassette."""
+
+
+class Cassette:
+    """
+    Record-and-replay of the external calls of agent runs: LLM requests, research runs and database queries,
+    kept one interaction per line in a JSONL file. Tool calls and run queries are recorded for inspection
+    and re-executed on replay.
+
+    In `record` mode the calls go through and are appended to the file with their latency. In `replay` mode they
+    are answered from the file, after the recorded latency (`replay_latency=True`) or immediately, so that the
+    agent's own overhead can be profiled and benchmarked deterministically on real traffic.
+
+    A call is matched by the hash of its request. If a change of the agent altered a request (e.g. the format of a
+    tool output the LLM sees), the oldest unused interaction with the same label (model, query shape, ...) is
+    replayed instead, unless `strict`.
+    """
+
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    def __init__(self, path: str, mode: str = RECORD, replay_latency: bool = True, strict: bool = False):
+        if mode not in (self.RECORD, self.REPLAY):
+            raise ValueError(f'Invalid cassette mode {mode}! - Can be either {self.RECORD} or {self.REPLAY}')
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'replayed': 0, 'fallbacks': 0, 'misses': 0}
+        self._by_key: dict[tuple[str, str], deque[dict]] = defaultdict(deque)
+        self._by_label: dict[tuple[str, str], deque[dict]] = defaultdict(deque)
+        self.entries: list[dict[str, Any]] = []
+        if mode == self.REPLAY:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = [loads(line) for line in f if line.strip()]
+            for entry in self.entries:
+                self._by_key[(entry['kind'], entry['key'])].append(entry)
+                self._by_label[(entry['kind'], entry['label'])].append(entry)
+        else:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+    @staticmethod
+    def make_key(request: Any) -> str:
+        return hashlib.sha256(dumps(request).encode('utf-8')).hexdigest()
+
+    def get_runs(self) -> list[dict[str, Any]]:
+        """The recorded run requests ({'query': ..., 'planning_mode': ...}), in order."""
+        return [x['response'] for x in self.entries if x['kind'] == 'run']
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def note(self, kind: str, label: str, request: Any, response: Any, seconds: float = 0.0):
+        """Record an interaction that is not replayed (tool calls, run queries)."""
+        if self.mode == self.RECORD:
+            self._append(kind=kind, label=label, key=self.make_key(request), response=response, seconds=seconds)
+
+    def call(self, kind: str, label: str, request: Any, fn: Callable[[], Any],
+             encode: Callable[[Any], Any] = lambda x: x, decode: Callable[[Any], Any] = lambda x: x) -> Any:
+        key = self.make_key(request)
+        if self.mode == self.REPLAY:
+            entry = self._take(kind=kind, label=label, key=key)
+            if self.replay_latency:
+                time.sleep(entry['seconds'])
+            return decode(entry['response'])
+
+        time1 = time.perf_counter()
+        response = fn()
+        self._append(kind=kind, label=label, key=key, response=encode(response), seconds=time.perf_counter() - time1)
+        return response
+
+    async def acall(self, kind: str, label: str, request: Any, fn: Callable[[], Awaitable[Any]],
+                    encode: Callable[[Any], Any] = lambda x: x, decode: Callable[[Any], Any] = lambda x: x) -> Any:
+        key = self.make_key(request)
+        if self.mode == self.REPLAY:
+            entry = self._take(kind=kind, label=label, key=key)
+            if self.replay_latency:
+                await asyncio.sleep(entry['seconds'])
+            return decode(entry['response'])
+
+        time1 = time.perf_counter()
+        response = await fn()
+        self._append(kind=kind, label=label, key=key, response=encode(response), seconds=time.perf_counter() - time1)
+        return response
+
+    def _append(self, kind: str, label: str, key: str, response: Any, seconds: float):
+        entry = {'kind': kind, 'label': label, 'key': key, 'seconds': seconds, 'response': response}
+        line = dumps(entry) + '\n'
+        with self._lock:
+            self.entries.append(entry)
+            # Appended right away, so that a crashed or cancelled run is still reproducible up to that point
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self._stats['recorded'] += 1
+
+    def _take(self, kind: str, label: str, key: str) -> dict[str, Any]:
+        with self._lock:
+            entries = self._by_key.get((kind, key))
+            while entries and entries[0].get('is_used'):
+                entries.popleft()
+            if entries:
+                self._stats['replayed'] += 1
+            elif not self.strict:
+                entries = self._by_label.get((kind, label))
+                while entries and entries[0].get('is_used'):
+                    entries.popleft()
+                if entries:
+                    self._stats['fallbacks'] += 1
+            if not entries:
+                self._stats['misses'] += 1
+                raise CassetteMissError(f'No recorded {kind} interaction for {label} in {self.path}')
+            entry = entries.popleft()
+            entry['is_used'] = True
+            return entry
+
+
+class CassetteLLM:
+    """Tool-bound chat model whose invocations go through the cassette."""
+
+    def __init__(self, llm: Any, cassette: Cassette, model_name: str):
+        self._llm = llm
+        self._cassette = cassette
+        self._model_name = model_name
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._llm, name)
+
+    def invoke(self, messages: list[BaseMessage], *args, **kwargs) -> BaseMessage:
+        return self._cassette.call(
+            kind='llm',
+            label=self._model_name,
+            request={'model': self._model_name, 'messages': messages_to_dict(messages)},
+            fn=lambda: self._llm.invoke(messages, *args, **kwargs),
+            # The response carries its usage metadata, which the agent falls back to on replay
+            encode=lambda x: messages_to_dict([x])[0],
+            decode=lambda x: messages_from_dict([x])[0],
+        )
+
+
+class CassetteResearcher:
+    """Business researcher whose runs go through the cassette."""
+
+    def __init__(self, researcher: Any, cassette: Cassette):
+        self._researcher = researcher
+        self._cassette = cassette
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._researcher, name)
+
+    async def run(self, input_dict: dict[str, Any], config: dict[str, Any]) -> dict[str, Any]:
+        # The thread id is random per research run
+        configurable = {k: v for k, v in config.get('configurable', {}).items() if k != 'thread_id'}
+        return await self._cassette.acall(
+            kind='research',
+            label=f"{input_dict.get('search_type')}:{configurable.get('number_of_queries')}",
+            request={'input': input_dict, 'configurable': configurable},
+            fn=lambda: self._researcher.run(input_dict=input_dict, config=config),
+        )
+
+
+class CassetteRepository:
+    """Entity repository whose reads and writes go through the cassette."""
+
+    def __init__(self, repository: Any, cassette: Cassette):
+        self._repository = repository
+        self._cassette = cassette
+
+    def probe(self):
+        # Health checks are not part of the runs, nothing is recorded and nothing is reached when replaying
+        if self._cassette.mode == Cassette.RECORD:
+            self._repository.probe()
+
+    def __getattr__(self, name: str) -> Callable[..., Any]:
+        def method(*args, **kwargs) -> Any:
+            return self._cassette.call(
+                kind='db',
+                label=name,
+                request=[name, args, kwargs],
+                fn=lambda: getattr(self._repository, name)(*args, **kwargs),
+            )
+        return method
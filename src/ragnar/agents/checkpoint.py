@@ -0,0 +1,90 @@
+import threading
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+DELTA_BLOB_TYPE = 'delta'
+
+
+class DeltaMemorySaver(MemorySaver):
+    """
+    MemorySaver that stores the append-only channels of a checkpoint (the messages) as the items added since the
+    channel's previous version, instead of the whole value. A run of n steps then retains its messages once
+    instead of n times. Values are rebuilt by following the chain of deltas back to a full value when loaded.
+
+    A delta is only stored when the new value provably extends the previous version (same list prefix); otherwise,
+    e.g. for a state forked from an older checkpoint, the whole value is stored as usual.
+    """
+
+    def __init__(self, append_only_channels: tuple[str, ...] = ('messages',), **kwargs):
+        super().__init__(**kwargs)
+        self._append_only_channels = set(append_only_channels)
+        self._delta_lock = threading.Lock()
+        # (thread id, checkpoint ns, channel) -> (version, length, last item) of the latest stored value
+        self._latest: dict[tuple[str, str, str], tuple[Any, int, Any]] = {}
+
+    def put(self, config: RunnableConfig, checkpoint: dict, metadata: dict, new_versions: dict) -> RunnableConfig:
+        thread_id = config['configurable']['thread_id']
+        checkpoint_ns = config['configurable']['checkpoint_ns']
+        values = checkpoint['channel_values']
+        delta_versions = {k: v for k, v in new_versions.items() if k in self._append_only_channels and k in values}
+        next_config = super().put(config, checkpoint, metadata, {k: v for k, v in new_versions.items() if k not in delta_versions})
+
+        with self._delta_lock:
+            for channel, version in delta_versions.items():
+                value = values[channel]
+                latest = self._latest.get((thread_id, checkpoint_ns, channel))
+                is_extension = (
+                    latest is not None and
+                    (thread_id, checkpoint_ns, channel, latest[0]) in self.blobs and
+                    len(value) >= latest[1] > 0 and
+                    value[latest[1] - 1] is latest[2]
+                )
+                if is_extension:
+                    tail = self.serde.dumps_typed(value[latest[1]:])
+                    self.blobs[(thread_id, checkpoint_ns, channel, version)] = (DELTA_BLOB_TYPE, (latest[0], tail))
+                else:
+                    self.blobs[(thread_id, checkpoint_ns, channel, version)] = self.serde.dumps_typed(value)
+                self._latest[(thread_id, checkpoint_ns, channel)] = (version, len(value), value[-1] if len(value) > 0 else None)
+        return next_config
+
+    def _load_blobs(self, thread_id: str, checkpoint_ns: str, versions: dict) -> dict[str, Any]:
+        delta_versions = {
+            k: v for k, v in versions.items() if self.blobs.get((thread_id, checkpoint_ns, k, v), ('',))[0] == DELTA_BLOB_TYPE
+        }
+        result = super()._load_blobs(thread_id, checkpoint_ns, {k: v for k, v in versions.items() if k not in delta_versions})
+        for channel, version in delta_versions.items():
+            result[channel] = self._load_delta_chain(thread_id=thread_id, checkpoint_ns=checkpoint_ns, channel=channel, version=version)
+        return result
+
+    def _load_delta_chain(self, thread_id: str, checkpoint_ns: str, channel: str, version: Any) -> list:
+        tails = []
+        blob = self.blobs[(thread_id, checkpoint_ns, channel, version)]
+        while blob[0] == DELTA_BLOB_TYPE:
+            version, tail = blob[1]
+            tails.append(self.serde.loads_typed(tail))
+            blob = self.blobs[(thread_id, checkpoint_ns, channel, version)]
+        value = list(self.serde.loads_typed(blob))
+        for tail in reversed(tails):
+            value.extend(tail)
+        return value
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        with self._delta_lock:
+            for key in [k for k in self._latest if k[0] == thread_id]:
+                del self._latest[key]
+
+
+def get_retained_bytes(saver: MemorySaver) -> int:
+    """Size of the serialized checkpoints, channel values and pending writes held by an in-memory saver."""
+    size = 0
+    for blob in saver.blobs.values():
+        size += len(blob[1][1][1]) if blob[0] == DELTA_BLOB_TYPE else len(blob[1])
+    for namespaces in saver.storage.values():
+        for checkpoints in namespaces.values():
+            size += sum(len(checkpoint[1]) + len(metadata[1]) for checkpoint, metadata, _ in checkpoints.values())
+    for writes in saver.writes.values():
+        size += sum(len(x[2][1]) for x in writes.values())
+    return size
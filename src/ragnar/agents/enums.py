@@ -1,4 +1,4 @@
-from typing import ClassVar
+from typing import ClassVar, Literal
 from pydantic import BaseModel, ConfigDict
 
 class Node(BaseModel):
@@ -7,6 +7,33 @@ class Node(BaseModel):
     LLM_CALL: ClassVar[str] = 'llm_call'
     TOOLS_CALL: ClassVar[str] = 'tools_call'
 
+class PlanningMode(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    # Class attributes
+    TOOLS: ClassVar[str] = 'tools'  # The model reads and writes the TODO list through WriteTodos / ReadTodos calls
+    CONTEXT: ClassVar[str] = 'context'  # The TODO list is rendered into the context; updates ride along regular tool calls
+
+class ResearchDepth(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    # Class attributes (from the cheapest to the most thorough)
+    QUICK: ClassVar[str] = 'quick'  # A single fact or a short summary
+    STANDARD: ClassVar[str] = 'standard'
+    DEEP: ClassVar[str] = 'deep'  # A full dossier
+
+# The depths as a type, for validating request and tool arguments
+ResearchDepthName = Literal[ResearchDepth.QUICK, ResearchDepth.STANDARD, ResearchDepth.DEEP]
+
+class StopReason(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    # Class attributes
+    MAX_ITERATIONS: ClassVar[str] = 'max_iterations'
+    MAX_INPUT_TOKENS: ClassVar[str] = 'max_input_tokens'
+    MAX_OUTPUT_TOKENS: ClassVar[str] = 'max_output_tokens'
+    MAX_COST: ClassVar[str] = 'max_cost'
+    MAX_WALL_TIME: ClassVar[str] = 'max_wall_time'
+    DEADLINE: ClassVar[str] = 'deadline'
+    CANCELLED: ClassVar[str] = 'cancelled'
+
 class Table(BaseModel):
     model_config = ConfigDict(frozen=True)
     # Class attributes
@@ -35,7 +62,7 @@ class CompaniesColumns(ColumnsBase):
     CRUNCHBASE_PROFILE: ClassVar[str] = 'crunchbase_profile'
     DISTINGUISHING_FEATURES: ClassVar[str] = 'distinguishing_features'
     IS_VERIFIED: ClassVar[str] = 'is_verified'
-    KEY_EXECUTIVES: ClassVar[str] = 'key_executions'
+    KEY_EXECUTIVES: ClassVar[str] = 'key_executives'
     LATEST_FUNDING_ROUND: ClassVar[str] = 'latest_funding_round'
     LATEST_FUNDING_ROUND_DATE: ClassVar[str] = 'latest_funding_round_date'
     LATEST_FUNDING_ROUND_AMOUNT_MM_USD: ClassVar[str] = 'latest_funding_round_amount_mm_usd'
@@ -0,0 +1,62 @@
+import copy
+import re
+import threading
+from typing import Any, Callable
+
+
+class FastPathRule:
+    """
+    Maps a user query pattern one-to-one onto a tool call.
+
+    `build_args` turns the regex match into tool arguments. `format_answer` turns the tool output into
+    the final answer, or returns None when the output is not a complete answer (e.g. the record was not
+    found and the model should decide what to do next).
+    """
+
+    def __init__(self,
+                 pattern: str,
+                 tool_name: str,
+                 build_args: Callable[[re.Match], dict[str, Any]],
+                 format_answer: Callable[[dict[str, Any], str], str | None]):
+        self.pattern = re.compile(pattern, flags=re.IGNORECASE)
+        self.tool_name = tool_name
+        self.build_args = build_args
+        self.format_answer = format_answer
+
+
+class FastPath:
+    """Deterministic intent matcher that answers simple structured commands without an LLM call."""
+
+    def __init__(self, rules: list[FastPathRule], enabled: bool = False):
+        self.rules = rules
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stats = {'queries': 0, 'hits': 0, 'misses': 0, 'ambiguous': 0, 'fallbacks': 0}
+
+    def match(self, query: str) -> tuple[FastPathRule, dict[str, Any]] | None:
+        if not self.enabled:
+            return None
+        query = ' '.join(query.split())
+        matches = [(rule, m) for rule in self.rules if (m := rule.pattern.fullmatch(query)) is not None]
+        self._count('queries')
+        if len(matches) != 1:
+            self._count('misses' if len(matches) == 0 else 'ambiguous')
+            return None
+        rule, m = matches[0]
+        return rule, rule.build_args(m)
+
+    def record_hit(self):
+        self._count('hits')
+
+    def record_fallback(self):
+        self._count('fallbacks')
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = copy.deepcopy(self._stats)
+        stats['hit_rate'] = stats['hits'] / stats['queries'] if stats['queries'] > 0 else 0.0
+        return stats
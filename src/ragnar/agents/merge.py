@@ -0,0 +1,36 @@
+from typing import Any
+
+from .enums import Table, CompaniesColumns
+from .utils import normalize_name
+
+# List columns merged with the stored values on update instead of being overwritten
+LIST_COLUMNS = {
+    Table.COMPANIES: [CompaniesColumns.ALTERNATIVE_NAMES, CompaniesColumns.KEY_EXECUTIVES, CompaniesColumns.SIMILAR_COMPANIES],
+    Table.PERSONS: [],
+}
+
+
+def merge_lists(old: list[str] | None, new: list[str] | None) -> list[str]:
+    """Order-preserving union: the old items, then the new ones. Items differing only in case or whitespace are kept once."""
+    merged = {}
+    for x in (old or []) + (new or []):
+        merged.setdefault(normalize_name(x), x)
+    return list(merged.values())
+
+
+def merge_entity(current_row: dict[str, Any], patch: dict[str, Any], table_name: str) -> dict[str, Any]:
+    """
+    Merge an update patch with the stored row: list columns become unions of the stored and the new values,
+    and a renamed company keeps its old name as an alternative name. Other columns are taken from the patch.
+    """
+    merged = dict(patch)
+    for column in LIST_COLUMNS[table_name]:
+        if merged.get(column) is not None:
+            merged[column] = merge_lists(old=current_row.get(column), new=merged[column])
+
+    new_name = merged.get(CompaniesColumns.NAME)
+    old_name = current_row.get(CompaniesColumns.NAME)
+    if table_name == Table.COMPANIES and new_name is not None and normalize_name(new_name) != normalize_name(old_name):
+        alternative_names = merged.get(CompaniesColumns.ALTERNATIVE_NAMES, current_row.get(CompaniesColumns.ALTERNATIVE_NAMES))
+        merged[CompaniesColumns.ALTERNATIVE_NAMES] = merge_lists(old=alternative_names, new=[old_name])
+    return merged
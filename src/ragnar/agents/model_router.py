@@ -0,0 +1,97 @@
+import copy
+import re
+import threading
+from typing import Any
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+FAST_MODEL = 'language_model'
+DEFAULT_MODEL = 'reasoning_model'
+
+ROUTINE_TOOLS = (
+    'FetchCompanyFromDataBase',
+    'FetchPersonFromDataBase',
+    'ListAllPersonNamesFromDataBase',
+    'ListAllCompanyNamesFromDataBase',
+    'ListPersonsFromCompanyId',
+    'InsertCompanyToDataBase',
+    'InsertPersonToDataBase',
+    'UpdateCompanyInDatabase',
+    'UpdatePersonInDatabase',
+    'WriteTodos',
+    'ReadTodos',
+)
+
+ROUTINE_QUERY_PATTERNS = (
+    # Database listings and lookups only; other queries starting with the same verbs need the default model
+    r'^(please\s+)?(list|show)(\s+me)?(\s+all)?(\s+the)?\s+(companies|company\s+names|persons|person\s+names|people|employees)\b',
+    r'^(please\s+)?(list|show|fetch|get)\b.*\b(from|in)\s+(the\s+)?(database|db)\s*[.!?]?$',
+    # Bare confirmations only; "ok, now research ..." is a new request
+    r'^(yes|yeah|yep|ok|okay|sure|confirm(ed)?|go ahead|no|nope|thanks|thank you)(,?\s+(please|thanks|thank you))?\s*[.!]*$',
+    r'^(save|insert|store)\b.*\b(database|db)\b',
+)
+
+
+class ModelRouter:
+    """
+    Picks the model of each LLM iteration.
+
+    Routine turns (short structured commands, confirmations, or turns whose pending tool results all
+    come from database / planning tools) go to the fast model. Everything else, including turns with
+    fresh research results to synthesize and large contexts, goes to the default model.
+    """
+
+    def __init__(self,
+                 enabled: bool = False,
+                 fast_model: str = FAST_MODEL,
+                 default_model: str = DEFAULT_MODEL,
+                 routine_tools: tuple[str, ...] = ROUTINE_TOOLS,
+                 routine_query_patterns: tuple[str, ...] = ROUTINE_QUERY_PATTERNS,
+                 max_query_chars: int = 200,
+                 max_context_chars: int = 60_000):
+        self.enabled = enabled
+        self.fast_model = fast_model
+        self.default_model = default_model
+        self.routine_tools = set(routine_tools)
+        self.routine_query_patterns = [re.compile(p, flags=re.IGNORECASE) for p in routine_query_patterns]
+        self.max_query_chars = max_query_chars
+        self.max_context_chars = max_context_chars
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def select(self, messages: list) -> str:
+        model, reason = self._select(messages=messages)
+        with self._lock:
+            model_stats = self._stats.setdefault(model, {})
+            model_stats[reason] = model_stats.get(reason, 0) + 1
+        return model
+
+    def _select(self, messages: list) -> tuple[str, str]:
+        if not self.enabled:
+            return self.default_model, 'routing_disabled'
+
+        if sum(len(str(m.content)) for m in messages) > self.max_context_chars:
+            return self.default_model, 'large_context'
+
+        last_message = messages[-1]
+        if isinstance(last_message, ToolMessage):
+            pending_tools = []
+            for message in reversed(messages):
+                if isinstance(message, AIMessage):
+                    break
+                if isinstance(message, ToolMessage):
+                    pending_tools.append(message.name)
+            if all(name in self.routine_tools for name in pending_tools):
+                return self.fast_model, 'routine_tool_results'
+            return self.default_model, 'research_results'
+
+        if isinstance(last_message, HumanMessage):
+            query = str(last_message.content).strip()
+            if len(query) <= self.max_query_chars and any(p.search(query) for p in self.routine_query_patterns):
+                return self.fast_model, 'routine_query'
+
+        return self.default_model, 'default'
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._stats)
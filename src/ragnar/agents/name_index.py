@@ -0,0 +1,85 @@
+import re
+import threading
+import time
+from typing import Callable
+
+from .utils import normalize_name
+
+
+def _normalize_text(text: str) -> str:
+    return normalize_name(re.sub(r'[^\w&.+-]+', ' ', text))
+
+
+class NameIndex:
+    """
+    In-memory index of the company and person names known to the database.
+
+    Used to find entity names mentioned in a free-text query without any network round trip.
+    The index is reloaded in the background once it is older than `ttl_seconds`; lookups never wait
+    for a reload and use the latest loaded snapshot instead.
+
+    `load_companies` returns (name, alternative names) pairs, `load_persons` returns (name, company name) pairs.
+    """
+
+    def __init__(self,
+                 load_companies: Callable[[], list[tuple[str, list[str]]]],
+                 load_persons: Callable[[], list[tuple[str, str]]],
+                 ttl_seconds: float = 300):
+        self._load_companies = load_companies
+        self._load_persons = load_persons
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._is_loading = False
+        self._loaded_at = None
+        self._companies: dict[str, tuple[str, list[str]]] = {}  # normalized name or alias -> (name, all names)
+        self._persons: dict[str, list[tuple[str, str]]] = {}  # normalized name -> [(name, company name)]
+
+    def refresh(self):
+        companies = {}
+        for name, alternative_names in self._load_companies():
+            all_names = [name] + list(alternative_names or [])
+            for x in all_names:
+                companies.setdefault(_normalize_text(x), (name, all_names))
+        persons = {}
+        for name, company_name in self._load_persons():
+            persons.setdefault(_normalize_text(name), []).append((name, company_name))
+
+        with self._lock:
+            self._companies = companies
+            self._persons = persons
+            self._loaded_at = time.monotonic()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._is_loading = False
+
+    def _ensure_fresh(self):
+        with self._lock:
+            is_stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self._ttl_seconds
+            if not is_stale or self._is_loading:
+                return
+            self._is_loading = True
+        threading.Thread(target=self._refresh_in_background, daemon=True).start()
+
+    def find_companies(self, query: str) -> list[tuple[str, list[str]]]:
+        """Companies mentioned in the query, as (name, all names) pairs."""
+        self._ensure_fresh()
+        padded_query = f' {_normalize_text(query)} '
+        with self._lock:
+            companies = self._companies
+        found = {}
+        for key, (name, all_names) in companies.items():
+            if f' {key} ' in padded_query:
+                found[name] = all_names
+        return list(found.items())
+
+    def find_persons(self, query: str) -> list[tuple[str, str]]:
+        """Persons mentioned in the query, as (name, company name) pairs."""
+        self._ensure_fresh()
+        padded_query = f' {_normalize_text(query)} '
+        with self._lock:
+            persons = self._persons
+        return [x for key, matches in persons.items() if f' {key} ' in padded_query for x in matches]
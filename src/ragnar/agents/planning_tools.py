@@ -1,5 +1,6 @@
-import json
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
+from .enums import PlanningMode
+from .serialization import dumps
 from .state import DeepAgentState, ToDo
 
 
@@ -69,6 +70,49 @@ IMPORTANT: Aim to batch research tasks into a *single TODO* in order to minimize
 """
 
 
+CONTEXT_PLANNING_INSTRUCTIONS = """
+# TODO MANAGEMENT
+The current TODO list is always shown to you at the end of these instructions; you never need to read it.
+Based upon the user's request:
+1. Create the TODO list at the start of a user request by passing it in the "todos" argument of your first tool call.
+   Use the WriteTodos tool only if you have no other tool to call.
+2. Whenever the status of a TODO changes, pass the complete updated list in the "todos" argument of the next tool call.
+3. Continue this process until you have completed all TODOs.
+
+IMPORTANT: Omit the "todos" argument when the list has not changed.
+IMPORTANT: Aim to batch research tasks into a *single TODO* in order to minimize the number of TODOs you have to keep track of.
+"""
+
+CURRENT_TODOS_TEMPLATE = """
+<Current TODO List>
+{todos}
+</Current TODO List>
+"""
+
+
+def with_todos_field(tool: type[BaseModel]) -> type[BaseModel]:
+    """Return a copy of the tool schema that also accepts an optional, piggy-backed TODO list update."""
+    return create_model(
+        tool.__name__,
+        __base__=tool,
+        __doc__=tool.__doc__,
+        todos=(
+            list[ToDo] | None,
+            Field(default=None, description="Optional. The complete updated TODO list, if it changed since the last update."),
+        ),
+    )
+
+
+def get_planning_tools(tools: list[type[BaseModel]], planning_mode: str) -> list[type[BaseModel]]:
+    match planning_mode:
+        case PlanningMode.TOOLS:
+            return tools + [WriteTodos, ReadTodos]
+        case PlanningMode.CONTEXT:
+            return [with_todos_field(tool=t) for t in tools] + [WriteTodos]
+        case _:
+            raise ValueError(f'Invalid planning mode! - Can be either {PlanningMode.TOOLS} or {PlanningMode.CONTEXT}')
+
+
 ##
 # NOTE:
 #   * The following functions below do not need to obey the signatures described above for the tools.
@@ -79,7 +123,7 @@ IMPORTANT: Aim to batch research tasks into a *single TODO* in order to minimize
 
 def write_todos(todos: list[ToDo], state: DeepAgentState) -> tuple[DeepAgentState, str]:
     state.todos = [ToDo(**x) for x in todos]
-    message = f"Updated TODO List: \n\n {json.dumps(todos, indent=2)}"
+    message = f"Updated TODO List: \n\n {dumps(todos)}"
     return state, message
 
 def read_todos(state: DeepAgentState) -> str:
@@ -87,12 +131,13 @@ def read_todos(state: DeepAgentState) -> str:
     if len(state.todos) == 0:
         message = "Current TODO List is empty."
     else:
-        message = "Current TODO List: \n\n"
-        for i, item in enumerate(state.todos):
-            message += f"{i+1}. {item.content} ({item.status})\n"
+        message = "Current TODO List: \n\n" + render_todos(todos=state.todos)
 
     return message
 
+def render_todos(todos: list[ToDo]) -> str:
+    return "".join(f"{i+1}. {item.content} ({item.status})\n" for i, item in enumerate(todos))
+
 def handle_write_todos(tool_call: dict, state: DeepAgentState) -> tuple[DeepAgentState, str]:
     state, message = write_todos(todos=tool_call['args']['todos'], state=state)
     return state, message
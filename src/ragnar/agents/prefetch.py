@@ -0,0 +1,80 @@
+import copy
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class _PrefetchEntry:
+    def __init__(self, future: Future):
+        self.future = future
+        self.is_taken = False
+
+
+class Prefetcher:
+    """
+    Runs speculative lookups in the background and serves their results when they are asked for.
+
+    A lookup can be registered under several keys (e.g. a company name and its aliases). Taking any of them
+    counts as a hit if the lookup succeeded and its result is accepted by the taker. Lookups that failed, were
+    rejected, or were discarded without being taken count as waste.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='prefetch')
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, _PrefetchEntry] = {}
+        self._stats = {'issued': 0, 'hits': 0, 'wasted': 0, 'invalidated': 0}
+
+    def submit(self, keys: list[tuple], fn: Callable[[], Any]) -> list[tuple]:
+        with self._lock:
+            if any(key in self._entries for key in keys):
+                return []
+            entry = _PrefetchEntry(future=self._executor.submit(fn))
+            for key in keys:
+                self._entries[key] = entry
+            self._stats['issued'] += 1
+        return keys
+
+    def take(self, key: tuple, is_valid: Callable[[Any], bool] | None = None) -> tuple[bool, Any]:
+        """
+        Return (True, result) if the key was prefetched, waiting for it if still running, and `is_valid` (if given)
+        accepts the result; else (False, None).
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False, None
+            is_first_take = not entry.is_taken
+            entry.is_taken = True
+        try:
+            result = entry.future.result()
+            is_hit = is_valid is None or is_valid(result)
+        except Exception:
+            is_hit = False
+        if is_first_take:
+            with self._lock:
+                self._stats['hits' if is_hit else 'wasted'] += 1
+        return (True, copy.deepcopy(result)) if is_hit else (False, None)
+
+    def discard(self, keys: list[tuple]):
+        with self._lock:
+            self._discard(keys=keys, stat='wasted')
+
+    def invalidate(self):
+        """Drop every pending result, e.g. after a write made them stale."""
+        with self._lock:
+            self._discard(keys=list(self._entries.keys()), stat='invalidated')
+
+    def _discard(self, keys: list[tuple], stat: str):
+        discarded = set()
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None and not entry.is_taken and id(entry) not in discarded:
+                discarded.add(id(entry))
+                self._stats[stat] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = copy.deepcopy(self._stats)
+        stats['hit_rate'] = stats['hits'] / stats['issued'] if stats['issued'] > 0 else 0.0
+        return stats
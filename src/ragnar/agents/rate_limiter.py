@@ -0,0 +1,185 @@
+import copy
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+WEB_SEARCH_PROVIDER = 'tavily'
+
+
+class TokenBucket:
+    """
+    Token bucket that refills continuously at `rate` units per second up to `capacity`.
+
+    Reservations are allowed to drive the bucket into debt; the returned delay is the time the
+    caller must wait until its reservation is covered. This keeps callers in FIFO order without
+    having to poll the bucket.
+    """
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self._level = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._level = min(self.capacity, self._level + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        self._refill()
+        self._level -= amount
+        return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def refund(self, amount: float):
+        self._refill()
+        self._level = min(self.capacity, self._level + amount)
+
+
+class ProviderRateLimiter:
+    """
+    Process-wide limiter for a single provider: requests/min, tokens/min and max in-flight requests.
+
+    Any of the limits can be None, in which case it is not enforced. Queueing delay and throttling
+    statistics are recorded for every acquisition.
+    """
+
+    def __init__(self,
+                 provider: str,
+                 requests_per_minute: int | None = None,
+                 tokens_per_minute: int | None = None,
+                 max_in_flight: int | None = None):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._request_bucket = TokenBucket(capacity=requests_per_minute, rate=requests_per_minute / 60) if requests_per_minute else None
+        self._token_bucket = TokenBucket(capacity=tokens_per_minute, rate=tokens_per_minute / 60) if tokens_per_minute else None
+        self._semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._stats = {
+            'requests': 0,
+            'throttled_requests': 0,
+            'total_queue_delay_seconds': 0.0,
+            'max_queue_delay_seconds': 0.0,
+            'rate_limit_errors': 0,
+            'retries': 0,
+            'tokens': 0,
+        }
+
+    @contextmanager
+    def acquire(self, requests: int = 1, tokens: int = 0) -> Iterator[None]:
+        start = time.monotonic()
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        try:
+            with self._lock:
+                delay = self._blocked_until - time.monotonic()
+                if self._request_bucket is not None:
+                    delay = max(delay, self._request_bucket.reserve(requests))
+                if self._token_bucket is not None:
+                    delay = max(delay, self._token_bucket.reserve(tokens))
+            if delay > 0:
+                time.sleep(delay)
+
+            queue_delay = time.monotonic() - start
+            with self._lock:
+                self._in_flight += 1
+                self._stats['requests'] += 1
+                self._stats['total_queue_delay_seconds'] += queue_delay
+                self._stats['max_queue_delay_seconds'] = max(self._stats['max_queue_delay_seconds'], queue_delay)
+                if queue_delay > 0.01:
+                    self._stats['throttled_requests'] += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def reserve_tokens(self, tokens: int):
+        """
+        Reserve tokens for requests made outside this limiter (e.g. by a third-party component), waiting until the
+        token budget covers them. Correct the reservation with `record_usage` once the actual usage is known.
+        """
+        start = time.monotonic()
+        with self._lock:
+            delay = self._blocked_until - start
+            if self._token_bucket is not None:
+                delay = max(delay, self._token_bucket.reserve(tokens))
+        if delay > 0:
+            time.sleep(delay)
+        queue_delay = time.monotonic() - start
+        with self._lock:
+            self._stats['total_queue_delay_seconds'] += queue_delay
+            self._stats['max_queue_delay_seconds'] = max(self._stats['max_queue_delay_seconds'], queue_delay)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once the actual usage of a request is known."""
+        with self._lock:
+            self._stats['tokens'] += actual_tokens
+            if self._token_bucket is None:
+                return
+            difference = estimated_tokens - actual_tokens
+            if difference > 0:
+                self._token_bucket.refund(difference)
+            elif difference < 0:
+                self._token_bucket.reserve(-difference)
+
+    def back_off(self, seconds: float):
+        """Block all callers of this provider for `seconds`, e.g. after a 429 response."""
+        with self._lock:
+            self._stats['rate_limit_errors'] += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self._stats['retries'] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = copy.deepcopy(self._stats)
+            stats['in_flight'] = self._in_flight
+        stats['mean_queue_delay_seconds'] = stats['total_queue_delay_seconds'] / stats['requests'] if stats['requests'] > 0 else 0.0
+        return stats
+
+
+_rate_limiters: dict[str, ProviderRateLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, limits: dict[str, Any] | None = None) -> ProviderRateLimiter:
+    """Return the process-wide limiter of a provider. Limits are taken from the first registration."""
+    key = str(provider)
+    with _registry_lock:
+        if key not in _rate_limiters:
+            _rate_limiters[key] = ProviderRateLimiter(provider=key, **(limits or {}))
+        return _rate_limiters[key]
+
+
+def get_rate_limiter_stats() -> dict[str, dict[str, Any]]:
+    with _registry_lock:
+        limiters = list(_rate_limiters.values())
+    return {limiter.provider: limiter.get_stats() for limiter in limiters}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    status_code = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code == 429 or 'rate limit' in str(error).lower()
+
+
+def get_backoff_seconds(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    # Exponential backoff with full jitter, so retrying callers do not synchronize into storms
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def estimate_tokens(messages: list) -> int:
+    # Rough estimate (4 characters per token) used for reservation before the actual usage is known
+    n_chars = 0
+    for message in messages:
+        n_chars += len(str(message.content))
+        n_chars += sum(len(str(tool_call.get('args', ''))) for tool_call in getattr(message, 'tool_calls', []) or [])
+    return n_chars // 4
@@ -0,0 +1,209 @@
+import asyncio
+import datetime
+import logging
+import threading
+import time
+from typing import Any
+
+from .enums import ColumnsBase, Table
+from .repository import EntityRepository, SQLiteRepository
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_time(value: Any) -> datetime.datetime:
+    value = datetime.datetime.fromisoformat(str(value))
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.timezone.utc)
+
+
+class ReadMirrorRepository(EntityRepository):
+    """
+    Repository that serves reads from a local SQLite copy of the companies and persons tables of a primary
+    repository, and sends writes to the primary.
+
+    The copy is loaded by the first `sync` and kept current by incremental syncs every `sync_interval_seconds`,
+    which page through the rows whose (updated_at, id) is after the last one copied. Each sync starts
+    `overlap_seconds` before that position, so that rows committed late with an earlier updated_at are not missed.
+    Writes are applied to the copy as well once the primary accepted them, so a process reads its own writes.
+
+    Reads fall back to the primary while the copy is older than `max_staleness_seconds` (the time since the start of
+    the last successful sync), e.g. before the first sync or while the primary cannot be synced from. Rows deleted
+    from the primary are not propagated; they remain in the copy until the process restarts.
+    """
+
+    def __init__(self,
+                 primary: EntityRepository,
+                 path: str = ':memory:',
+                 sync_interval_seconds: float = 30,
+                 max_staleness_seconds: float = 300,
+                 overlap_seconds: float = 30,
+                 page_size: int = 1000):
+        self.primary = primary
+        self.mirror = SQLiteRepository(path=path)
+        self.sync_interval_seconds = sync_interval_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self.overlap_seconds = overlap_seconds
+        self.page_size = page_size
+        self._task = None
+        self._sync_lock = threading.Lock()
+        # Table name -> (updated_at, id) of the last row copied
+        self._positions: dict[str, tuple[datetime.datetime, int] | None] = {Table.COMPANIES: None, Table.PERSONS: None}
+        self._synced_at: float | None = None  # Start of the last successful sync
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'syncs': 0,
+            'sync_failures': 0,
+            'rows_synced': 0,
+            'local_reads': 0,
+            'primary_reads': 0,
+            'writes': 0,
+            'last_sync_at': None,
+            'last_sync_seconds': None,
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            # The copy may have just been loaded, e.g. by the warm-up
+            lag = self.get_sync_lag()
+            if lag is not None and lag < self.sync_interval_seconds:
+                await asyncio.sleep(self.sync_interval_seconds - lag)
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception as e:
+                logger.error(f"Read mirror sync failed: {str(e)}")
+                await asyncio.sleep(self.sync_interval_seconds)
+
+    def sync(self) -> int:
+        """Copy the rows changed on the primary since the last sync (all rows the first time). Returns their number."""
+        with self._sync_lock:
+            started_at = time.time()
+            time1 = time.perf_counter()
+            n_rows = 0
+            try:
+                # Companies first, so that the persons synced with them can be joined with their company
+                for table_name in (Table.COMPANIES, Table.PERSONS):
+                    n_rows += self._sync_table(table_name=table_name)
+            except Exception:
+                with self._stats_lock:
+                    self._stats['sync_failures'] += 1
+                raise
+            self._synced_at = started_at
+            with self._stats_lock:
+                self._stats['syncs'] += 1
+                self._stats['rows_synced'] += n_rows
+                self._stats['last_sync_at'] = datetime.datetime.fromtimestamp(started_at, tz=datetime.timezone.utc).isoformat()
+                self._stats['last_sync_seconds'] = round(time.perf_counter() - time1, 3)
+            return n_rows
+
+    def _sync_table(self, table_name: str) -> int:
+        position = self._positions[table_name]
+        if position is None:
+            updated_after, after_id = None, 0
+        else:
+            updated_after, after_id = position[0] - datetime.timedelta(seconds=self.overlap_seconds), 0
+
+        n_rows = 0
+        while True:
+            rows = self.primary.fetch_updated(table_name=table_name, updated_after=updated_after, after_id=after_id, limit=self.page_size)
+            if len(rows) == 0:
+                break
+            self.mirror.upsert(table_name=table_name, rows=rows)
+            n_rows += len(rows)
+            updated_after = _parse_time(rows[-1][ColumnsBase.UPDATED_AT])
+            after_id = rows[-1][ColumnsBase.ID]
+            if position is None or (updated_after, after_id) > position:
+                position = (updated_after, after_id)
+            if len(rows) < self.page_size:
+                break
+        self._positions[table_name] = position
+        return n_rows
+
+    def get_sync_lag(self) -> float | None:
+        """Seconds since the start of the last successful sync, None before the first one."""
+        return None if self._synced_at is None else time.time() - self._synced_at
+
+    def is_fresh(self) -> bool:
+        lag = self.get_sync_lag()
+        return lag is not None and lag <= self.max_staleness_seconds
+
+    def _reader(self) -> EntityRepository:
+        is_fresh = self.is_fresh()
+        with self._stats_lock:
+            self._stats['local_reads' if is_fresh else 'primary_reads'] += 1
+        return self.mirror if is_fresh else self.primary
+
+    def get_stats(self) -> dict[str, Any]:
+        lag = self.get_sync_lag()
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            **stats,
+            'rows': {x: self.mirror.count(table_name=x) for x in (Table.COMPANIES, Table.PERSONS)},
+            'sync_lag_seconds': round(lag, 1) if lag is not None else None,
+            'max_staleness_seconds': self.max_staleness_seconds,
+            'is_fresh': lag is not None and lag <= self.max_staleness_seconds,
+        }
+
+    def probe(self):
+        self.primary.probe()
+
+    def insert(self, table_name: str, rows: list[dict[str, Any]]) -> list[int]:
+        ids = self.primary.insert(table_name=table_name, rows=rows)
+        self.mirror.upsert(table_name=table_name, rows=[{**row, ColumnsBase.ID: idx} for row, idx in zip(rows, ids)])
+        with self._stats_lock:
+            self._stats['writes'] += 1
+        return ids
+
+    def update(self, table_name: str, entity_id: int, changes: dict[str, Any]):
+        self.primary.update(table_name=table_name, entity_id=entity_id, changes=changes)
+        self.mirror.update(table_name=table_name, entity_id=entity_id, changes=changes)
+        with self._stats_lock:
+            self._stats['writes'] += 1
+
+    def fetch_by_id(self, table_name: str, entity_id: int) -> list[dict[str, Any]]:
+        return self._reader().fetch_by_id(table_name=table_name, entity_id=entity_id)
+
+    def fetch_by_names(self, table_name: str, names: list[str]) -> list[dict[str, Any]]:
+        return self._reader().fetch_by_names(table_name=table_name, names=names)
+
+    def fetch_by_alternative_name(self, name: str) -> list[dict[str, Any]]:
+        return self._reader().fetch_by_alternative_name(name=name)
+
+    def fetch_person(self, name: str, current_company_id: int) -> list[dict[str, Any]]:
+        return self._reader().fetch_person(name=name, current_company_id=current_company_id)
+
+    def list_names(self, table_name: str) -> list[dict[str, Any]]:
+        return self._reader().list_names(table_name=table_name)
+
+    def list_company_aliases(self) -> list[dict[str, Any]]:
+        return self._reader().list_company_aliases()
+
+    def list_persons_from_company_id(self, company_id: int) -> list[dict[str, Any]]:
+        return self._reader().list_persons_from_company_id(company_id=company_id)
+
+    def fetch_stale(self,
+                    table_name: str,
+                    updated_before: datetime.datetime,
+                    limit: int,
+                    entity_ids: list[int] | None = None) -> list[dict[str, Any]]:
+        return self._reader().fetch_stale(table_name=table_name, updated_before=updated_before, limit=limit, entity_ids=entity_ids)
+
+    def fetch_updated(self,
+                      table_name: str,
+                      updated_after: datetime.datetime | None,
+                      after_id: int,
+                      limit: int) -> list[dict[str, Any]]:
+        return self._reader().fetch_updated(table_name=table_name, updated_after=updated_after, after_id=after_id, limit=limit)
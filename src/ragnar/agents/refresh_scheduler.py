@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Any
+
+from ai_common import calculate_token_cost
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+from .enums import Table, ColumnsBase
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_time(value: Any) -> datetime.datetime:
+    value = datetime.datetime.fromisoformat(str(value))
+    return value if value.tzinfo is not None else value.replace(tzinfo=datetime.timezone.utc)
+
+
+class RefreshScheduler:
+    """
+    Periodically re-researches stored entities whose data is older than `max_age_hours`.
+
+    Each cycle takes as candidates the `candidates_per_table` oldest stale companies and persons plus the stale ones
+    among the most accessed, orders them by how often the agent served them (most accessed first, then oldest first)
+    and refreshes the first `batch_size` with at most `max_concurrency` researches in flight. No new research is
+    started once the cycle has spent `max_cost_per_cycle` dollars; the remaining entities are picked up by the next
+    cycle. An entity whose refresh failed is not retried for `interval_seconds`, doubling with every consecutive
+    failure up to `max_failure_backoff_hours`.
+
+    With `lock_path`, only the process holding an exclusive lock on that file runs cycles, so that the worker
+    processes of a server sharing the path refresh each entity once. The other processes retry the lock every
+    `interval_seconds` and take over if the holder exits. Without `lock_path` (or without `fcntl`), every
+    process that runs a scheduler refreshes on its own.
+    """
+
+    def __init__(self,
+                 agent,
+                 max_age_hours: float = 24 * 30,
+                 interval_seconds: float = 3600,
+                 max_concurrency: int = 2,
+                 max_cost_per_cycle: float = 1.0,
+                 batch_size: int = 20,
+                 candidates_per_table: int = 500,
+                 max_failure_backoff_hours: float = 24 * 7,
+                 lock_path: str | None = None):
+        self.agent = agent
+        self.max_age_hours = max_age_hours
+        self.interval_seconds = interval_seconds
+        self.max_concurrency = max_concurrency
+        self.max_cost_per_cycle = max_cost_per_cycle
+        self.batch_size = batch_size
+        self.candidates_per_table = candidates_per_table
+        self.max_failure_backoff_hours = max_failure_backoff_hours
+        self._failures_lock = threading.Lock()
+        self._failures: dict[tuple[str, int], tuple[int, float]] = {}  # (table name, id) -> (consecutive failures, retry after)
+        self.lock_path = os.path.expanduser(lock_path) if lock_path else None
+        self._lock_file = None
+        self._task = None
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'cycles': 0,
+            'refreshed_companies': 0,
+            'refreshed_persons': 0,
+            'failed': 0,
+            'skipped_backing_off': 0,
+            'skipped_over_budget': 0,
+            'total_cost': 0.0,
+            'last_cycle_at': None,
+            'last_cycle_seconds': None,
+        }
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._lock_file is not None:
+            self._lock_file.close()  # Releases the lock
+            self._lock_file = None
+
+    def _acquire_lock(self) -> bool:
+        """Whether this process may run cycles, i.e. holds the lock file (or no lock is configured)."""
+        if self.lock_path is None or fcntl is None or self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        logger.info(f"Refresh scheduler lock acquired by process {os.getpid()}")
+        return True
+
+    async def _loop(self):
+        while True:
+            if self._acquire_lock():
+                try:
+                    await self.run_cycle()
+                except Exception as e:
+                    logger.error(f"Refresh cycle failed: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def _get_stale_entities(self) -> list[tuple[str, dict[str, Any]]]:
+        updated_before = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(hours=self.max_age_hours)
+        candidates = {}
+        for table_name in (Table.COMPANIES, Table.PERSONS):
+            rows = self.agent.repository.fetch_stale(table_name=table_name, updated_before=updated_before, limit=self.candidates_per_table)
+            # The most accessed entities are candidates even if they are not among the oldest
+            most_accessed = self.agent.get_most_accessed(table_name=table_name, limit=self.batch_size)
+            rows += self.agent.repository.fetch_stale(table_name=table_name, updated_before=updated_before,
+                                                      limit=len(most_accessed), entity_ids=most_accessed)
+            for row in rows:
+                if row.get(ColumnsBase.UPDATED_AT) is not None:
+                    candidates[(table_name, row['id'])] = row
+
+        now = time.time()
+        with self._failures_lock:
+            backing_off = {k for k, (_, retry_after) in self._failures.items() if retry_after > now}
+        if len(backing_off & candidates.keys()) > 0:
+            self._add_stats(skipped_backing_off=len(backing_off & candidates.keys()))
+        entities = [(k[0], row) for k, row in candidates.items() if k not in backing_off]
+        # Companies first among equals, so that refreshed persons can be linked to refreshed companies
+        entities.sort(key=lambda x: (-self.agent.get_access_count(table_name=x[0], entity_id=x[1]['id']),
+                                     _parse_time(x[1][ColumnsBase.UPDATED_AT]),
+                                     x[0] != Table.COMPANIES))
+        return entities[:self.batch_size]
+
+    def _record_failure(self, table_name: str, entity_id: int):
+        with self._failures_lock:
+            n_failures = self._failures.get((table_name, entity_id), (0, 0.0))[0] + 1
+            backoff = min(self.interval_seconds * 2 ** (n_failures - 1), self.max_failure_backoff_hours * 3600)
+            self._failures[(table_name, entity_id)] = (n_failures, time.time() + backoff)
+
+    def _record_success(self, table_name: str, entity_id: int):
+        with self._failures_lock:
+            self._failures.pop((table_name, entity_id), None)
+
+    def _refresh(self, table_name: str, row: dict[str, Any]) -> float:
+        if table_name == Table.COMPANIES:
+            out_dict = self.agent.refresh_company(company=row)
+        else:
+            out_dict = self.agent.refresh_person(person=row)
+        _, cost = calculate_token_cost(llm_config=self.agent.get_llm_config(), token_usage=out_dict['token_usage'])
+        return cost
+
+    async def run_cycle(self):
+        time1 = time.time()
+        entities = await asyncio.to_thread(self._get_stale_entities)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        spent = {'cost': 0.0}
+
+        async def refresh(table_name: str, row: dict[str, Any]):
+            async with semaphore:
+                if spent['cost'] >= self.max_cost_per_cycle:
+                    self._add_stats(skipped_over_budget=1)
+                    return
+                try:
+                    cost = await asyncio.to_thread(self._refresh, table_name, row)
+                except Exception as e:
+                    logger.error(f"Refreshing {table_name} {row['name']} failed: {str(e)}")
+                    self._record_failure(table_name=table_name, entity_id=row['id'])
+                    self._add_stats(failed=1)
+                    return
+                self._record_success(table_name=table_name, entity_id=row['id'])
+                spent['cost'] += cost
+                self._add_stats(total_cost=cost, **{f'refreshed_{table_name}': 1})
+
+        await asyncio.gather(*[refresh(table_name=t, row=r) for t, r in entities])
+
+        with self._stats_lock:
+            self._stats['cycles'] += 1
+            self._stats['last_cycle_at'] = datetime.datetime.now(tz=datetime.timezone.utc).isoformat(timespec='seconds')
+            self._stats['last_cycle_seconds'] = time.time() - time1
+        logger.info(f"Refresh cycle: {len(entities)} stale entities, cost $ {spent['cost']:.4f}")
+
+    def _add_stats(self, **increments):
+        with self._stats_lock:
+            for k, v in increments.items():
+                self._stats[k] += v
+
+    def get_stats(self) -> dict[str, Any]:
+        now = time.time()
+        with self._failures_lock:
+            backing_off = sum(1 for _, retry_after in self._failures.values() if retry_after > now)
+        with self._stats_lock:
+            return {**self._stats, 'backing_off': backing_off,
+                    'holds_lock': self.lock_path is None or fcntl is None or self._lock_file is not None}
@@ -0,0 +1,440 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+
+from supabase import Client, create_client
+
+from .enums import ColumnsBase, CompaniesColumns, PersonsColumns, Table
+
+
+def _check_table_name(table_name: str):
+    if table_name not in (Table.COMPANIES, Table.PERSONS):
+        raise ValueError(f'Invalid table name! - Can be either {Table.COMPANIES} or {Table.PERSONS}')
+
+
+class EntityRepository(ABC):
+    """
+    Storage of the companies and persons tables. Rows are dicts of column values; person rows joined with their
+    current company carry it as {'companies': {'name': ...}}, like the Supabase embedded resources.
+    """
+
+    @abstractmethod
+    def probe(self):
+        """Raises if the storage cannot be reached. Must be cheap enough for frequent health checks."""
+
+    @abstractmethod
+    def insert(self, table_name: str, rows: list[dict[str, Any]]) -> list[int]:
+        """Insert the rows with a single request. Returns the ids in input order."""
+
+    @abstractmethod
+    def update(self, table_name: str, entity_id: int, changes: dict[str, Any]):
+        """Set the given columns of the row."""
+
+    @abstractmethod
+    def fetch_by_id(self, table_name: str, entity_id: int) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_by_names(self, table_name: str, names: list[str]) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fetch_by_alternative_name(self, name: str) -> list[dict[str, Any]]:
+        """Companies that have the name among their alternative names."""
+
+    @abstractmethod
+    def fetch_person(self, name: str, current_company_id: int) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_names(self, table_name: str) -> list[dict[str, Any]]:
+        """[{'name': ...}] for companies, [{'name': ..., 'current_company': ...}] for persons."""
+
+    @abstractmethod
+    def list_company_aliases(self) -> list[dict[str, Any]]:
+        """[{'name': ..., 'alternative_names': [...]}] of every company."""
+
+    @abstractmethod
+    def list_persons_from_company_id(self, company_id: int) -> list[dict[str, Any]]:
+        """[{'name': ...}] of the persons currently at the company."""
+
+    @abstractmethod
+    def fetch_stale(self,
+                    table_name: str,
+                    updated_before: datetime.datetime,
+                    limit: int,
+                    entity_ids: list[int] | None = None) -> list[dict[str, Any]]:
+        """
+        Rows last updated before the given time (among `entity_ids` if given), oldest first. Person rows are joined
+        with their current company.
+        """
+
+    @abstractmethod
+    def fetch_updated(self,
+                      table_name: str,
+                      updated_after: datetime.datetime | None,
+                      after_id: int,
+                      limit: int) -> list[dict[str, Any]]:
+        """
+        Rows after the (updated_at, id) position, ordered by updated_at and id, for paging through the changes of a
+        table. All rows with an updated_at if `updated_after` is None.
+        """
+
+
+class SupabaseRepository(EntityRepository):
+
+    def __init__(self, db_client: Client):
+        self.db_client = db_client
+
+    def probe(self):
+        # At most one id, whatever the size of the table
+        self.db_client.table(table_name=Table.COMPANIES).select(ColumnsBase.ID).limit(1).execute()
+
+    def insert(self, table_name: str, rows: list[dict[str, Any]]) -> list[int]:
+        if len(rows) == 0:
+            return []
+        response = (
+            self.db_client.table(table_name=table_name)
+            .insert(rows)
+            .execute()
+        )
+        return [x['id'] for x in response.data]
+
+    def update(self, table_name: str, entity_id: int, changes: dict[str, Any]):
+        (
+            self.db_client.table(table_name=table_name)
+            .update(changes)
+            .eq(ColumnsBase.ID, entity_id)
+            .execute()
+        )
+
+    def fetch_by_id(self, table_name: str, entity_id: int) -> list[dict[str, Any]]:
+        response = (
+            self.db_client.table(table_name=table_name)
+            .select("*")
+            .eq(ColumnsBase.ID, entity_id)
+            .execute()
+        )
+        return response.data
+
+    def fetch_by_names(self, table_name: str, names: list[str]) -> list[dict[str, Any]]:
+        if len(names) == 0:
+            return []
+        query = self.db_client.table(table_name=table_name).select("*")
+        query = query.eq(ColumnsBase.NAME, names[0]) if len(names) == 1 else query.in_(ColumnsBase.NAME, names)
+        return query.execute().data
+
+    def fetch_by_alternative_name(self, name: str) -> list[dict[str, Any]]:
+        response = (
+            self.db_client.table(table_name=Table.COMPANIES)
+            .select("*")
+            .contains(CompaniesColumns.ALTERNATIVE_NAMES, [name])
+            .execute()
+        )
+        return response.data
+
+    def fetch_person(self, name: str, current_company_id: int) -> list[dict[str, Any]]:
+        response = (
+            self.db_client.table(table_name=Table.PERSONS)
+            .select("*")
+            .eq(PersonsColumns.NAME, name)
+            .eq(PersonsColumns.CURRENT_COMPANY_ID, current_company_id)
+            .execute()
+        )
+        return response.data
+
+    def list_names(self, table_name: str) -> list[dict[str, Any]]:
+        _check_table_name(table_name=table_name)
+        if table_name == Table.COMPANIES:
+            return self.db_client.table(table_name).select(ColumnsBase.NAME).execute().data
+        response = (
+            self.db_client.table(table_name)
+            .select(f"{ColumnsBase.NAME}, {PersonsColumns.CURRENT_COMPANY_ID}, {Table.COMPANIES}!inner({ColumnsBase.NAME})")
+            .execute()
+        )
+        return [{'name': x['name'], 'current_company': x['companies']['name']} for x in response.data]
+
+    def list_company_aliases(self) -> list[dict[str, Any]]:
+        response = (
+            self.db_client.table(Table.COMPANIES)
+            .select(f"{CompaniesColumns.NAME}, {CompaniesColumns.ALTERNATIVE_NAMES}")
+            .execute()
+        )
+        return response.data
+
+    def list_persons_from_company_id(self, company_id: int) -> list[dict[str, Any]]:
+        response = (
+            self.db_client.table(Table.PERSONS)
+            .select(PersonsColumns.NAME)
+            .eq(PersonsColumns.CURRENT_COMPANY_ID, company_id)
+            .execute()
+        )
+        return response.data
+
+    def fetch_stale(self,
+                    table_name: str,
+                    updated_before: datetime.datetime,
+                    limit: int,
+                    entity_ids: list[int] | None = None) -> list[dict[str, Any]]:
+        if entity_ids is not None and len(entity_ids) == 0:
+            return []
+        columns = f"*, {Table.COMPANIES}!inner({ColumnsBase.NAME})" if table_name == Table.PERSONS else "*"
+        query = self.db_client.table(table_name=table_name).select(columns).lt(ColumnsBase.UPDATED_AT, updated_before.isoformat())
+        if entity_ids is not None:
+            query = query.in_(ColumnsBase.ID, entity_ids)
+        return query.order(ColumnsBase.UPDATED_AT).limit(limit).execute().data
+
+    def fetch_updated(self,
+                      table_name: str,
+                      updated_after: datetime.datetime | None,
+                      after_id: int,
+                      limit: int) -> list[dict[str, Any]]:
+        query = self.db_client.table(table_name=table_name).select("*")
+        if updated_after is None:
+            query = query.not_.is_(ColumnsBase.UPDATED_AT, 'null')
+        else:
+            updated_after = updated_after.isoformat()
+            query = query.or_(
+                f'{ColumnsBase.UPDATED_AT}.gt."{updated_after}",'
+                f'and({ColumnsBase.UPDATED_AT}.eq."{updated_after}",{ColumnsBase.ID}.gt.{after_id})'
+            )
+        response = (
+            query.order(ColumnsBase.UPDATED_AT)
+            .order(ColumnsBase.ID)
+            .limit(limit)
+            .execute()
+        )
+        return response.data
+
+
+def _to_utc(value: Any) -> str | None:
+    # Timestamps are compared as UTC ISO strings; the row itself keeps the value as it was written
+    if value is None:
+        return None
+    if not isinstance(value, datetime.datetime):
+        value = datetime.datetime.fromisoformat(str(value))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).isoformat()
+
+
+class SQLiteRepository(EntityRepository):
+    """
+    Embedded backend for single-node deployments, tests and offline benchmarks. Each row is stored as JSON, next to
+    indexed copies of the columns it is looked up by: name, current_company_id, updated_at and, in a separate table,
+    the alternative names of the companies.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('PRAGMA foreign_keys=ON')
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {Table.COMPANIES} ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, updated_at TEXT, row TEXT NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS company_aliases ('
+                f'company_id INTEGER NOT NULL REFERENCES {Table.COMPANIES}(id) ON DELETE CASCADE, alias TEXT NOT NULL)'
+            )
+            self._connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {Table.PERSONS} ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, current_company_id INTEGER, '
+                'updated_at TEXT, row TEXT NOT NULL)'
+            )
+            for index in [
+                f'companies_name ON {Table.COMPANIES} (name)',
+                f'companies_updated_at ON {Table.COMPANIES} (updated_at)',
+                'company_aliases_alias ON company_aliases (alias)',
+                'company_aliases_company_id ON company_aliases (company_id)',
+                f'persons_name ON {Table.PERSONS} (name, current_company_id)',
+                f'persons_current_company_id ON {Table.PERSONS} (current_company_id)',
+                f'persons_updated_at ON {Table.PERSONS} (updated_at)',
+            ]:
+                self._connection.execute(f'CREATE INDEX IF NOT EXISTS {index}')
+
+    @staticmethod
+    def _to_row(id_: int, data: str) -> dict[str, Any]:
+        return {ColumnsBase.ID: id_, **json.loads(data)}
+
+    def _select(self, sql: str, parameters: tuple = ()) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(sql, parameters).fetchall()
+        return [self._to_row(id_=x[0], data=x[1]) for x in rows]
+
+    def _index_values(self, table_name: str, row: dict[str, Any]) -> dict[str, Any]:
+        values = {'name': row.get(ColumnsBase.NAME), 'updated_at': _to_utc(row.get(ColumnsBase.UPDATED_AT))}
+        if table_name == Table.PERSONS:
+            values['current_company_id'] = row.get(PersonsColumns.CURRENT_COMPANY_ID)
+        return values
+
+    def _set_aliases(self, company_id: int, aliases: list[str] | None):
+        self._connection.execute('DELETE FROM company_aliases WHERE company_id = ?', (company_id,))
+        self._connection.executemany(
+            'INSERT INTO company_aliases (company_id, alias) VALUES (?, ?)', [(company_id, x) for x in aliases or []]
+        )
+
+    def probe(self):
+        with self._lock:
+            self._connection.execute(f'SELECT id FROM {Table.COMPANIES} LIMIT 1').fetchall()
+
+    def count(self, table_name: str) -> int:
+        _check_table_name(table_name=table_name)
+        with self._lock:
+            return self._connection.execute(f'SELECT COUNT(*) FROM {table_name}').fetchone()[0]
+
+    def insert(self, table_name: str, rows: list[dict[str, Any]]) -> list[int]:
+        _check_table_name(table_name=table_name)
+        ids = []
+        with self._lock, self._connection:
+            for row in rows:
+                row = {k: v for k, v in row.items() if k != ColumnsBase.ID}
+                values = self._index_values(table_name=table_name, row=row)
+                cursor = self._connection.execute(
+                    f'INSERT INTO {table_name} ({", ".join(values)}, row) VALUES ({", ".join("?" * (len(values) + 1))})',
+                    (*values.values(), json.dumps(row, default=str)),
+                )
+                ids.append(cursor.lastrowid)
+                if table_name == Table.COMPANIES:
+                    self._set_aliases(company_id=cursor.lastrowid, aliases=row.get(CompaniesColumns.ALTERNATIVE_NAMES))
+        return ids
+
+    def upsert(self, table_name: str, rows: list[dict[str, Any]]):
+        """Insert the rows with their own ids, replacing the rows that already exist. Used to copy another backend."""
+        _check_table_name(table_name=table_name)
+        with self._lock, self._connection:
+            for row in rows:
+                id_, row = row[ColumnsBase.ID], {k: v for k, v in row.items() if k != ColumnsBase.ID}
+                values = self._index_values(table_name=table_name, row=row)
+                self._connection.execute(
+                    f'INSERT INTO {table_name} (id, {", ".join(values)}, row) VALUES ({", ".join("?" * (len(values) + 2))}) '
+                    f'ON CONFLICT (id) DO UPDATE SET {", ".join(f"{k} = excluded.{k}" for k in values)}, row = excluded.row',
+                    (id_, *values.values(), json.dumps(row, default=str)),
+                )
+                if table_name == Table.COMPANIES:
+                    self._set_aliases(company_id=id_, aliases=row.get(CompaniesColumns.ALTERNATIVE_NAMES))
+
+    def update(self, table_name: str, entity_id: int, changes: dict[str, Any]):
+        _check_table_name(table_name=table_name)
+        with self._lock, self._connection:
+            current = self._connection.execute(f'SELECT row FROM {table_name} WHERE id = ?', (entity_id,)).fetchone()
+            if current is None:
+                return
+            row = {**json.loads(current[0]), **{k: v for k, v in changes.items() if k != ColumnsBase.ID}}
+            values = self._index_values(table_name=table_name, row=row)
+            self._connection.execute(
+                f'UPDATE {table_name} SET {", ".join(f"{k} = ?" for k in values)}, row = ? WHERE id = ?',
+                (*values.values(), json.dumps(row, default=str), entity_id),
+            )
+            if table_name == Table.COMPANIES and CompaniesColumns.ALTERNATIVE_NAMES in changes:
+                self._set_aliases(company_id=entity_id, aliases=row.get(CompaniesColumns.ALTERNATIVE_NAMES))
+
+    def fetch_by_id(self, table_name: str, entity_id: int) -> list[dict[str, Any]]:
+        _check_table_name(table_name=table_name)
+        return self._select(f'SELECT id, row FROM {table_name} WHERE id = ?', (entity_id,))
+
+    def fetch_by_names(self, table_name: str, names: list[str]) -> list[dict[str, Any]]:
+        _check_table_name(table_name=table_name)
+        if len(names) == 0:
+            return []
+        return self._select(f'SELECT id, row FROM {table_name} WHERE name IN ({", ".join("?" * len(names))})', tuple(names))
+
+    def fetch_by_alternative_name(self, name: str) -> list[dict[str, Any]]:
+        return self._select(
+            f'SELECT id, row FROM {Table.COMPANIES} WHERE id IN (SELECT company_id FROM company_aliases WHERE alias = ?)', (name,)
+        )
+
+    def fetch_person(self, name: str, current_company_id: int) -> list[dict[str, Any]]:
+        return self._select(
+            f'SELECT id, row FROM {Table.PERSONS} WHERE name = ? AND current_company_id = ?', (name, current_company_id)
+        )
+
+    def list_names(self, table_name: str) -> list[dict[str, Any]]:
+        _check_table_name(table_name=table_name)
+        with self._lock:
+            if table_name == Table.COMPANIES:
+                return [{'name': x[0]} for x in self._connection.execute(f'SELECT name FROM {Table.COMPANIES}').fetchall()]
+            rows = self._connection.execute(
+                f'SELECT p.name, c.name FROM {Table.PERSONS} p JOIN {Table.COMPANIES} c ON c.id = p.current_company_id'
+            ).fetchall()
+        return [{'name': x[0], 'current_company': x[1]} for x in rows]
+
+    def list_company_aliases(self) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT c.id, c.name, a.alias FROM {Table.COMPANIES} c LEFT JOIN company_aliases a ON a.company_id = c.id '
+                'ORDER BY c.id, a.rowid'
+            ).fetchall()
+        companies = {}
+        for id_, name, alias in rows:
+            company = companies.setdefault(id_, {'name': name, 'alternative_names': []})
+            if alias is not None:
+                company['alternative_names'].append(alias)
+        return list(companies.values())
+
+    def list_persons_from_company_id(self, company_id: int) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(f'SELECT name FROM {Table.PERSONS} WHERE current_company_id = ?', (company_id,)).fetchall()
+        return [{'name': x[0]} for x in rows]
+
+    def fetch_stale(self,
+                    table_name: str,
+                    updated_before: datetime.datetime,
+                    limit: int,
+                    entity_ids: list[int] | None = None) -> list[dict[str, Any]]:
+        _check_table_name(table_name=table_name)
+        if entity_ids is not None and len(entity_ids) == 0:
+            return []
+        alias = 'c' if table_name == Table.COMPANIES else 'p'
+        id_filter = f' AND {alias}.id IN ({", ".join("?" * len(entity_ids))})' if entity_ids is not None else ''
+        parameters = (_to_utc(updated_before), *(entity_ids or []), limit)
+        if table_name == Table.COMPANIES:
+            return self._select(
+                f'SELECT c.id, c.row FROM {Table.COMPANIES} c WHERE c.updated_at < ?{id_filter} ORDER BY c.updated_at LIMIT ?',
+                parameters,
+            )
+        with self._lock:
+            rows = self._connection.execute(
+                f'SELECT p.id, p.row, c.name FROM {Table.PERSONS} p JOIN {Table.COMPANIES} c ON c.id = p.current_company_id '
+                f'WHERE p.updated_at < ?{id_filter} ORDER BY p.updated_at LIMIT ?',
+                parameters,
+            ).fetchall()
+        return [{**self._to_row(id_=x[0], data=x[1]), Table.COMPANIES: {'name': x[2]}} for x in rows]
+
+    def fetch_updated(self,
+                      table_name: str,
+                      updated_after: datetime.datetime | None,
+                      after_id: int,
+                      limit: int) -> list[dict[str, Any]]:
+        _check_table_name(table_name=table_name)
+        if updated_after is None:
+            return self._select(
+                f'SELECT id, row FROM {table_name} WHERE updated_at IS NOT NULL ORDER BY updated_at, id LIMIT ?', (limit,)
+            )
+        updated_after = _to_utc(updated_after)
+        return self._select(
+            f'SELECT id, row FROM {table_name} WHERE updated_at > ? OR (updated_at = ? AND id > ?) ORDER BY updated_at, id LIMIT ?',
+            (updated_after, updated_after, after_id, limit),
+        )
+
+
+def get_repository(backend: str = 'supabase',
+                   database_url: str | None = None,
+                   database_key: str | None = None,
+                   path: str | None = None) -> EntityRepository:
+    match backend:
+        case 'supabase':
+            return SupabaseRepository(db_client=create_client(supabase_url=database_url, supabase_key=database_key))
+        case 'sqlite':
+            return SQLiteRepository(path=path)
+        case _:
+            raise ValueError(f'Invalid database backend {backend}! - Can be either supabase or sqlite')
@@ -0,0 +1,136 @@
+import copy
+import threading
+from typing import Any
+from uuid import uuid4
+
+from ai_common import TavilySearchCategory, TavilySearchDepth
+from langchain_core.runnables import RunnableConfig
+
+from .enums import ResearchDepth
+
+# Business researcher settings per research depth. STANDARD is the configuration used before profiles existed.
+RESEARCH_PROFILES = {
+    ResearchDepth.QUICK: {
+        'max_iterations': 1,
+        'max_results_per_query': 3,
+        'max_tokens_per_source': 2000,
+        'number_of_days_back': 360,
+        'number_of_queries': 2,
+        'search_category': TavilySearchCategory.GENERAL,
+        'search_depth': TavilySearchDepth.BASIC,
+        },
+    ResearchDepth.STANDARD: {
+        'max_iterations': 5,
+        'max_results_per_query': 5,
+        'max_tokens_per_source': 10000,
+        'number_of_days_back': 360,
+        'number_of_queries': 4,
+        'search_category': TavilySearchCategory.GENERAL,
+        'search_depth': TavilySearchDepth.ADVANCED,
+        },
+    ResearchDepth.DEEP: {
+        'max_iterations': 8,
+        'max_results_per_query': 8,
+        'max_tokens_per_source': 15000,
+        'number_of_days_back': 720,
+        'number_of_queries': 6,
+        'search_category': TavilySearchCategory.GENERAL,
+        'search_depth': TavilySearchDepth.ADVANCED,
+        },
+    }
+
+# Latency assumed for a profile (seconds) until its first research has been timed
+EXPECTED_SECONDS = {
+    ResearchDepth.QUICK: 20.0,
+    ResearchDepth.STANDARD: 60.0,
+    ResearchDepth.DEEP: 150.0,
+    }
+
+
+def get_research_config(profile: str) -> RunnableConfig:
+    # Every research gets its own thread, so that concurrent researches do not share checkpoints
+    return RunnableConfig(
+        recursion_limit=100,
+        configurable={'thread_id': str(uuid4()), **RESEARCH_PROFILES[profile]},
+    )
+
+
+class ResearchProfileSelector:
+    """
+    Chooses the research profile of each research and keeps latency, token and cost statistics per profile.
+
+    The profile is, in order of precedence: the one requested explicitly (by the tool call or the request),
+    the most thorough profile expected to finish within the latency target (if a target is set), the default profile.
+    Expected latencies are exponential moving averages of the observed research timings.
+    """
+
+    def __init__(self, default_profile: str = ResearchDepth.STANDARD, latency_target_seconds: float | None = None, ema_alpha: float = 0.3):
+        if default_profile not in RESEARCH_PROFILES:
+            raise ValueError(f'Invalid research profile {default_profile}! - Can be one of {list(RESEARCH_PROFILES)}')
+        self.default_profile = default_profile
+        self.latency_target_seconds = latency_target_seconds
+        self.ema_alpha = ema_alpha
+        self._lock = threading.Lock()
+        self._stats = {
+            k: {
+                'researches': 0,
+                'ema_seconds': None,
+                'total_seconds': 0.0,
+                'input_tokens': 0,
+                'output_tokens': 0,
+                'total_cost': 0.0,
+                'selected_by_latency_target': 0,
+                'ema_tokens': {},  # Model -> tokens used per research
+            }
+            for k in RESEARCH_PROFILES
+        }
+
+    def get_expected_seconds(self, profile: str) -> float:
+        with self._lock:
+            ema_seconds = self._stats[profile]['ema_seconds']
+        return EXPECTED_SECONDS[profile] if ema_seconds is None else ema_seconds
+
+    def select(self, requested: str | None = None, latency_target_seconds: float | None = None) -> str:
+        if requested is not None:
+            if requested not in RESEARCH_PROFILES:
+                raise ValueError(f'Invalid research profile {requested}! - Can be one of {list(RESEARCH_PROFILES)}')
+            return requested
+
+        latency_target_seconds = latency_target_seconds or self.latency_target_seconds
+        if latency_target_seconds is None:
+            return self.default_profile
+
+        profiles = list(RESEARCH_PROFILES)  # From the cheapest to the most thorough
+        profile = next((x for x in reversed(profiles) if self.get_expected_seconds(x) <= latency_target_seconds), profiles[0])
+        with self._lock:
+            self._stats[profile]['selected_by_latency_target'] += 1
+        return profile
+
+    def record(self, profile: str, seconds: float, token_usage: dict[str, Any], cost: float):
+        with self._lock:
+            stats = self._stats[profile]
+            stats['researches'] += 1
+            stats['total_seconds'] += seconds
+            stats['ema_seconds'] = seconds if stats['ema_seconds'] is None else \
+                self.ema_alpha * seconds + (1 - self.ema_alpha) * stats['ema_seconds']
+            stats['input_tokens'] += sum(x['input_tokens'] for x in token_usage.values())
+            stats['output_tokens'] += sum(x['output_tokens'] for x in token_usage.values())
+            stats['total_cost'] += cost
+            for model, usage in token_usage.items():
+                tokens = usage['input_tokens'] + usage['output_tokens']
+                previous = stats['ema_tokens'].get(model)
+                stats['ema_tokens'][model] = tokens if previous is None else self.ema_alpha * tokens + (1 - self.ema_alpha) * previous
+
+    def get_expected_tokens(self, profile: str) -> dict[str, int]:
+        """Tokens per model a research of the profile is expected to use; empty until one has been recorded."""
+        with self._lock:
+            return {k: int(v) for k, v in self._stats[profile]['ema_tokens'].items()}
+
+    def get_stats(self) -> dict[str, dict[str, Any]]:
+        with self._lock:
+            stats = copy.deepcopy(self._stats)
+        for x in stats.values():
+            n = max(x['researches'], 1)
+            x['avg_seconds'] = x['total_seconds'] / n
+            x['avg_cost'] = x['total_cost'] / n
+        return stats
@@ -0,0 +1,91 @@
+import asyncio
+import contextlib
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Coroutine
+
+
+class RunCancelledError(Exception):
+    """Raised inside a run when its cancellation token was cancelled."""
+
+
+class CancellationToken:
+    """
+    Cancellation flag and optional deadline (epoch seconds) of a single agent run.
+
+    The token is thread-safe: it is cancelled from the event loop (e.g. on client disconnect) and
+    checked from the worker threads that execute the graph nodes, tool handlers and research.
+    """
+
+    def __init__(self, deadline: float | None = None):
+        self.deadline = deadline
+        self.reason: str | None = None
+        self._event = threading.Event()
+
+    def cancel(self, reason: str = 'cancelled'):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def get_remaining_seconds(self) -> float | None:
+        return None if self.deadline is None else self.deadline - time.time()
+
+    def raise_if_cancelled(self):
+        if self.is_cancelled:
+            raise RunCancelledError(self.reason)
+
+
+_cancellation_token: ContextVar[CancellationToken | None] = ContextVar('cancellation_token', default=None)
+
+
+def get_cancellation_token() -> CancellationToken | None:
+    """The token of the run executing in the current context (propagates into graph node threads)."""
+    return _cancellation_token.get()
+
+
+@contextlib.contextmanager
+def use_cancellation_token(token: CancellationToken | None):
+    reset_token = _cancellation_token.set(token)
+    try:
+        yield token
+    finally:
+        _cancellation_token.reset(reset_token)
+
+
+_run_options: ContextVar[dict[str, Any]] = ContextVar('run_options', default={})
+
+
+def get_run_option(name: str, default: Any = None) -> Any:
+    """Per-request option of the run executing in the current context, e.g. the research profile."""
+    return _run_options.get().get(name, default)
+
+
+@contextlib.contextmanager
+def use_run_options(**options):
+    # Options given as None keep the value of the enclosing context
+    reset_token = _run_options.set({**_run_options.get(), **{k: v for k, v in options.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _run_options.reset(reset_token)
+
+
+async def run_cancellable(coroutine: Coroutine[Any, Any, Any], token: CancellationToken | None, poll_interval: float = 0.2) -> Any:
+    """Await the coroutine, cancelling it (and raising RunCancelledError) as soon as the token is cancelled."""
+    task = asyncio.ensure_future(coroutine)
+    if token is None:
+        return await task
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll_interval)
+        if done:
+            return task.result()
+        if token.is_cancelled:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            raise RunCancelledError(token.reason)
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from .rate_limiter import ProviderRateLimiter, get_backoff_seconds, is_rate_limit_error
+from .utils import normalize_name
+
+# Attribute path of the Tavily client the BusinessResearcher creates from the web search API key
+SEARCH_CLIENT_PATH = 'web_search.client'
+
+
+class SearchCache:
+    """
+    On-disk (SQLite) cache of web search responses with a time-to-live.
+
+    The database is opened in WAL mode, so that several processes (API workers, bulk ingestion) can share it.
+    Entries are keyed on the normalized query text and the search parameters.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 24 * 3600):
+        self.path = os.path.expanduser(path)
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS search_cache (key TEXT PRIMARY KEY, created_at REAL NOT NULL, response TEXT NOT NULL)'
+            )
+            self._connection.execute('DELETE FROM search_cache WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'errors': 0}
+
+    @staticmethod
+    def make_key(query: str, params: dict[str, Any]) -> str:
+        payload = json.dumps({'query': normalize_name(query), 'params': params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT response FROM search_cache WHERE key = ? AND created_at >= ?',
+                (key, time.time() - self.ttl_seconds),
+            ).fetchone()
+            self._stats['hits' if row is not None else 'misses'] += 1
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: str, response: Any):
+        try:
+            serialized = json.dumps(response)
+        except TypeError:
+            # Only JSON responses are cached
+            with self._lock:
+                self._stats['errors'] += 1
+            return
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO search_cache (key, created_at, response) VALUES (?, ?, ?)',
+                (key, time.time(), serialized),
+            )
+            self._stats['writes'] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups > 0 else 0.0
+        return stats
+
+
+class ManagedSearchClient:
+    """
+    Wraps a (sync or async) search client. `search` calls are served from the cache if one is given, and the calls
+    that reach the provider go through its rate limiter if one is given, one request each; cache hits are not charged.
+    Other attributes are delegated.
+    """
+
+    def __init__(self, client: Any, cache: SearchCache | None = None, rate_limiter: ProviderRateLimiter | None = None):
+        self._client = client
+        self._cache = cache
+        self._rate_limiter = rate_limiter
+        self._is_async = inspect.iscoroutinefunction(client.search)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    def search(self, query: str, **kwargs):
+        key = self._cache.make_key(query=query, params=kwargs) if self._cache is not None else None
+        if self._is_async:
+            return self._search_async(query=query, key=key, **kwargs)
+
+        response = self._cache.get(key) if self._cache is not None else None
+        if response is None:
+            with self._acquire():
+                response = self._client.search(query, **kwargs)
+            if self._cache is not None:
+                self._cache.put(key=key, response=response)
+        return response
+
+    async def _search_async(self, query: str, key: str | None, **kwargs):
+        response = await asyncio.to_thread(self._cache.get, key) if self._cache is not None else None
+        if response is None:
+            acquisition = self._acquire()
+            await self._enter_async(acquisition=acquisition)
+            try:
+                response = await self._client.search(query, **kwargs)
+            except BaseException as e:
+                acquisition.__exit__(type(e), e, e.__traceback__)
+                raise
+            acquisition.__exit__(None, None, None)
+            if self._cache is not None:
+                await asyncio.to_thread(self._cache.put, key, response)
+        return response
+
+    @staticmethod
+    async def _enter_async(acquisition: Any):
+        """
+        Enter the acquisition in a worker thread, since waiting for the limiter blocks the event loop the concurrent
+        searches run on. If the caller is cancelled meanwhile, the acquisition is released as soon as it is entered.
+        """
+        lock = threading.Lock()
+        state = {'entered': False, 'cancelled': False}
+
+        def enter():
+            acquisition.__enter__()
+            with lock:
+                state['entered'] = True
+                if not state['cancelled']:
+                    return
+            # The caller is gone; it is released here, as the event loop may already be closed
+            acquisition.__exit__(None, None, None)
+
+        try:
+            await asyncio.to_thread(enter)
+        except asyncio.CancelledError:
+            with lock:
+                state['cancelled'] = True
+                entered = state['entered']
+            if entered:
+                acquisition.__exit__(None, None, None)
+            raise
+
+    @contextmanager
+    def _acquire(self) -> Iterator[None]:
+        if self._rate_limiter is None:
+            yield
+            return
+        with self._rate_limiter.acquire(requests=1):
+            try:
+                yield
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    self._rate_limiter.back_off(get_backoff_seconds(attempt=0))
+                raise
+
+
+def get_search_client(researcher: Any, client_path: str) -> tuple[Any, str, Any]:
+    """
+    Resolve the dotted attribute path of the researcher's web search client. Returns the object holding the client,
+    the attribute name and the client. Raises ValueError if there is no search client at the path.
+    """
+    *parents, name = client_path.split('.')
+    owner = researcher
+    try:
+        for parent in parents:
+            owner = getattr(owner, parent)
+        client = getattr(owner, name)
+    except AttributeError as e:
+        raise ValueError(f'No web search client at {type(researcher).__name__}.{client_path} ({str(e)})! '
+                         f'- Set web_search.client_path in the agent config') from e
+    if not callable(getattr(client, 'search', None)):
+        raise ValueError(f'{type(researcher).__name__}.{client_path} is a {type(client).__name__}, not a web search client!')
+    return owner, name, client
+
+
+def install_search_client(researcher: Any,
+                          client_path: str = SEARCH_CLIENT_PATH,
+                          cache: SearchCache | None = None,
+                          rate_limiter: ProviderRateLimiter | None = None):
+    """Replace the researcher's web search client (the attribute at `client_path`) with a cached / rate limited wrapper."""
+    owner, name, client = get_search_client(researcher=researcher, client_path=client_path)
+    if isinstance(client, ManagedSearchClient):
+        raise ValueError(f'The web search client at {type(researcher).__name__}.{client_path} is already wrapped!')
+    setattr(owner, name, ManagedSearchClient(client=client, cache=cache, rate_limiter=rate_limiter))
@@ -0,0 +1,34 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # Optional fast backend: pip install orjson
+    orjson = None
+
+JSON_BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes; compact unless `indent`. Values that are not JSON types (datetimes, UUIDs, ...)
+    are written as strings, and non-ASCII characters are kept as they are.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+    return dumps(obj=obj, indent=indent).encode('utf-8')
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """Serialize to a JSON string; see `dumps_bytes`. Tool outputs go to the LLM, so they are compact by default."""
+    if orjson is not None:
+        return dumps_bytes(obj=obj, indent=indent).decode('utf-8')
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=str)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
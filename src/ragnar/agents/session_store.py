@@ -0,0 +1,294 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Iterator
+from uuid import uuid4
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, messages_from_dict, messages_to_dict
+
+from .state import ToDo, add_token_usage
+
+
+def _now() -> str:
+    return datetime.datetime.now(tz=datetime.timezone.utc).isoformat()
+
+
+def _get_history_fields(new_messages: list[BaseMessage], metadata: dict[str, Any] | None) -> list[dict[str, Any] | None]:
+    """
+    The conversation history fields of each message: the user's queries and the final answer of the run (the last
+    message, with the metadata of the run). None for the other messages (tool calls and their results).
+    """
+    fields = []
+    for i, message in enumerate(new_messages):
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+        if isinstance(message, HumanMessage):
+            fields.append({'role': 'user', 'content': content, 'metadata': None})
+        elif isinstance(message, AIMessage) and i == len(new_messages) - 1:
+            fields.append({'role': 'assistant', 'content': content, 'metadata': metadata})
+        else:
+            fields.append(None)
+    return fields
+
+
+class SessionStore(ABC):
+    """
+    Conversation state of the agent's sessions: messages (without the system message), TODO list and
+    cumulative token usage. Keeping it outside the agent lets any process serve any session.
+
+    A run loads the session, and saves the messages it added, the TODO list it ended with and the tokens it used.
+    Messages are only ever appended, so two processes serving the same session at once do not overwrite each other.
+
+    The conversation history shown to users (the user's queries and the agent's answers, in pages) is read from the
+    same messages, so it always matches what the agent continues the conversation from. History messages have
+    increasing ids, which serve as pagination cursors.
+    """
+
+    @abstractmethod
+    def create_session(self) -> str:
+        """Create an empty session and return its id."""
+
+    @abstractmethod
+    def has_session(self, session_id: str) -> bool:
+        ...
+
+    @abstractmethod
+    def load(self, session_id: str) -> dict[str, Any]:
+        """{'messages': [...], 'todos': [...], 'token_usage': {...}}; empty for an unknown session."""
+
+    @abstractmethod
+    def save(self,
+             session_id: str,
+             new_messages: list[BaseMessage],
+             todos: list[ToDo],
+             token_usage: dict[str, dict[str, int]],
+             metadata: dict[str, Any] | None = None):
+        """Append the new messages, replace the TODO list and add the token usage. `metadata` goes with the answer."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def get_messages(self, session_id: str, cursor: int | None = None, limit: int = 20) -> tuple[list[dict[str, Any]], int | None]:
+        """
+        The `limit` history messages preceding the message with id `cursor` (the latest ones if None), in chronological
+        order. Also returns the cursor of the previous page, None if there are no older messages.
+        """
+
+    @abstractmethod
+    def iter_messages(self, session_id: str, batch_size: int = 500) -> Iterator[dict[str, Any]]:
+        """All history messages of the session in chronological order."""
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions kept in the process; only for a single worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: dict[str, dict[str, Any]] = {}
+        self._last_message_id = 0
+
+    @staticmethod
+    def _new_session() -> dict[str, Any]:
+        return {'messages': [], 'history': [], 'todos': [], 'token_usage': {}}
+
+    def create_session(self) -> str:
+        session_id = str(uuid4())
+        with self._lock:
+            self._sessions[session_id] = self._new_session()
+        return session_id
+
+    def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def load(self, session_id: str) -> dict[str, Any]:
+        with self._lock:
+            session = self._sessions.get(session_id, self._new_session())
+            return {'messages': list(session['messages']), 'todos': list(session['todos']), 'token_usage': session['token_usage']}
+
+    def save(self,
+             session_id: str,
+             new_messages: list[BaseMessage],
+             todos: list[ToDo],
+             token_usage: dict[str, dict[str, int]],
+             metadata: dict[str, Any] | None = None):
+        created_at = _now()
+        with self._lock:
+            session = self._sessions.setdefault(session_id, self._new_session())
+            session['messages'].extend(new_messages)
+            session['todos'] = list(todos)
+            session['token_usage'] = add_token_usage(left=session['token_usage'], right=token_usage)
+            for fields in _get_history_fields(new_messages=new_messages, metadata=metadata):
+                self._last_message_id += 1
+                if fields is not None:
+                    session['history'].append({'id': self._last_message_id, **fields, 'created_at': created_at})
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    @staticmethod
+    def _to_dict(entry: dict[str, Any]) -> dict[str, Any]:
+        message = {k: entry[k] for k in ('id', 'role', 'content', 'created_at')}
+        if entry['metadata'] is not None:
+            message['metadata'] = entry['metadata']
+        return message
+
+    def get_messages(self, session_id: str, cursor: int | None = None, limit: int = 20) -> tuple[list[dict[str, Any]], int | None]:
+        with self._lock:
+            history = list(self._sessions.get(session_id, self._new_session())['history'])
+        older = [x for x in history if cursor is None or x['id'] < cursor]
+        messages = [self._to_dict(entry=x) for x in older[-limit:]]
+        return messages, messages[0]['id'] if len(older) > limit else None
+
+    def iter_messages(self, session_id: str, batch_size: int = 500) -> Iterator[dict[str, Any]]:
+        with self._lock:
+            history = list(self._sessions.get(session_id, self._new_session())['history'])
+        for entry in history:
+            yield self._to_dict(entry=entry)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite database (WAL mode), shared by the worker processes of a host. The history fields
+    (role, content, metadata) are stored next to each message, so that history pages are read without deserializing
+    the agent's messages.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS conversations ('
+                'id TEXT PRIMARY KEY, created_at TEXT NOT NULL, todos TEXT NOT NULL, token_usage TEXT NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS conversation_messages ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'conversation_id TEXT NOT NULL REFERENCES conversations(id), '
+                'message TEXT NOT NULL, '
+                'role TEXT, '  # None for the messages that are not part of the history
+                'content TEXT, '
+                'metadata TEXT, '
+                'created_at TEXT NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS conversation_messages_conversation_id ON conversation_messages (conversation_id, id)'
+            )
+
+    def create_session(self) -> str:
+        session_id = str(uuid4())
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO conversations (id, created_at, todos, token_usage) VALUES (?, ?, '[]', '{}')", (session_id, _now())
+            )
+        return session_id
+
+    def has_session(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._connection.execute('SELECT 1 FROM conversations WHERE id = ?', (session_id,)).fetchone()
+        return row is not None
+
+    def load(self, session_id: str) -> dict[str, Any]:
+        with self._lock:
+            session = self._connection.execute('SELECT todos, token_usage FROM conversations WHERE id = ?', (session_id,)).fetchone()
+            rows = self._connection.execute(
+                'SELECT message FROM conversation_messages WHERE conversation_id = ? ORDER BY id', (session_id,)
+            ).fetchall()
+        if session is None:
+            return {'messages': [], 'todos': [], 'token_usage': {}}
+        return {
+            'messages': messages_from_dict([json.loads(x['message']) for x in rows]),
+            'todos': [ToDo(**x) for x in json.loads(session['todos'])],
+            'token_usage': json.loads(session['token_usage']),
+        }
+
+    def save(self,
+             session_id: str,
+             new_messages: list[BaseMessage],
+             todos: list[ToDo],
+             token_usage: dict[str, dict[str, int]],
+             metadata: dict[str, Any] | None = None):
+        created_at = _now()
+        rows = []
+        for message, fields in zip(messages_to_dict(new_messages), _get_history_fields(new_messages=new_messages, metadata=metadata)):
+            fields = fields or {'role': None, 'content': None, 'metadata': None}
+            rows.append((session_id, json.dumps(message), fields['role'], fields['content'],
+                         json.dumps(fields['metadata'], default=str) if fields['metadata'] is not None else None, created_at))
+        with self._lock, self._connection:
+            # BEGIN IMMEDIATE serializes the read-modify-write of the token usage across processes
+            self._connection.execute('BEGIN IMMEDIATE')
+            row = self._connection.execute('SELECT token_usage FROM conversations WHERE id = ?', (session_id,)).fetchone()
+            total = add_token_usage(left=json.loads(row['token_usage']) if row is not None else {}, right=token_usage)
+            todos = json.dumps([x.model_dump() for x in todos])
+            if row is None:
+                self._connection.execute(
+                    'INSERT INTO conversations (id, created_at, todos, token_usage) VALUES (?, ?, ?, ?)',
+                    (session_id, created_at, todos, json.dumps(total)),
+                )
+            else:
+                self._connection.execute(
+                    'UPDATE conversations SET todos = ?, token_usage = ? WHERE id = ?', (todos, json.dumps(total), session_id)
+                )
+            self._connection.executemany(
+                'INSERT INTO conversation_messages (conversation_id, message, role, content, metadata, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows,
+            )
+
+    def delete(self, session_id: str):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM conversation_messages WHERE conversation_id = ?', (session_id,))
+            self._connection.execute('DELETE FROM conversations WHERE id = ?', (session_id,))
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict[str, Any]:
+        message = {'id': row['id'], 'role': row['role'], 'content': row['content'], 'created_at': row['created_at']}
+        if row['metadata'] is not None:
+            message['metadata'] = json.loads(row['metadata'])
+        return message
+
+    def get_messages(self, session_id: str, cursor: int | None = None, limit: int = 20) -> tuple[list[dict[str, Any]], int | None]:
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT id, role, content, metadata, created_at FROM conversation_messages '
+                'WHERE conversation_id = ? AND id < ? AND role IS NOT NULL ORDER BY id DESC LIMIT ?',
+                (session_id, cursor if cursor is not None else 2 ** 63 - 1, limit + 1),
+            ).fetchall()
+        has_older = len(rows) > limit
+        messages = [self._to_dict(row=x) for x in reversed(rows[:limit])]
+        return messages, messages[0]['id'] if has_older else None
+
+    def iter_messages(self, session_id: str, batch_size: int = 500) -> Iterator[dict[str, Any]]:
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT id, role, content, metadata, created_at FROM conversation_messages '
+                    'WHERE conversation_id = ? AND id > ? AND role IS NOT NULL ORDER BY id LIMIT ?',
+                    (session_id, last_id, batch_size),
+                ).fetchall()
+            for row in rows:
+                yield self._to_dict(row=row)
+            if len(rows) < batch_size:
+                return
+            last_id = rows[-1]['id']
+
+
+def get_session_store(backend: str = 'memory', path: str | None = None) -> SessionStore:
+    match backend:
+        case 'memory':
+            return InMemorySessionStore()
+        case 'sqlite':
+            return SQLiteSessionStore(path=path)
+        case _:
+            raise ValueError(f'Invalid session store backend {backend}! - Can be either memory or sqlite')
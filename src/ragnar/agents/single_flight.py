@@ -0,0 +1,79 @@
+import copy
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable
+
+from .run_context import get_cancellation_token
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls sharing the same key into a single execution.
+
+    The first caller of a key (the leader) executes the function. Callers arriving while that
+    execution is in flight wait for it and receive a copy of its result instead of running their own.
+    Nothing is cached: once the leader finishes, the next call with the same key executes again.
+
+    Keys are tuples whose first element is the operation name, e.g. ('research_company', 'anthropic').
+    Statistics are kept per operation.
+
+    If the leader fails with one of the `retry_on` exceptions (e.g. its own run was cancelled), waiting
+    callers do not inherit the failure but execute again, one of them becoming the new leader. A waiting caller
+    whose own run is cancelled stops waiting every `poll_interval` seconds to raise RunCancelledError.
+    """
+
+    def __init__(self, retry_on: tuple[type[BaseException], ...] = (), poll_interval: float = 0.2):
+        self._retry_on = retry_on
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple, Future] = {}
+        self._stats: dict[str, dict[str, int]] = {}
+
+    def do(self, key: tuple, fn: Callable[[], Any]) -> tuple[Any, bool]:
+        """Run `fn` once per in-flight key. Returns the result and whether it was shared from another caller."""
+        with self._lock:
+            stats = self._stats.setdefault(key[0], {'calls': 0, 'executions': 0, 'coalesced': 0})
+            stats['calls'] += 1
+            future = self._in_flight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._in_flight[key] = future
+                stats['executions'] += 1
+            else:
+                stats['coalesced'] += 1
+
+        if not is_leader:
+            try:
+                return copy.deepcopy(self._wait(future=future)), True
+            except self._retry_on:
+                token = get_cancellation_token()
+                if token is not None:
+                    token.raise_if_cancelled()  # Our own run, not the leader's, was cancelled
+                return self.do(key=key, fn=fn)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _wait(self, future: Future) -> Any:
+        token = get_cancellation_token()
+        while True:
+            if token is not None:
+                token.raise_if_cancelled()
+            try:
+                return future.result(timeout=self._poll_interval)
+            except FutureTimeoutError:
+                continue
+
+    def get_stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return copy.deepcopy(self._stats)
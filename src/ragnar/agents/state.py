@@ -1,9 +1,29 @@
-from typing import Literal
+import operator
+from typing import Annotated, Literal
 from pydantic import BaseModel, Field
 
+from .budget import ExecutionBudget
+from .enums import PlanningMode
+
+def add_token_usage(left: dict[str, dict[str, int]], right: dict[str, dict[str, int]]) -> dict[str, dict[str, int]]:
+    """Sum of two per-model token usages. Also the reducer of the state's token usage, which nodes update with deltas."""
+    total = {k: dict(v) for k, v in left.items()}
+    for model, usage in right.items():
+        model_total = total.setdefault(model, {'input_tokens': 0, 'output_tokens': 0})
+        model_total['input_tokens'] += usage['input_tokens']
+        model_total['output_tokens'] += usage['output_tokens']
+    return total
+
 class AgentState(BaseModel):
-    messages: list
-    token_usage: dict
+    # Nodes return the messages they add and the tokens they used; the reducers append / add them to the state,
+    # so that a step does not rewrite (and the checkpointer does not copy) the whole conversation
+    messages: Annotated[list, operator.add]
+    token_usage: Annotated[dict, add_token_usage]
+    llm_calls: int = 0
+    total_cost: float = 0.0
+    started_at: float = 0.0
+    budget: ExecutionBudget | None = None
+    stop_reason: dict | None = None
 
 class ToDo(BaseModel):
     content: str
@@ -11,3 +31,4 @@ class ToDo(BaseModel):
 
 class DeepAgentState(AgentState):
     todos: list[ToDo] = Field(description="List of Todo items for task planning and progress tracking")
+    planning_mode: str = Field(default=PlanningMode.TOOLS, description="How the TODO list is exchanged with the model (see PlanningMode)")
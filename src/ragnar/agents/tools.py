@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 from business_researcher import CompanySchema, PersonSchema
+from .enums import ResearchDepthName
 from .state import ToDo
 
 class ResearchPerson(BaseModel):
@@ -10,12 +11,20 @@ class ResearchPerson(BaseModel):
     company: str = Field(
         description="The name of the company where the person works or is associated with. This helps narrow the search scope and improve result relevance.",
     )
+    depth: ResearchDepthName | None = Field(
+        default=None,
+        description="Optional. How thorough the research should be: 'quick' for a single fact or a short summary, 'standard' for a regular profile, 'deep' for a full dossier. Omit to use the default.",
+    )
 
 class ResearchCompany(BaseModel):
     """Research a company using comprehensive web search and AI analysis."""
     company_name: str = Field(
         description="The name of the company to research. Should be the official company name or commonly recognized brand name to ensure accurate and comprehensive search results.",
     )
+    depth: ResearchDepthName | None = Field(
+        default=None,
+        description="Optional. How thorough the research should be: 'quick' for a single fact or a short summary, 'standard' for a regular profile, 'deep' for a full dossier. Omit to use the default.",
+    )
 
 class InsertCompanyToDataBase(CompanySchema):
     """Insert a company to the database."""
@@ -23,13 +32,27 @@ class InsertCompanyToDataBase(CompanySchema):
 class InsertPersonToDataBase(PersonSchema):
     """Insert a person to the database."""
 
-class UpdateCompanyInDatabase(CompanySchema):
-    """Update a company in the database."""
-    id: int = Field(description="The id of the company in the database.")
+def _as_patch(schema: type[BaseModel], name: str, doc: str, id_description: str) -> type[BaseModel]:
+    """Patch version of the schema: the id is required, every other field is optional and defaults to None (unchanged)."""
+    fields = {
+        k: (v.annotation | None, Field(default=None, description=v.description))
+        for k, v in schema.model_fields.items()
+    }
+    return create_model(name, __doc__=doc, id=(int, Field(description=id_description)), **fields)
+
+UpdateCompanyInDatabase = _as_patch(
+    schema=CompanySchema,
+    name='UpdateCompanyInDatabase',
+    doc="Update a company in the database. Only send the id and the fields that changed; omitted fields keep their stored values.",
+    id_description="The id of the company in the database.",
+)
 
-class UpdatePersonInDatabase(PersonSchema):
-    """Update a person in the database."""
-    id: int = Field(description="The id of the person in the database.")
+UpdatePersonInDatabase = _as_patch(
+    schema=PersonSchema,
+    name='UpdatePersonInDatabase',
+    doc="Update a person in the database. Only send the id and the fields that changed; omitted fields keep their stored values.",
+    id_description="The id of the person in the database.",
+)
 
 class FetchCompanyFromDataBase(BaseModel):
     """Fetch details of a company from database."""
@@ -2,12 +2,11 @@ import copy
 import datetime
 from typing import Any
 
-from supabase import Client
-
 from .enums import ColumnsBase
+from .repository import EntityRepository
 
 
-def insert_entity_to_db(db_client: Client, input_dict: dict[str, Any], table_name: str):
+def insert_entity_to_db(repository: EntityRepository, input_dict: dict[str, Any], table_name: str):
     time_now = datetime.datetime.now().replace(microsecond=0).astimezone(
         tz=datetime.timezone(offset=datetime.timedelta(hours=3), name='UTC+3'))
 
@@ -17,46 +16,60 @@ def insert_entity_to_db(db_client: Client, input_dict: dict[str, Any], table_nam
     row_dict[ColumnsBase.CREATED_AT] = str(time_now)
     row_dict[ColumnsBase.CREATED_BY_ID] = 1
 
-    response = (
-        db_client.table(table_name=table_name)
-        .insert(row_dict)
-        .execute()
-    )
-    idx = response.data[0]['id']
+    idx = repository.insert(table_name=table_name, rows=[row_dict])[0]
     return idx
 
-def update_entity_in_db(db_client: Client, input_dict: dict[str, Any], table_name: str):
+def get_changed_columns(current_row: dict[str, Any], patch: dict[str, Any]) -> dict[str, Any]:
+    """Columns of the patch whose values differ from the current row. None values mean "unchanged"."""
+    return {k: v for k, v in patch.items() if k != ColumnsBase.ID and v is not None and current_row.get(k) != v}
+
+def update_entity_in_db(repository: EntityRepository,
+                        input_dict: dict[str, Any],
+                        table_name: str,
+                        current_row: dict[str, Any] | None = None,
+                        touch: bool = False) -> int | None:
+    """
+    Patch the row with the id in `input_dict`, sending only the columns that differ from the current row.
+    With `touch`, updated_at is written even if no column differs, e.g. to mark the row as refreshed.
+    `current_row` is fetched if not given. Returns the id, or None if there is no such row.
+    """
+    idx = input_dict[ColumnsBase.ID]
+    if current_row is None:
+        rows = repository.fetch_by_id(table_name=table_name, entity_id=idx)
+        if len(rows) == 0:
+            return None
+        current_row = rows[0]
+
+    row_dict = get_changed_columns(current_row=current_row, patch=input_dict)
+    if len(row_dict) == 0 and not touch:
+        return idx
+
     time_now = datetime.datetime.now().replace(microsecond=0).astimezone(
         tz=datetime.timezone(offset=datetime.timedelta(hours=3), name='UTC+3'))
-
-    row_dict = copy.deepcopy(input_dict)
     row_dict[ColumnsBase.UPDATED_BY_ID] = 1  # This will be an input after the system supports multiple users
     row_dict[ColumnsBase.UPDATED_AT] = str(time_now)
-    idx = row_dict.pop(ColumnsBase.ID)
-
-    response = (
-        db_client.table(table_name=table_name)
-        .update(row_dict)
-        .eq(ColumnsBase.ID, idx)
-        .execute()
-    )
-    idx = response.data[0]['id']
+
+    repository.update(table_name=table_name, entity_id=idx, changes=row_dict)
     return idx
 
-def fetch_entity_by_id(db_client: Client, table_name: str, entity_id: int) -> list[dict[str, Any]]:
-    response = (
-        db_client.table(table_name=table_name)
-        .select("*")
-        .eq(ColumnsBase.ID, entity_id)
-        .execute()
-    )
-    return response.data
-
-def fetch_entity_by_name(db_client: Client, entity_name: str, table_name: str) -> list[dict[str, Any]]:
-    response = (
-        db_client.table(table_name=table_name)
-        .select("*")
-        .eq(ColumnsBase.NAME, entity_name)
-        .execute()
-    )
-    return response.data
+def insert_entities_to_db(repository: EntityRepository, input_dicts: list[dict[str, Any]], table_name: str) -> list[int]:
+    """Insert several rows with a single request. Returns the ids in input order."""
+    if len(input_dicts) == 0:
+        return []
+    time_now = datetime.datetime.now().replace(microsecond=0).astimezone(
+        tz=datetime.timezone(offset=datetime.timedelta(hours=3), name='UTC+3'))
+
+    rows = []
+    for input_dict in input_dicts:
+        row_dict = copy.deepcopy(input_dict)
+        row_dict[ColumnsBase.UPDATED_AT] = str(time_now)
+        row_dict[ColumnsBase.UPDATED_BY_ID] = 1 # This will be an input after the system supports multiple users
+        row_dict[ColumnsBase.CREATED_AT] = str(time_now)
+        row_dict[ColumnsBase.CREATED_BY_ID] = 1
+        rows.append(row_dict)
+
+    return repository.insert(table_name=table_name, rows=rows)
+
+def normalize_name(name: str) -> str:
+    # Case and whitespace insensitive form of an entity name, used for keying and matching
+    return ' '.join(name.split()).casefold()
@@ -0,0 +1,288 @@
+"""
+Bulk research-and-ingest pipeline.
+
+Researches the companies (and optionally persons) listed in a CSV or JSONL file with bounded concurrency,
+upserts the results into the database in batches and checkpoints progress, so that an interrupted
+ingestion resumes where it stopped.
+
+Input records have the fields `type` ('company' or 'person'), `name` and, for persons, `company`.
+If `type` is missing, records with a `company` are persons. Example CSV:
+
+    type,name,company
+    company,Anthropic,
+    person,Dario Amodei,Anthropic
+
+Usage (from the src folder):
+    python -m ragnar.apps.bulk_ingest accounts.csv --concurrency 4 --batch-size 10
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import json
+import os
+import time
+from typing import Any
+
+from ai_common import calculate_token_cost
+from business_researcher import BusinessResearcher, SearchType
+
+from config import settings
+from ragnar import get_agent_config, get_llm_config
+from ragnar.agents.enums import Table, PersonsColumns, ResearchDepth
+from ragnar.agents.merge import merge_entity
+from ragnar.agents.repository import EntityRepository, get_repository
+from ragnar.agents.research_profiles import RESEARCH_PROFILES, get_research_config
+from ragnar.agents.rate_limiter import WEB_SEARCH_PROVIDER, get_rate_limiter
+from ragnar.agents.search_cache import SEARCH_CLIENT_PATH, SearchCache, install_search_client
+from ragnar.agents.utils import (
+    insert_entities_to_db,
+    update_entity_in_db,
+    normalize_name,
+)
+
+COMPANY = 'company'
+PERSON = 'person'
+
+
+def read_records(path: str) -> list[dict[str, Any]]:
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    records = []
+    for row in rows:
+        name = (row.get('name') or '').strip()
+        company = (row.get('company') or '').strip()
+        if len(name) == 0:
+            continue
+        record_type = (row.get('type') or '').strip().lower() or (PERSON if len(company) > 0 else COMPANY)
+        if record_type not in (COMPANY, PERSON):
+            raise ValueError(f'Invalid record type {record_type} for {name}! - Can be either {COMPANY} or {PERSON}')
+        records.append({'type': record_type, 'name': name, 'company': company})
+    return records
+
+
+def get_record_key(record: dict[str, Any]) -> str:
+    return f"{record['type']}:{normalize_name(record['name'])}:{normalize_name(record['company'])}"
+
+
+class Checkpoint:
+    """Append-only JSONL log of processed records. Records logged as done are skipped on resume."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done_keys = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry['status'] == 'done':
+                            self.done_keys.add(entry['key'])
+
+    def write(self, entries: list[dict[str, Any]]):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.done_keys.update(x['key'] for x in entries if x['status'] == 'done')
+
+
+class BulkIngestor:
+    def __init__(self, llm_config: dict[str, Any], web_search_api_key: str, repository: EntityRepository, concurrency: int,
+                 research_profile: str = ResearchDepth.STANDARD, search_cache: SearchCache | None = None,
+                 search_client_path: str = SEARCH_CLIENT_PATH):
+        self.llm_config = llm_config
+        self.research_profile = research_profile
+        self.business_researcher = BusinessResearcher(llm_config=llm_config, web_search_api_key=web_search_api_key)
+        install_search_client(
+            researcher=self.business_researcher,
+            client_path=search_client_path,
+            cache=search_cache,
+            rate_limiter=get_rate_limiter(provider=WEB_SEARCH_PROVIDER, limits=get_agent_config().get('rate_limits', {}).get(WEB_SEARCH_PROVIDER)),
+        )
+        self.repository = repository
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def research(self, record: dict[str, Any]) -> dict[str, Any]:
+        if record['type'] == COMPANY:
+            input_dict = {'name': record['name'], 'search_type': SearchType.COMPANY}
+        else:
+            input_dict = {'name': record['name'], 'company': record['company'], 'search_type': SearchType.PERSON}
+
+        async with self._semaphore:
+            out_dict = await self.business_researcher.run(input_dict=input_dict, config=get_research_config(profile=self.research_profile))
+        _, cost = calculate_token_cost(llm_config=self.llm_config, token_usage=out_dict['token_usage'])
+        return {'content': out_dict['content'], 'cost': cost}
+
+    def upsert_companies(self, contents: list[dict[str, Any]]) -> list[int]:
+        # Duplicate names within the batch are merged into a single row
+        keys = [normalize_name(x['name']) for x in contents]
+        merged = {}
+        for key, content in zip(keys, contents):
+            merged[key] = content if key not in merged else merge_entity(current_row=merged[key],
+                                                                         patch={**content, 'name': merged[key]['name']},
+                                                                         table_name=Table.COMPANIES)
+
+        # Each name is resolved like the agent does: by name, then by alternative name
+        existing = {normalize_name(x['name']): x for x in self.repository.fetch_by_names(table_name=Table.COMPANIES,
+                                                                                         names=[x['name'] for x in merged.values()])}
+        current_rows = {}  # id -> stored row, kept current as rows matched by several names are updated
+        ids = {}
+        new_keys = []
+        for key, content in merged.items():
+            data = [existing[key]] if key in existing else self.repository.fetch_by_alternative_name(name=content['name'])
+            if len(data) == 0:
+                new_keys.append(key)
+                continue
+            current_row = current_rows.get(data[0]['id'], data[0])
+            # A row matched by one of its alternative names keeps its name
+            patch = merge_entity(current_row=current_row,
+                                 patch={**content, 'id': current_row['id'], 'name': current_row['name']},
+                                 table_name=Table.COMPANIES)
+            ids[key] = update_entity_in_db(repository=self.repository, input_dict=patch, table_name=Table.COMPANIES,
+                                           current_row=current_row)
+            current_rows[current_row['id']] = {**current_row, **patch}
+        new_ids = insert_entities_to_db(repository=self.repository, input_dicts=[merged[x] for x in new_keys], table_name=Table.COMPANIES)
+        ids.update(zip(new_keys, new_ids))
+        return [ids[x] for x in keys]
+
+    def resolve_company_id(self, company_name: str) -> int | None:
+        data = self.repository.fetch_by_names(table_name=Table.COMPANIES, names=[company_name])
+        if len(data) == 0:
+            data = self.repository.fetch_by_alternative_name(name=company_name)
+        return data[0]['id'] if len(data) > 0 else None
+
+    def upsert_persons(self, contents: list[dict[str, Any]], company_ids: list[int]) -> list[int]:
+        rows = []
+        for content, company_id in zip(contents, company_ids):
+            row = {k: v for k, v in content.items() if k != 'current_company'}
+            row[PersonsColumns.CURRENT_COMPANY_ID] = company_id
+            rows.append(row)
+
+        existing = {(x['name'], x[PersonsColumns.CURRENT_COMPANY_ID]): x
+                    for x in self.repository.fetch_by_names(table_name=Table.PERSONS, names=[x['name'] for x in rows])}
+        ids = [None] * len(rows)
+        new_indices = []
+        for i, row in enumerate(rows):
+            key = (row['name'], row[PersonsColumns.CURRENT_COMPANY_ID])
+            if key in existing:
+                ids[i] = update_entity_in_db(repository=self.repository, input_dict={**row, 'id': existing[key]['id']},
+                                             table_name=Table.PERSONS, current_row=existing[key])
+            else:
+                new_indices.append(i)
+        new_ids = insert_entities_to_db(repository=self.repository, input_dicts=[rows[i] for i in new_indices], table_name=Table.PERSONS)
+        for i, idx in zip(new_indices, new_ids):
+            ids[i] = idx
+        return ids
+
+    async def process_batch(self, records: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        results = await asyncio.gather(*[self.research(record=x) for x in records], return_exceptions=True)
+        entries = []
+        succeeded = []
+        for record, result in zip(records, results):
+            if isinstance(result, Exception):
+                entries.append({'key': get_record_key(record), 'status': 'failed', 'error': str(result), 'cost': 0.0})
+            else:
+                succeeded.append((record, result))
+
+        if len(succeeded) > 0:
+            if records[0]['type'] == COMPANY:
+                ids = await asyncio.to_thread(self.upsert_companies, [x['content'] for _, x in succeeded])
+            else:
+                ids = await asyncio.to_thread(self._upsert_persons_of_batch, succeeded, entries)
+            entries += [{'key': get_record_key(record), 'status': 'done', 'id': idx, 'cost': result['cost']}
+                        for (record, result), idx in zip(succeeded, ids) if idx is not None]
+        return entries
+
+    def _upsert_persons_of_batch(self, succeeded: list[tuple[dict, dict]], entries: list[dict[str, Any]]) -> list[int | None]:
+        company_ids = {}
+        for record, _ in succeeded:
+            if record['company'] not in company_ids:
+                company_ids[record['company']] = self.resolve_company_id(company_name=record['company'])
+
+        resolved = [(record, result) for record, result in succeeded if company_ids[record['company']] is not None]
+        for record, result in succeeded:
+            if company_ids[record['company']] is None:
+                entries.append({'key': get_record_key(record), 'status': 'failed', 'cost': result['cost'],
+                                'error': f"Company {record['company']} is not in the database; add it to the input."})
+        resolved_ids = iter(self.upsert_persons(contents=[x['content'] for _, x in resolved],
+                                                company_ids=[company_ids[r['company']] for r, _ in resolved]))
+        return [next(resolved_ids) if company_ids[record['company']] is not None else None for record, _ in succeeded]
+
+
+async def ingest(records: list[dict[str, Any]], ingestor: BulkIngestor, checkpoint: Checkpoint, batch_size: int):
+    pending = [x for x in records if get_record_key(x) not in checkpoint.done_keys]
+    print(f'{len(records)} records, {len(records) - len(pending)} already done, {len(pending)} to process.')
+
+    # Companies first, so that the persons' current companies can be resolved
+    pending = [x for x in pending if x['type'] == COMPANY] + [x for x in pending if x['type'] == PERSON]
+    batches = []
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        # A batch holds a single record type
+        for record_type in (COMPANY, PERSON):
+            typed_batch = [x for x in batch if x['type'] == record_type]
+            if len(typed_batch) > 0:
+                batches.append(typed_batch)
+
+    n_done, n_failed, total_cost = 0, 0, 0.0
+    time1 = time.time()
+    for batch in batches:
+        entries = await ingestor.process_batch(records=batch)
+        checkpoint.write(entries=entries)
+
+        n_done += sum(1 for x in entries if x['status'] == 'done')
+        n_failed += sum(1 for x in entries if x['status'] == 'failed')
+        total_cost += sum(x['cost'] for x in entries)
+        elapsed = time.time() - time1
+        n_processed = n_done + n_failed
+        print(
+            f'[{n_processed}/{len(pending)}] done: {n_done}, failed: {n_failed} | '
+            f'throughput: {n_processed / elapsed * 60:.2f} entities/min | '
+            f'cost: $ {total_cost:.4f} (${total_cost / max(n_processed, 1):.4f} / entity)'
+        )
+        for entry in entries:
+            if entry['status'] == 'failed':
+                print(f"    FAILED {entry['key']}: {entry['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Research and ingest companies / persons into the RAGNAR database.')
+    parser.add_argument('input', help='CSV or JSONL file with the fields: type, name, company')
+    parser.add_argument('--checkpoint', default=None, help='Checkpoint file (default: <input>.checkpoint.jsonl)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of concurrent researches')
+    parser.add_argument('--batch-size', type=int, default=10, help='Number of records upserted per database batch')
+    parser.add_argument('--depth', choices=list(RESEARCH_PROFILES), default=ResearchDepth.STANDARD, help='Research profile')
+    args = parser.parse_args()
+
+    os.environ['LANGSMITH_API_KEY'] = settings.LANGSMITH_API_KEY.get_secret_value()
+    os.environ['LANGSMITH_TRACING'] = settings.LANGSMITH_TRACING
+
+    time_now = datetime.datetime.now().astimezone(tz=settings.TIME_ZONE)
+    print(f"{settings.APPLICATION_NAME} bulk ingest started at {time_now.isoformat(timespec='seconds')}")
+
+    search_cache_config = {**get_agent_config()['search_cache']}
+    search_cache = SearchCache(**search_cache_config) if search_cache_config.pop('enabled') else None
+
+    # Writes go to the database directly, the read mirror is only for the agent
+    database_config = {k: v for k, v in get_agent_config()['database'].items() if k != 'read_mirror'}
+    ingestor = BulkIngestor(llm_config=get_llm_config(),
+                            web_search_api_key=settings.TAVILY_API_KEY,
+                            repository=get_repository(**database_config,
+                                                      database_url=settings.SUPABASE_URL.get_secret_value(),
+                                                      database_key=settings.SUPABASE_SECRET_KEY.get_secret_value()),
+                            concurrency=args.concurrency,
+                            research_profile=args.depth,
+                            search_cache=search_cache,
+                            search_client_path=get_agent_config()['web_search']['client_path'])
+    checkpoint = Checkpoint(path=args.checkpoint or f'{args.input}.checkpoint.jsonl')
+    asyncio.run(ingest(records=read_records(path=args.input), ingestor=ingestor, checkpoint=checkpoint, batch_size=args.batch_size))
+
+
+if __name__ == '__main__':
+    main()
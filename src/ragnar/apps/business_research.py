@@ -1,19 +1,42 @@
+import asyncio
 import datetime
 import os
+import queue
+import threading
 import time
 import traceback
-from typing import Any, Dict, Optional
+from concurrent.futures import Future
+from typing import Any, Coroutine, Dict, Optional
 import logging
 import streamlit as st
 
 from config import settings
-from ragnar import BusinessIntelligenceAgent, get_llm_config
+from ragnar import BusinessIntelligenceAgent, get_agent_config, get_llm_config
+from ragnar.agents.serialization import dumps_bytes
+from ragnar.apps.chat_history import HISTORY_PAGE_SIZE, render_chat_history, render_history_metrics, reset_chat_history_window
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class BackgroundEventLoop:
+    """
+    Event loop running in a daemon thread for the lifetime of a session.
+
+    Streamlit reruns the script on every interaction, so the agent's coroutines are scheduled on this
+    long-lived loop instead of a loop created (and torn down) per message.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True, name="ragnar-session-loop")
+        self._thread.start()
+
+    def submit(self, coroutine: Coroutine[Any, Any, Any]) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
 class StreamlitBusinessUI:
     """Enhanced Streamlit UI for Business Intelligence Agent with improved UX and error handling."""
 
@@ -48,6 +71,10 @@ class StreamlitBusinessUI:
             "model_settings": self.llm_config.copy(),
             "processing": False,
             "last_response_time": None,
+            "last_time_to_first_token": None,
+            "event_loop": None,
+            "history_window": HISTORY_PAGE_SIZE,
+            "last_render_seconds": None,
             "total_tokens_used": 0,
             "conversation_started_at": datetime.datetime.now(),
             "total_cost": 0.0,
@@ -132,11 +159,14 @@ class StreamlitBusinessUI:
             st.metric("Messages", len(st.session_state.messages))
             if st.session_state.last_response_time:
                 st.metric("Last Response", f"{st.session_state.last_response_time:.2f}s")
+            if st.session_state.last_time_to_first_token:
+                st.metric("Time to First Token", f"{st.session_state.last_time_to_first_token:.2f}s")
 
         with col2:
             st.metric("Total Cost", f"$ {st.session_state.total_cost:.2f}")
             session_duration = datetime.datetime.now() - st.session_state.conversation_started_at
             st.metric("Session Duration", str(session_duration).split('.')[0])
+            render_history_metrics()
 
     def _render_conversation_controls(self):
         """Render conversation management controls."""
@@ -155,6 +185,7 @@ class StreamlitBusinessUI:
     def _clear_conversation(self):
         """Clear conversation history."""
         st.session_state.messages = []
+        reset_chat_history_window()
         st.session_state.total_tokens_used = 0
         st.session_state.conversation_started_at = datetime.datetime.now()
         st.rerun()
@@ -178,12 +209,9 @@ class StreamlitBusinessUI:
             }
         }
 
-        import json
-        json_str = json.dumps(export_data, indent=2, default=str)
-
         st.download_button(
             label="📄 Download JSON",
-            data=json_str,
+            data=dumps_bytes(obj=export_data),
             file_name=f"ragnar_conversation_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
             mime="application/json"
         )
@@ -200,7 +228,8 @@ class StreamlitBusinessUI:
                     llm_config=st.session_state.model_settings,
                     web_search_api_key=settings.TAVILY_API_KEY,
                     database_url=settings.SUPABASE_URL,
-                    database_key=settings.SUPABASE_SECRET_KEY
+                    database_key=settings.SUPABASE_SECRET_KEY,
+                    agent_config=get_agent_config(),
                 )
                 st.session_state.agent = agent
                 st.session_state.agent_error = None
@@ -243,33 +272,30 @@ class StreamlitBusinessUI:
                 st.session_state.agent_error = None
                 st.rerun()
 
+    # noinspection PyMethodMayBeStatic
+    def _render_message_metadata(self, metadata: dict[str, Any]):
+        """Render the metadata of an assistant message."""
+        with st.expander("📊 Response Metadata", expanded=False):
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                if "timestamp" in metadata:
+                    st.caption(f"Generated at: {metadata['timestamp']}")
+            with col2:
+                if "response_time" in metadata:
+                    st.metric("Response Time", f"{metadata['response_time']:.2f}s")
+            with col3:
+                if "cost" in metadata:
+                    st.metric("Token Cost", f"$ {metadata["cost"]:.4f}")
+
     def _render_chat_interface(self, agent: BusinessIntelligenceAgent):
         """Render the main chat interface."""
         # Chat header
         st.title("🔍 Ragnar - Business Intelligence Assistant")
         st.markdown("Ask me anything about business research, market analysis, or competitive intelligence!")
 
-        # Display chat history
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-                # Show metadata for assistant messages
-                if message["role"] == "assistant" and "metadata" in message:
-                    with st.expander("📊 Response Metadata", expanded=False):
-                        metadata = message["metadata"]
-                        col1, col2, col3 = st.columns(3)
-
-                        with col1:
-                            if "timestamp" in metadata:
-                                st.caption(f"Generated at: {metadata['timestamp']}")
-                        with col2:
-                            if "response_time" in metadata:
-                                st.metric("Response Time", f"{metadata['response_time']:.2f}s")
-                        with col3:
-                            if "cost" in metadata:
-                                st.metric("Token Cost", f"$ {metadata["cost"]:.4f}")
-
+        # Display chat history (latest messages only, older ones on demand)
+        render_chat_history(messages=st.session_state.messages, render_metadata=self._render_message_metadata)
 
         # Chat input with processing state
         if st.session_state.processing:
@@ -298,10 +324,10 @@ class StreamlitBusinessUI:
             start_time = time.time()
 
             with st.chat_message("assistant"):
-                with st.spinner("Analyzing your request..."):
-                    out_dict = agent.run(query=user_message)
-                    response_stream = self.stream_response(text=out_dict['content'])
-                    result = st.write_stream(response_stream)
+                status = st.status("Analyzing your request...", expanded=False)
+                out_dict, time_to_first_token = self.stream_response(agent=agent, query=user_message, status=status,
+                                                                     placeholder=st.empty(), start_time=start_time)
+                status.update(label="Done", state="complete")
 
             end_time = time.time()
             response_time = end_time - start_time
@@ -309,6 +335,7 @@ class StreamlitBusinessUI:
             # Create response metadata
             metadata = {
                 "response_time": response_time,
+                "time_to_first_token": time_to_first_token,
                 "timestamp": datetime.datetime.now().isoformat(),
                 "token_usage": out_dict['token_usage'],
                 "cost": out_dict['total_cost']
@@ -317,13 +344,14 @@ class StreamlitBusinessUI:
             # Add assistant response to history
             assistant_message = {
                 "role": "assistant",
-                "content": result,
+                "content": out_dict['content'],
                 "metadata": metadata
             }
             st.session_state.messages.append(assistant_message)
 
             # Update session metrics
             st.session_state.last_response_time = response_time
+            st.session_state.last_time_to_first_token = time_to_first_token
             st.session_state.total_cost += out_dict['total_cost']
             st.session_state.total_tokens_used += 1  # Placeholder - would need actual token count
 
@@ -352,11 +380,50 @@ class StreamlitBusinessUI:
         st.rerun()
 
     # noinspection PyMethodMayBeStatic
-    def stream_response(self, text: str):
-        for chunk in text.split(sep=' '):
-            chunk += ' '
-            yield chunk
-            time.sleep(0.05)
+    def _get_event_loop(self) -> BackgroundEventLoop:
+        if st.session_state.event_loop is None:
+            st.session_state.event_loop = BackgroundEventLoop()
+        return st.session_state.event_loop
+
+    def stream_response(self, agent: BusinessIntelligenceAgent, query: str, status: Any, placeholder: Any,
+                        start_time: float) -> tuple[dict[str, Any], float | None]:
+        """
+        Run the agent on the session's event loop, rendering the answer into `placeholder` as it is generated
+        and the tool progress into `status`. Returns the run's output and the time to first token.
+        """
+        events = queue.Queue()
+
+        async def consume():
+            try:
+                async for event in agent.astream(query=query):
+                    events.put(event)
+            except BaseException as e:
+                events.put({'type': 'error', 'error': e})
+                raise
+
+        self._get_event_loop().submit(consume())
+        text = ''
+        time_to_first_token = None
+        while True:
+            event = events.get()
+            match event['type']:
+                case 'token':
+                    if time_to_first_token is None:
+                        time_to_first_token = time.time() - start_time
+                    text += event['content']
+                    placeholder.markdown(text + "▌")
+                case 'tool_start':
+                    # Text before a tool call is the model thinking aloud; the answer comes after the tools
+                    text = ''
+                    status.update(label=f"Running {event['name']}...")
+                    status.write(f"🔧 {event['name']}")
+                case 'tool_end':
+                    status.write(f"✅ {event['name']}")
+                case 'error':
+                    raise event['error']
+                case 'done':
+                    placeholder.markdown(event['output']['content'])
+                    return event['output'], time_to_first_token
 
     def render(self):
         """Main render method for the UI."""
@@ -0,0 +1,68 @@
+import time
+from typing import Any, Callable
+
+import streamlit as st
+
+HISTORY_PAGE_SIZE = 20  # Messages rendered per page of history
+COLLAPSE_CHARS = 1500  # Longer messages (e.g. research dumps) are collapsed to a preview
+PREVIEW_CHARS = 400
+
+
+def _get_preview(content: str) -> str:
+    preview = content[:PREVIEW_CHARS]
+    # Cut at a line break when there is one, so that markdown structures are not split mid-line
+    cut = preview.rfind('\n')
+    return (preview[:cut] if cut > PREVIEW_CHARS // 2 else preview).rstrip() + " …"
+
+
+def _render_content(content: str):
+    if len(content) <= COLLAPSE_CHARS:
+        st.markdown(content)
+        return
+    st.markdown(_get_preview(content=content))
+    with st.expander(f"📄 Show full message ({len(content):,} characters)", expanded=False):
+        if content.lstrip().startswith(('{', '[')):
+            st.code(content, language="json")
+        else:
+            st.markdown(content)
+
+
+def reset_chat_history_window():
+    st.session_state.history_window = HISTORY_PAGE_SIZE
+
+
+def render_chat_history(messages: list[dict[str, Any]],
+                        render_metadata: Callable[[dict[str, Any]], None],
+                        load_older: Callable[[], None] | None = None):
+    """
+    Render the latest `st.session_state.history_window` messages of the conversation.
+
+    Older messages are loaded a page at a time on demand and long messages are collapsed, so that the
+    cost of a rerun does not grow with the length of the session. `load_older` prepends the previous page
+    to `messages` when the history is kept on the server; None if there is nothing older than `messages`.
+    The time spent is stored in `st.session_state.last_render_seconds`.
+    """
+    time1 = time.perf_counter()
+    window = st.session_state.get('history_window', HISTORY_PAGE_SIZE)
+    n_hidden = max(len(messages) - window, 0)
+    if n_hidden > 0 or load_older is not None:
+        label = f"⬆️ Load older messages ({n_hidden} hidden)" if n_hidden > 0 else "⬆️ Load older messages"
+        if st.button(label, key="load_older_messages", type="tertiary"):
+            if n_hidden == 0:
+                load_older()
+            st.session_state.history_window = window + HISTORY_PAGE_SIZE
+            st.rerun()
+
+    for message in messages[n_hidden:]:
+        with st.chat_message(message["role"]):
+            _render_content(content=message["content"])
+            if message["role"] == "assistant" and "metadata" in message:
+                render_metadata(message["metadata"])
+
+    st.session_state.last_render_seconds = time.perf_counter() - time1
+
+
+def render_history_metrics():
+    """Session metrics of the history rendering. The render time is the one of the previous rerun."""
+    if st.session_state.get('last_render_seconds') is not None:
+        st.metric("History Render", f"{st.session_state.last_render_seconds * 1000:.0f} ms")
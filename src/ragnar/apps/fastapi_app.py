@@ -1,16 +1,25 @@
 # src/ragnar/apps/fastapi_app.py
+import asyncio
 import datetime
 import logging
 import os
+import time
 from typing import Optional, Any
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 
 from config import settings
-from ragnar import BusinessIntelligenceAgent, get_llm_config, DatabaseTable
+from ragnar import BusinessIntelligenceAgent, get_agent_config, get_llm_config
+from ragnar.agents import CancellationToken, RunCancelledError, get_rate_limiter_stats
+from ragnar.agents.enums import ResearchDepthName
+from ragnar.agents.refresh_scheduler import RefreshScheduler
+from ragnar.agents.run_context import run_cancellable
+from ragnar.agents.session_store import SessionStore
+from ragnar.agents.serialization import dumps_bytes
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -18,35 +27,87 @@ logger = logging.getLogger(__name__)
 
 # Global agent instance - initialized during startup
 bia: Optional[BusinessIntelligenceAgent] = None
+refresh_scheduler: Optional[RefreshScheduler] = None
+warm_up_status: str = "skipped"  # skipped / running / done / failed; not ready while running
+warm_up_task: Optional[asyncio.Task] = None
+
+
+async def _warm_up():
+    global warm_up_status
+    time1 = time.perf_counter()
+    try:
+        timings = await bia.warm_up()
+        warm_up_status = "done"
+        logger.info(
+            f"Warm-up completed in {time.perf_counter() - time1:.2f}s - "
+            + ", ".join(f"{k}: {v:.2f}s" for k, v in timings.items())
+        )
+    except Exception as e:
+        # The server still becomes ready; the first requests pay for the initialization instead
+        warm_up_status = "failed"
+        logger.warning(f"Warm-up failed after {time.perf_counter() - time1:.2f}s: {str(e)}")
+
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     # Startup
-    global bia
+    global bia, refresh_scheduler, warm_up_status, warm_up_task
     try:
         llm_config = get_llm_config()
+        agent_config = get_agent_config()
 
         bia = BusinessIntelligenceAgent(
             llm_config=llm_config,
             web_search_api_key=settings.TAVILY_API_KEY,
             database_url=settings.SUPABASE_URL,
-            database_key=settings.SUPABASE_SECRET_KEY
+            database_key=settings.SUPABASE_SECRET_KEY,
+            agent_config=agent_config,
         )
         logger.info("RAGNAR Business Intelligence Agent initialized")
+
+        if settings.WARM_UP_ON_STARTUP:
+            # Runs while the server already answers liveness probes; readiness waits for it
+            warm_up_status = "running"
+            warm_up_task = asyncio.create_task(_warm_up())
+
+        if bia.read_mirror is not None:
+            await bia.read_mirror.start()
+            logger.info("Read mirror sync started")
+
+        refresh_config = {**agent_config['refresh']}
+        if refresh_config.pop('enabled'):
+            refresh_scheduler = RefreshScheduler(agent=bia, **refresh_config)
+            await refresh_scheduler.start()
+            logger.info("Stale entity refresh scheduler started")
     except Exception as e:
         logger.error(f"Failed to initialize agent: {str(e)}")
         raise
     
     yield
     
+    if warm_up_task is not None:
+        warm_up_task.cancel()
+    if refresh_scheduler is not None:
+        await refresh_scheduler.stop()
+    if bia is not None and bia.read_mirror is not None:
+        await bia.read_mirror.stop()
     # Shutdown (cleanup if needed)
     logger.info("RAGNAR API shutting down")
 
+class JSONBytesResponse(Response):
+    """JSON response rendered directly to bytes by the serialization module (orjson if installed)."""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(obj=content)
+
+
 app = FastAPI(
     title="RAGNAR Business Intelligence API",
     description="AI-powered business intelligence assistant",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=JSONBytesResponse,
 )
 
 # Enable CORS for frontend
@@ -61,13 +122,19 @@ app.add_middleware(
 
 class ChatMessage(BaseModel):
     message: str
+    conversation_id: Optional[str] = None  # A new conversation is started if not given
+    timeout_seconds: Optional[float] = None  # Deadline of the request; the agent stops with a best-effort answer when reached
+    research_profile: Optional[ResearchDepthName] = None  # The configured default if not given; rejected with 422 if unknown
+    research_latency_target_seconds: Optional[float] = None
 
 
 class ChatResponse(BaseModel):
+    conversation_id: str
     content: str
     token_usage: dict
     cost_list: list[dict[str, Any]]
     total_cost: float
+    stop_reason: Optional[dict[str, Any]] = None
 
 
 @app.middleware("http")
@@ -89,63 +156,179 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "RAGNAR API",
-        "agent_ready": bia is not None,
+        "agent_ready": bia is not None and warm_up_status != "running",
         "timestamp": datetime.datetime.now().astimezone(settings.TIME_ZONE).isoformat()
     }
 
 
+@app.get("/livez")
+async def liveness_check():
+    """The process is up and serving requests; checks nothing else."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readiness_check():
+    """The warm-up has finished, the agent is initialized and the database is reachable (cached status); 503 otherwise."""
+    if warm_up_status == "running":
+        return JSONBytesResponse(status_code=503, content={"status": "not_ready", "warm_up": warm_up_status})
+    components = await get_component_status()
+    is_ready = components["agent"] == "ready" and components["database"] == "connected"
+    return JSONBytesResponse(
+        status_code=200 if is_ready else 503,
+        content={"status": "ready" if is_ready else "not_ready", "warm_up": warm_up_status, "components": components},
+    )
+
+
 @app.get("/metrics")
 async def get_metrics():
     return {
         "status": "operational",
         "timestamp": datetime.datetime.now().astimezone(settings.TIME_ZONE).isoformat(),
-        "service": "RAGNAR Business Intelligence API"
+        "service": "RAGNAR Business Intelligence API",
+        "single_flight": bia.get_single_flight_stats() if bia is not None else {},
+        "rate_limits": get_rate_limiter_stats(),
+        "model_routing": bia.get_model_routing_stats() if bia is not None else {},
+        "fast_path": bia.get_fast_path_stats() if bia is not None else {},
+        "runs": bia.get_run_stats() if bia is not None else {},
+        "prefetch": bia.get_prefetch_stats() if bia is not None else {},
+        "search_cache": bia.get_search_cache_stats() if bia is not None else {},
+        "research_profiles": bia.get_research_profile_stats() if bia is not None else {},
+        "refresh": refresh_scheduler.get_stats() if refresh_scheduler is not None else {},
+        "read_mirror": bia.get_read_mirror_stats() if bia is not None else {},
     }
 
 
-@app.post("/api/v1/chat")
-async def chat_endpoint(chat_message: ChatMessage) -> ChatResponse:
+async def _cancel_on_disconnect(request: Request, token: CancellationToken, task: asyncio.Task, poll_interval: float = 0.5):
+    # The run stops through its token (RunCancelledError); cancelling the task itself is left to the server
+    while not task.done():
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling the agent run")
+            token.cancel(reason="client_disconnected")
+            return
+        await asyncio.sleep(poll_interval)
+
+
+@app.post("/api/v1/chat", response_model=ChatResponse)
+async def chat_endpoint(chat_message: ChatMessage, request: Request) -> JSONBytesResponse:
     if bia is None:
         raise HTTPException(status_code=503, detail="Agent not initialized")
     
     # At this point, bia is guaranteed to be a BusinessIntelligenceAgent instance
     assert bia is not None  # Type assertion for static analysis
+
+    # Conversations are the agent's sessions; the run itself adds the query and the answer to the history
+    conversation_id = chat_message.conversation_id
+    if conversation_id is None:
+        conversation_id = await asyncio.to_thread(bia.session_store.create_session)
+    elif not await asyncio.to_thread(bia.session_store.has_session, conversation_id):
+        raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found")
+
+    token = CancellationToken(
+        deadline=time.time() + chat_message.timeout_seconds if chat_message.timeout_seconds is not None else None
+    )
+    task = asyncio.create_task(run_cancellable(coroutine=bia.run(
+        query=chat_message.message,
+        research_profile=chat_message.research_profile,
+        research_latency_target_seconds=chat_message.research_latency_target_seconds,
+        cancellation_token=token,
+        session_id=conversation_id,
+    ), token=token))
+    watcher = asyncio.create_task(_cancel_on_disconnect(request=request, token=token, task=task))
     try:
-        # Use your existing run method
-        result = await bia.run(query=chat_message.message)
-        return ChatResponse(
-            content=result['content'],
-            token_usage=result['token_usage'],
-            cost_list=result['cost_list'],
-            total_cost=result['total_cost'],
-        )
+        result = await task
+        # The result is already made of JSON types; skip the response model validation and serialize it directly
+        return JSONBytesResponse(content={
+            'conversation_id': conversation_id,
+            'content': result['content'],
+            'token_usage': result['token_usage'],
+            'cost_list': result['cost_list'],
+            'total_cost': result['total_cost'],
+            'stop_reason': result['stop_reason'],
+        })
+    except RunCancelledError:
+        # Nobody is waiting for the response any more
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except asyncio.CancelledError:
+        # The handler itself is cancelled, e.g. on server shutdown
+        raise
     except Exception as e:
         logger.error(f"Chat endpoint error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        watcher.cancel()
+
+async def _get_existing_conversation_store(conversation_id: str) -> SessionStore:
+    if bia is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    if not await asyncio.to_thread(bia.session_store.has_session, conversation_id):
+        raise HTTPException(status_code=404, detail=f"Conversation {conversation_id} not found")
+    return bia.session_store
+
+
+@app.get("/api/v1/conversations/{conversation_id}/messages")
+async def get_conversation_messages(conversation_id: str,
+                                    cursor: Optional[int] = None,
+                                    limit: int = Query(default=20, ge=1, le=200)):
+    """A page of messages, latest first page; pass `next_cursor` as `cursor` to get the older page."""
+    store = await _get_existing_conversation_store(conversation_id=conversation_id)
+    messages, next_cursor = await asyncio.to_thread(store.get_messages, conversation_id, cursor, limit)
+    return JSONBytesResponse(content={"conversation_id": conversation_id, "messages": messages, "next_cursor": next_cursor})
+
+
+@app.get("/api/v1/conversations/{conversation_id}/export")
+async def export_conversation(conversation_id: str):
+    """All messages of the conversation as NDJSON, streamed in chronological order."""
+    store = await _get_existing_conversation_store(conversation_id=conversation_id)
+    return StreamingResponse(
+        (dumps_bytes(obj=x) + b"\n" for x in store.iter_messages(session_id=conversation_id)),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="ragnar_conversation_{conversation_id}.ndjson"'},
+    )
+
+
+_component_status: dict[str, Any] = {}
+_component_status_lock = asyncio.Lock()
+
+
+async def get_component_status() -> dict[str, Any]:
+    """
+    Status of the agent and the database. The database is probed with a single-row query at most once every
+    STATUS_CACHE_TTL_SECONDS; concurrent checks in the meantime share the cached result.
+    """
+    global _component_status
+    async with _component_status_lock:
+        if _component_status and time.time() - _component_status["checked_at"] < settings.STATUS_CACHE_TTL_SECONDS:
+            return _component_status
+
+        time1 = time.perf_counter()
+        if bia is None:
+            db_status, agent_status = "unknown", "not_initialized"
+        else:
+            try:
+                await asyncio.to_thread(bia.check_database)
+                db_status, agent_status = "connected", "ready"
+            except Exception as e:
+                db_status, agent_status = f"error: {str(e)}", "error"
+        _component_status = {
+            "database": db_status,
+            "agent": agent_status,
+            "probe_ms": round((time.perf_counter() - time1) * 1000, 1),
+            "checked_at": time.time(),
+        }
+        return _component_status
+
 
 @app.get("/api/v1/status")
 async def detailed_status():
     """Detailed status endpoint for monitoring"""
-    try:
-        # Test database connection using your existing method
-        if bia is not None:
-            _ = bia.list_all_names(table_name=DatabaseTable.COMPANIES)
-            db_status = "connected"
-            agent_status = "ready"
-        else:
-            db_status = "unknown"
-            agent_status = "not_initialized"
-    except Exception as e:
-        db_status = f"error: {str(e)}"
-        agent_status = "error"
-
+    components = await get_component_status()
     return {
         "service": "RAGNAR Business Intelligence API",
         "status": "operational" if bia is not None else "degraded",
         "timestamp": datetime.datetime.now().astimezone(settings.TIME_ZONE).isoformat(),
         "components": {
-            "database": db_status,
-            "agent": agent_status,
+            **components,
             "models": bia.get_model_names() if bia is not None else []
         }
     }
@@ -159,4 +342,6 @@ if __name__ == "__main__":
     os.environ['LANGSMITH_API_KEY'] = getattr(settings, 'LANGSMITH_API_KEY', '')
     os.environ['LANGSMITH_TRACING'] = getattr(settings, 'LANGSMITH_TRACING', 'false')
 
-    uvicorn.run(app, host=settings.BACKEND_HOST, port=settings.BACKEND_PORT, reload=False)
+    # With several workers, each process has its own agent; the sessions are shared through the session store
+    uvicorn.run("ragnar.apps.fastapi_app:app", host=settings.BACKEND_HOST, port=settings.BACKEND_PORT,
+                workers=settings.BACKEND_WORKERS, reload=False)
@@ -1,8 +1,9 @@
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, Optional
 
 import requests
-import rich
+
+from ragnar.agents.serialization import dumps_bytes, loads
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -12,15 +13,15 @@ logger = logging.getLogger(__name__)
 class FastAPIClient:
     """Client to interact with the FastAPI backend."""
 
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", timeout: float = 300):
         self.base_url = base_url.rstrip('/')
         self.session = requests.Session()
-        self.session.timeout = 300  # 300 second timeout
+        self.timeout = timeout  # seconds
 
     def health_check(self) -> Dict[str, Any]:
         """Check if the FastAPI backend is healthy."""
         try:
-            response = self.session.get(f"{self.base_url}/health")
+            response = self.session.get(f"{self.base_url}/health", timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
@@ -30,27 +31,44 @@ class FastAPIClient:
     def get_status(self) -> Dict[str, Any]:
         """Get detailed status from the FastAPI backend."""
         try:
-            response = self.session.get(f"{self.base_url}/api/v1/status")
+            response = self.session.get(f"{self.base_url}/api/v1/status", timeout=10)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Status check failed: {e}")
             return {"status": "error", "message": str(e)}
 
-    def send_message(self, message: str) -> Dict[str, Any]:
-        """Send a message and get the complete response."""
+    def send_message(self, message: str, conversation_id: Optional[str] = None) -> Dict[str, Any]:
+        """Send a message and get the complete response. A new conversation is started if `conversation_id` is None."""
         try:
-            payload = {"message": message}
+            # The server stops slightly before the client gives up, so that a best-effort answer still arrives
+            payload = {"message": message, "conversation_id": conversation_id, "timeout_seconds": self.timeout * 0.95}
             response = self.session.post(
                 f"{self.base_url}/api/v1/chat",
-                json=payload,
-                headers={"Content-Type": "application/json"}
+                data=dumps_bytes(obj=payload),
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
             )
-
-            print("PRINTING RESPONSE.JSON:")
-            rich.print(response.json())
             response.raise_for_status()
-            return response.json()
+            return loads(response.content)
         except Exception as e:
             logger.error(f"Send message {message} failed: {e}")
             raise Exception(f"API Error: {str(e)}")
+
+    def get_messages(self, conversation_id: str, cursor: Optional[int] = None, limit: int = 20) -> Dict[str, Any]:
+        """Get a page of a conversation's messages: the latest ones, or the ones before `cursor`."""
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        response = self.session.get(f"{self.base_url}/api/v1/conversations/{conversation_id}/messages", params=params, timeout=30)
+        response.raise_for_status()
+        return loads(response.content)
+
+    def export_conversation(self, conversation_id: str) -> Iterator[Dict[str, Any]]:
+        """Stream all messages of a conversation from the NDJSON export."""
+        with self.session.get(f"{self.base_url}/api/v1/conversations/{conversation_id}/export", stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield loads(line)
+
+    def get_export_url(self, conversation_id: str) -> str:
+        return f"{self.base_url}/api/v1/conversations/{conversation_id}/export"
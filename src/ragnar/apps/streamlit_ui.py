@@ -3,10 +3,13 @@ import os
 import time
 import traceback
 import logging
-import json
+from typing import Any
+
 import streamlit as st
 
 from config import settings
+from ragnar.agents.serialization import dumps_bytes
+from ragnar.apps.chat_history import HISTORY_PAGE_SIZE, render_chat_history, render_history_metrics, reset_chat_history_window
 from ragnar.apps.fastapi_client import FastAPIClient
 
 # Configure logging
@@ -47,7 +50,10 @@ def _initialize_session_state(api_base_url: str):
         "last_response_time": None,
         "total_cost": 0.0,
         "conversation_started_at": datetime.datetime.now().astimezone(settings.TIME_ZONE),
-        "api_base_url": api_base_url
+        "api_base_url": api_base_url,
+        "history_window": HISTORY_PAGE_SIZE,
+        "history_cursor": None,  # Cursor of the older messages still on the server, None if all are loaded
+        "last_render_seconds": None,
     }
 
     for key, default_value in default_states.items():
@@ -129,22 +135,32 @@ def _render_session_metrics():
         st.metric("Total Cost", f"$ {st.session_state.total_cost:.4f}")
         session_duration = datetime.datetime.now().astimezone(settings.TIME_ZONE) - st.session_state.conversation_started_at
         st.metric("Session Duration", str(session_duration).split('.')[0])
+        render_history_metrics()
 
 
 def _clear_conversation():
     """Clear conversation history."""
     st.session_state.messages = []
+    st.session_state.conversation_id = None
+    st.session_state.history_cursor = None
+    st.query_params.pop("conversation", None)
+    reset_chat_history_window()
     st.session_state.total_cost = 0.0
     st.session_state.conversation_started_at = datetime.datetime.now().astimezone(settings.TIME_ZONE)
     st.rerun()
 
 
-def _export_conversation():
+def _export_conversation(api_client: FastAPIClient):
     """Export conversation to downloadable format."""
     if not st.session_state.messages:
         st.warning("No messages to export.")
         return
 
+    if st.session_state.conversation_id is not None:
+        # The full history is on the server, which streams it as NDJSON
+        st.link_button("📄 Download NDJSON", url=api_client.get_export_url(conversation_id=st.session_state.conversation_id))
+        return
+
     export_data = {
         "conversation_id": st.session_state.conversation_id,
         "started_at": st.session_state.conversation_started_at.isoformat(),
@@ -157,11 +173,9 @@ def _export_conversation():
         }
     }
 
-    json_str = json.dumps(export_data, indent=2, default=str)
-
     st.download_button(
         label="📄 Download JSON",
-        data=json_str,
+        data=dumps_bytes(obj=export_data),
         file_name=f"ragnar_conversation_{datetime.datetime.now().astimezone(settings.TIME_ZONE).strftime('%Y%m%d_%H%M%S')}.json",
         mime="application/json"
     )
@@ -272,7 +286,7 @@ class StreamlitFastAPIUI:
             _clear_conversation()
 
         if st.button("💾 Export Chat", type="secondary", use_container_width=True):
-            _export_conversation()
+            _export_conversation(api_client=self.api_client)
 
         if st.button("🔄 Test API Again", type="secondary", use_container_width=True):
             self._test_api_connection()
@@ -304,6 +318,43 @@ class StreamlitFastAPIUI:
                 if st.session_state.api_status:
                     st.rerun()
 
+    # noinspection PyMethodMayBeStatic
+    def _render_message_metadata(self, metadata: dict[str, Any]):
+        """Render the metadata of an assistant message."""
+        with st.expander("📊 Response Metadata", expanded=False):
+            col1, col2, col3 = st.columns(3)
+
+            with col1:
+                if "timestamp" in metadata:
+                    st.caption(f"Generated at: {metadata['timestamp']}")
+            with col2:
+                if "response_time" in metadata:
+                    st.metric("Response Time", f"{metadata['response_time']:.2f}s")
+            with col3:
+                if "total_cost" in metadata:
+                    st.metric("Message Token Cost", f"$ {metadata['total_cost']:.4f}")
+                elif "token_usage" in metadata:
+                    st.caption(f"Message Token Usage: {metadata['token_usage']}")
+
+    def _load_conversation(self, conversation_id: str):
+        """Load the latest messages of a server-side conversation, e.g. after a page reload."""
+        try:
+            page = self.api_client.get_messages(conversation_id=conversation_id, limit=HISTORY_PAGE_SIZE)
+        except Exception as e:
+            logger.error(f"Loading conversation {conversation_id} failed: {e}")
+            st.query_params.pop("conversation", None)
+            return
+        st.session_state.conversation_id = conversation_id
+        st.session_state.messages = page["messages"]
+        st.session_state.history_cursor = page["next_cursor"]
+
+    def _load_older_messages(self):
+        page = self.api_client.get_messages(conversation_id=st.session_state.conversation_id,
+                                            cursor=st.session_state.history_cursor,
+                                            limit=HISTORY_PAGE_SIZE)
+        st.session_state.messages = page["messages"] + st.session_state.messages
+        st.session_state.history_cursor = page["next_cursor"]
+
     def _render_chat_interface(self):
         """Render the main chat interface."""
         # Chat header
@@ -311,28 +362,10 @@ class StreamlitFastAPIUI:
         st.markdown(
             "*Connected to FastAPI Backend* | Ask me anything about business research, market analysis, or competitive intelligence!")
 
-        # Display chat history
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-
-                # Show metadata for assistant messages
-                if message["role"] == "assistant" and "metadata" in message:
-                    with st.expander("📊 Response Metadata", expanded=False):
-                        metadata = message["metadata"]
-                        col1, col2, col3 = st.columns(3)
-
-                        with col1:
-                            if "timestamp" in metadata:
-                                st.caption(f"Generated at: {metadata['timestamp']}")
-                        with col2:
-                            if "response_time" in metadata:
-                                st.metric("Response Time", f"{metadata['response_time']:.2f}s")
-                        with col3:
-                            if "total_cost" in metadata:
-                                st.metric("Message Token Cost", f"$ {metadata['total_cost']:.4f}")
-                            elif "token_usage" in metadata:
-                                st.caption(f"Message Token Usage: {metadata['token_usage']}")
+        # Display chat history (latest messages only, older ones on demand)
+        render_chat_history(messages=st.session_state.messages,
+                            render_metadata=self._render_message_metadata,
+                            load_older=self._load_older_messages if st.session_state.history_cursor is not None else None)
 
         # Chat input with processing state
         if st.session_state.processing:
@@ -362,7 +395,8 @@ class StreamlitFastAPIUI:
             with st.chat_message("assistant"):
                 with st.spinner("Analyzing your request via FastAPI..."):
                     # Use streaming response
-                    response = self.api_client.send_message(message=user_message)
+                    response = self.api_client.send_message(message=user_message,
+                                                            conversation_id=st.session_state.conversation_id)
                     result = st.write_stream(stream=_make_stream_from_response(content=response['content']))
 
             end_time = time.time()
@@ -390,6 +424,10 @@ class StreamlitFastAPIUI:
             }
             st.session_state.messages.append(assistant_message)
 
+            # The conversation can be reopened from the URL
+            st.session_state.conversation_id = response['conversation_id']
+            st.query_params["conversation"] = response['conversation_id']
+
             # Update session metrics
             st.session_state.last_response_time = response_time
             st.session_state.total_cost += total_cost
@@ -426,6 +464,9 @@ class StreamlitFastAPIUI:
         """Main render method for the UI."""
         # Check API connection status
         if _check_api_connection():
+            conversation_id = st.query_params.get("conversation")
+            if conversation_id is not None and st.session_state.conversation_id is None:
+                self._load_conversation(conversation_id=conversation_id)
             self._render_chat_interface()
         else:
             self._render_connection_required()